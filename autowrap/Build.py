@@ -0,0 +1,388 @@
+# encoding: utf-8
+
+__license__ = """
+
+Copyright (c) 2012-2014, Uwe Schmitt, all rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the name of the ETH Zurich nor the names of its contributors may be
+used to endorse or promote products derived from this software without specific
+prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import logging as L
+
+import autowrap.Profiling as Profiling
+from autowrap.Utils import (OutputReport, replace_file, replace_if_changed, report_output,
+                            temp_path_for)
+from autowrap.version import __version__
+
+"""
+Building the extension modules for the generated .pyx files.
+
+build_modules() runs Cython and compiles and links the C++ code of each
+module, running up to `num_processes` modules in parallel. The generated C++
+code, the object files and the extension modules are stored in a content
+addressed cache (see BuildCache), so that unchanged modules are neither
+cythonized nor compiled again:
+
+    - the C++ code is keyed on the .pyx file, the .pxd files of all modules
+      built together, the `depends` files, the include dirs and the Cython
+      options
+    - the object file and the extension module are keyed on the C++ code,
+      the include dirs, the compiler commands, the compiler flags and the
+      C++ headers included by the C++ code
+
+The included headers are taken from the dependency file written by the
+compiler (-MD) and are stored in the cache next to the object file. Compilers
+which do not write dependency files (e.g. MSVC) only notice changes of the
+headers passed in `depends`.
+"""
+
+
+def _cython_version():
+    try:
+        import Cython
+    except ImportError:
+        return "none"
+    return Cython.__version__
+
+
+def _read(path):
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+def _hash(meta, paths):
+    h = hashlib.sha1()
+    h.update(("%s|%s|%s|%s" % (".".join(map(str, __version__)), _cython_version(),
+                               ".".join(map(str, sys.version_info[:3])), meta)).encode("utf-8"))
+    for path in paths:
+        h.update(path.encode("utf-8"))
+        if os.path.exists(path):
+            h.update(_read(path))
+    return h.hexdigest()
+
+
+def _ext_suffix():
+    import sysconfig
+    return sysconfig.get_config_var("EXT_SUFFIX") or sysconfig.get_config_var("SO")
+
+
+def _python_include_dir():
+    import sysconfig
+    return sysconfig.get_paths()["include"]
+
+
+def _export_symbols(name):
+    # the init function of the extension module:
+    if sys.version_info[0] < 3:
+        return ["init" + name]
+    return ["PyInit_" + name]
+
+
+def _new_compiler():
+    try:
+        # provides distutils on Python >= 3.12:
+        import setuptools
+    except ImportError:
+        pass
+    try:
+        from distutils.ccompiler import new_compiler
+        from distutils.sysconfig import customize_compiler
+    except ImportError:
+        raise Exception("building the extension modules needs distutils, which is part of "
+                        "setuptools on Python >= 3.12, please install setuptools")
+    compiler = new_compiler()
+    customize_compiler(compiler)
+    return compiler
+
+
+def _compiler_commands(compiler):
+    return [getattr(compiler, name, None) for name in ("compiler_so", "compiler_cxx", "linker_so")]
+
+
+def _writes_dependency_files(compiler):
+    # gcc and clang:
+    return compiler.compiler_type == "unix"
+
+
+def _parse_dependency_file(path, source):
+    """ returns the files listed in the make rule written by the compiler
+        with -MD, except `source`
+    """
+    with open(path) as fp:
+        content = fp.read().replace("\\\n", " ")
+    __, __, prerequisites = content.partition(": ")
+    paths = [p.replace("\\ ", " ") for p in re.split(r"(?<!\\)\s+", prerequisites) if p]
+    return sorted(set(os.path.abspath(p) for p in paths) - set([os.path.abspath(source)]))
+
+
+class BuildCache(object):
+
+    """
+    Stores the files created by build_modules() in `cache_dir`, named after
+    their key. If `cache_dir` is None nothing is cached.
+    """
+
+    DEFAULT_DIR = os.path.join(".autowrap_cache", "build")
+
+    def __init__(self, cache_dir=DEFAULT_DIR):
+        self.cache_dir = None if cache_dir is None else os.path.abspath(cache_dir)
+
+    def _entry_path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def load(self, key, suffix, path):
+        """ copies the entry to `path` and returns True if the cache holds
+            an entry for `key`, `path` is not touched if it has the same
+            content already
+        """
+        if self.cache_dir is None:
+            return False
+        entry = self._entry_path(key, suffix)
+        if not os.path.exists(entry):
+            return False
+        _install(entry, path)
+        try:
+            # mark as recently used:
+            os.utime(entry, None)
+        except OSError:
+            pass
+        return True
+
+    def store(self, key, suffix, path):
+        if self.cache_dir is None:
+            return
+        if not os.path.exists(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                # concurrent creation by other process
+                if not os.path.isdir(self.cache_dir):
+                    raise
+        self._copy(path, self._entry_path(key, suffix))
+
+    @staticmethod
+    def _copy(src, dst):
+        # copy to temp file first, so that concurrent readers never see
+        # partially written files:
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dst)), suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copy2(src, temp_path)
+            replace_file(temp_path, dst)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+def _install(src, dst):
+    # copies the output file src to dst unless dst has the same content:
+    temp_path = temp_path_for(dst)
+    try:
+        shutil.copy2(src, temp_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    replace_if_changed(temp_path, dst)
+
+
+class ModuleBuild(object):
+
+    """ result and timings of building a single module in build_modules() """
+
+    def __init__(self, name, extension_path):
+        self.name = name
+        self.extension_path = extension_path
+        # None if the step was not needed:
+        self.cython_seconds = None
+        self.compile_seconds = None
+        self.link_seconds = None
+        # output files which were written and which were left untouched as
+        # their content did not change:
+        self.changed_files = []
+        self.unchanged_files = []
+
+    @property
+    def seconds(self):
+        return sum(s for s in (self.cython_seconds, self.compile_seconds, self.link_seconds) if s)
+
+    @property
+    def up_to_date(self):
+        return self.cython_seconds is None and self.compile_seconds is None and self.link_seconds is None
+
+    def __str__(self):
+        def fmt(seconds):
+            return "cached" if seconds is None else "%.2fs" % seconds
+        return "%-30s cython %-8s compile %-8s link %-8s" % (
+            self.name, fmt(self.cython_seconds), fmt(self.compile_seconds), fmt(self.link_seconds))
+
+
+def _build_module(task):
+    with OutputReport() as report:
+        result = _build_module_files(*task)
+    result.changed_files = report.changed
+    result.unchanged_files = report.unchanged
+    return result
+
+
+def _build_module_files(pyx_path, options):
+    name, __ = os.path.splitext(os.path.basename(pyx_path))
+    out_dir = options["out_dir"] or os.path.dirname(pyx_path)
+    result = ModuleBuild(name, os.path.join(out_dir, name + _ext_suffix()))
+    cache = BuildCache(options["cache_dir"])
+    include_dirs = options["include_dirs"]
+
+    cpp_path = os.path.splitext(pyx_path)[0] + ".cpp"
+    cpp_key = _hash("cython|%r|%r" % (include_dirs, sorted((options["extra_opts"] or dict()).items())),
+                    [pyx_path] + options["pxd_files"] + options["depends"])
+    if not cache.load(cpp_key, ".cpp", cpp_path):
+        from autowrap.Main import run_cython
+        start = time.time()
+        if run_cython(include_dirs, options["extra_opts"], pyx_path).num_errors:
+            raise Exception("cython failed for %s" % pyx_path)
+        result.cython_seconds = time.time() - start
+        cache.store(cpp_key, ".cpp", cpp_path)
+
+    compiler = _new_compiler()
+    compile_args = options["extra_compile_args"]
+    source_key = _hash("compile|%r|%r|%r" % (include_dirs, _compiler_commands(compiler), compile_args),
+                       [cpp_path] + options["depends"])
+
+    build_dir = tempfile.mkdtemp()
+    try:
+        # the headers included when the C++ code was compiled last time:
+        headers_path = os.path.join(build_dir, name + ".headers")
+        headers = None
+        if cache.load(source_key, ".headers", headers_path):
+            with open(headers_path) as fp:
+                headers = fp.read().splitlines()
+            object_key = _hash("headers|%s" % source_key, headers)
+            link_key = _hash("link|%s|%r" % (object_key, options["extra_link_args"]), [])
+            if cache.load(link_key, _ext_suffix(), result.extension_path):
+                return result
+
+        object_path = os.path.join(build_dir, name + compiler.obj_extension)
+        if headers is None or not cache.load(object_key, compiler.obj_extension, object_path):
+            start = time.time()
+            dependency_args = []
+            dependency_path = os.path.join(build_dir, name + ".d")
+            if _writes_dependency_files(compiler):
+                dependency_args = ["-MD", "-MF", dependency_path]
+            objects = compiler.compile([cpp_path], output_dir=build_dir,
+                                       include_dirs=include_dirs + [_python_include_dir()],
+                                       extra_postargs=compile_args + dependency_args)
+            replace_file(objects[0], object_path)
+            result.compile_seconds = time.time() - start
+            headers = []
+            if dependency_args:
+                headers = _parse_dependency_file(dependency_path, cpp_path)
+            with open(headers_path, "w") as fp:
+                fp.write("\n".join(headers))
+            cache.store(source_key, ".headers", headers_path)
+            object_key = _hash("headers|%s" % source_key, headers)
+            link_key = _hash("link|%s|%r" % (object_key, options["extra_link_args"]), [])
+            cache.store(object_key, compiler.obj_extension, object_path)
+
+        start = time.time()
+        temp_extension = os.path.join(build_dir, name + _ext_suffix())
+        compiler.link_shared_object([object_path], temp_extension, target_lang="c++",
+                                    export_symbols=_export_symbols(name),
+                                    extra_postargs=options["extra_link_args"])
+        _install(temp_extension, result.extension_path)
+        result.link_seconds = time.time() - start
+        cache.store(link_key, _ext_suffix(), result.extension_path)
+    finally:
+        shutil.rmtree(build_dir, ignore_errors=True)
+    return result
+
+
+def build_modules(pyx_files, include_dirs, out_dir=None, cache_dir=BuildCache.DEFAULT_DIR,
+                  num_processes=1, depends=None, extra_opts=None, extra_compile_args=None,
+                  extra_link_args=None):
+    """ cythonizes, compiles and links the .pyx files `pyx_files` as C++
+        extension modules named after the files, e.g. the modules written by
+        autowrap.generate_code with shards (see Sharding.shard_targets).
+
+        The extension modules are written to `out_dir`, which defaults to
+        the directory of each .pyx file. `depends` lists further files which
+        the modules depend on, e.g. the wrapped .pxd files and C++ headers
+        which the compiler does not report (see the module docstring). If
+        `cache_dir` is None, all modules are built from scratch.
+
+        Returns a list with a ModuleBuild for each of the `pyx_files`, in the
+        same order.
+    """
+    pyx_files = [os.path.abspath(p) for p in pyx_files]
+    pxd_files = [os.path.splitext(p)[0] + ".pxd" for p in pyx_files]
+    options = dict(out_dir=out_dir and os.path.abspath(out_dir),
+                   cache_dir=cache_dir,
+                   include_dirs=[os.path.abspath(d) for d in include_dirs],
+                   pxd_files=pxd_files,
+                   depends=[os.path.abspath(p) for p in depends or []],
+                   extra_opts=extra_opts,
+                   extra_compile_args=list(extra_compile_args or []),
+                   extra_link_args=list(extra_link_args or []))
+    tasks = [(p, options) for p in pyx_files]
+
+    results = [None] * len(tasks)
+    start = time.time()
+    if num_processes <= 1 or len(tasks) <= 1:
+        for i, task in enumerate(tasks):
+            results[i] = _build_module(task)
+    else:
+        import multiprocessing as mp
+        pool = mp.Pool(processes=num_processes)
+        try:
+            for i, result in enumerate(pool.imap(_build_module, tasks)):
+                results[i] = result
+                # the reports of this process do not see the files written
+                # by the other processes:
+                for path in result.changed_files:
+                    report_output(path, True)
+                for path in result.unchanged_files:
+                    report_output(path, False)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+    for result in results:
+        L.info(str(result))
+        Profiling.record("build_modules", result.name, result.seconds)
+    L.info("built %d of %d modules with %d processes in %.2fs" % (
+        sum(not r.up_to_date for r in results), len(results), num_processes, time.time() - start))
+    return results
@@ -51,8 +51,44 @@ else:
     basestring = basestring
 
 
+# maximal number of templates in Code._template_cache, 0 disables the cache:
+TEMPLATE_CACHE_SIZE = 10000
+
+
+class _LineTemplates(object):
+
+    """ a template string passed to Code.add, split into lines once. The
+        placeholders of each line are translated to a format string for the
+        % operator, which is much faster than string.Template.substitute.
+        See Code._line_templates
+    """
+
+    def __init__(self, lines):
+        # format strings and number of line breaks which are not layout
+        # markers:
+        self.lines = [(self._to_format(line), line.count("\n")) for line in lines]
+
+    @staticmethod
+    def _to_format(line):
+        parts = []
+        pos = 0
+        for m in string.Template.pattern.finditer(line):
+            parts.append(line[pos:m.start()].replace("%", "%%"))
+            if m.group("escaped") is not None:
+                parts.append("$")
+            else:
+                parts.append("%%(%s)s" % (m.group("named") or m.group("braced")))
+            pos = m.end()
+        parts.append(line[pos:].replace("%", "%%"))
+        return "".join(parts)
+
+
 class Code(object):
 
+    # maps template strings to _LineTemplates or None for templates which
+    # have to be processed after substitution:
+    _template_cache = dict()
+
     def __init__(self):
         self.content = []
 
@@ -69,33 +105,110 @@ class Code(object):
         if isinstance(what, basestring):
             # print repr(what)
             try:
-                res = string.Template(what).substitute(**kw)
+                lines = self._substitute_lines(what, kw)
+                if lines is None:
+                    res = string.Template(what).substitute(**kw)
             except:
                 print(what)
                 print(kw)
                 raise
-            res = re.sub(r"^[ ]*\n[ ]*\|", "", res)     # ltrim first line
-            res = re.sub(r"\n+ *\+", "", res)
-            for line in re.split(r"\n *\|", res):
+            if lines is None:
+                lines = self._split_lines(res)
+            for line in lines:
                 self.content.append(line.rstrip())
         else:
             self.content.append(what)
         return self
 
-    def _render(self, _indent=""):
-        result = []
+    @staticmethod
+    def _split_lines(res):
+        res = re.sub(r"^[ ]*\n[ ]*\|", "", res)     # ltrim first line
+        return Code._join_and_split(res)
+
+    @staticmethod
+    def _join_and_split(res):
+        res = re.sub(r"\n+ *\+", "", res)
+        return re.split(r"\n *\|", res)
+
+    @classmethod
+    def _line_templates(cls, what):
+        """ returns the cached _LineTemplates for `what` or None.
+
+            Splitting the template instead of the substituted text gives the
+            same lines as long as no placeholder starts a line (a value could
+            start with a '|' or '+' marker there) and no placeholder is
+            followed by a line break which is removed by a '+' marker (a
+            value ending with a line break would be removed too).
+        """
+        try:
+            return cls._template_cache[what]
+        except KeyError:
+            pass
+        line_templates = None
+        for m in string.Template.pattern.finditer(what):
+            if m.group("invalid") is not None:
+                # string.Template raises the error
+                break
+            if m.group("escaped") is not None:
+                continue
+            line_start = what.rfind("\n", 0, m.start()) + 1
+            if not what[line_start:m.start()].strip(" "):
+                break
+            if re.match(r"\n+ *\+", what[m.end():]):
+                break
+        else:
+            line_templates = _LineTemplates(cls._split_lines(what))
+        if len(cls._template_cache) >= TEMPLATE_CACHE_SIZE:
+            cls._template_cache.clear()
+        cls._template_cache[what] = line_templates
+        return line_templates
+
+    @classmethod
+    def _substitute_lines(cls, what, kw):
+        """ returns the substituted lines of `what` using the template cache
+            or None if the template has to be processed after substitution
+        """
+        if TEMPLATE_CACHE_SIZE <= 0:
+            return None
+        line_templates = cls._line_templates(what)
+        if line_templates is None:
+            return None
+        lines = []
+        for fmt, n in line_templates.lines:
+            line = fmt % kw
+            if "\n" in line and line.count("\n") > n:
+                # the values contain line breaks and maybe layout markers:
+                lines.extend(cls._join_and_split(line))
+            else:
+                lines.append(line)
+        return lines
+
+    def iter_lines(self, _indent=""):
+        """ yields the rendered lines one by one, without building the full
+            text in memory
+        """
         for content in self.content:
             if isinstance(content, basestring):
-                result.append(_indent + content)
+                yield _indent + content
             else:
                 try:
-                    for line in content._render(_indent=_indent + "    "):
-                        result.append(line)
-                except:
-                    pass
-                finally:
+                    for line in content.iter_lines(_indent=_indent + "    "):
+                        yield line
+                except Exception:
                     pass
-        return result
+
+    def _render(self, _indent=""):
+        return list(self.iter_lines(_indent))
 
     def render(self):
-        return "\n".join(self._render())
+        return "\n".join(self.iter_lines())
+
+    def write_to(self, fp):
+        """ writes the same text as render() to the file object fp """
+        lines = self.iter_lines()
+        for line in lines:
+            fp.write(line)
+            break
+        for line in lines:
+            fp.write("\n")
+            fp.write(line)
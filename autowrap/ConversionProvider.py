@@ -65,6 +65,19 @@ def mangle(s):
     return s
 
 
+def lazy_sequence_name(class_name):
+    """ name of the generated sequence class for methods which return a
+        vector of class_name with the wrap-return-lazy annotation """
+    return "_LazySequence_%s" % class_name
+
+
+def _type_key(cpp_type):
+    # str() covers the structure and all flags of the type besides is_enum and
+    # the topmost_* flags, which are checked by some converters:
+    return (str(cpp_type), cpp_type.is_enum, cpp_type.topmost_is_ref,
+            cpp_type.topmost_is_const)
+
+
 class ConverterRegistry(object):
 
     """
@@ -79,6 +92,12 @@ class ConverterRegistry(object):
 
         self.lookup = defaultdict(list)
 
+        # results of get() and cython_type(), keyed on _type_key(cpp_type):
+        self._get_memo = dict()
+        self._cython_type_memo = dict()
+        self.memo_hits = defaultdict(int)
+        self.memo_misses = defaultdict(int)
+
         self.names_of_wrapper_classes = list(instance_mapping.keys())
         self.names_of_wrapper_classes += ["const %s" % k for k in instance_mapping.keys()]
         self.names_of_classes_to_wrap = names_of_classes_to_wrap
@@ -95,6 +114,7 @@ class ConverterRegistry(object):
         self.instance_mapping = dict()
         for alias, type_ in instance_mapping.items():
             self.instance_mapping[alias] = type_.transformed(map_)
+        self._cython_type_memo.clear()
 
     def register(self, converter):
 
@@ -108,13 +128,26 @@ class ConverterRegistry(object):
 
         for base_type in converter.get_base_types():
             self.lookup[base_type].append(converter)
+        self._get_memo.clear()
 
     def get(self, cpp_type):
 
+        key = _type_key(cpp_type)
+        try:
+            rv = self._get_memo[key]
+            self.memo_hits["get"] += 1
+        except KeyError:
+            self.memo_misses["get"] += 1
+            rv = self._get_memo[key] = self._find_converter(cpp_type)
+        if rv is None:
+            raise Exception("no converter for %s" % cpp_type)
+        return rv
+
+    def _find_converter(self, cpp_type):
         rv = [conv for conv in self.lookup[cpp_type.base_type]
               if conv.matches(cpp_type)]
         if len(rv) < 1:
-            raise Exception("no converter for %s" % cpp_type)
+            return None
 
         # allways take the latest converter which allows overwriting existing
         # standard converters !
@@ -129,8 +162,25 @@ class ConverterRegistry(object):
 
     def cython_type(self, type_):
         if isinstance(type_, basestring):
-            type_ = CppType(type_)
-        return type_.transformed(self.instance_mapping)
+            key = type_
+        else:
+            key = _type_key(type_)
+        try:
+            rv = self._cython_type_memo[key]
+            self.memo_hits["cython_type"] += 1
+        except KeyError:
+            self.memo_misses["cython_type"] += 1
+            if isinstance(type_, basestring):
+                type_ = CppType(type_)
+            rv = self._cython_type_memo[key] = type_.transformed(self.instance_mapping)
+        # the result is shared between all callers and must not be modified
+        return rv
+
+    def log_memo_statistics(self):
+        for name in sorted(set(self.memo_hits) | set(self.memo_misses)):
+            hits, misses = self.memo_hits[name], self.memo_misses[name]
+            L.debug("converter registry: %s() memo hit rate %.1f%% (%d of %d calls)"
+                    % (name, 100.0 * hits / (hits + misses), hits, hits + misses))
 
 
 class TypeConverterBase(object):
@@ -157,18 +207,86 @@ class TypeConverterBase(object):
         cy_res_type = self.converters.cython_type(res_type)
         return "cdef %s _r = %s" % (cy_res_type, cy_call_str)
 
+    def referenced_names(self, cpp_type):
+        """
+        names of the types which the code generated by this converter for
+        cpp_type refers to, used to decide which wrapped classes, enums and
+        typedefs are cimported in multi-module builds
+        """
+        names = set(cpp_type.all_occuring_base_types())
+        names.update(self.converters.cython_type(cpp_type).all_occuring_base_types())
+        return names
+
+    def call_method_ref(self, res_type, cy_call_str, owner):
+        """
+        call for methods with the wrap-return-ref annotation: the result
+        refers to the storage of the C++ object held by the shared_ptr owner
+        instead of being copied. Returns None if res_type does not support
+        this.
+        """
+        return None
+
+    def call_method_without_gil(self, res_type, cy_call_str):
+        """
+        call_method split into (declaration, call, conversion), so that only
+        the call runs without the GIL: the declaration of _r before and the
+        conversion to the _r expected by output_conversion after it (both
+        may be None). Returns None if res_type does not support this.
+        """
+        cy_res_type = self.converters.cython_type(res_type)
+        if cy_res_type.is_ref:
+            return None
+        if not cy_res_type.is_ptr:
+            cy_res_type = cy_res_type.replaced(is_const=False)
+        return "cdef %s _r" % cy_res_type, "_r = %s" % cy_call_str, None
+
     def matching_python_type(self, cpp_type):
         raise NotImplementedError()
 
     def type_check_expression(self, cpp_type, argument_var):
         raise NotImplementedError()
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        """
+        expression which only depends on the Python type of argument_var and
+        holds whenever type_check_expression holds. Returns None if there is
+        no such check. If the expression equals type_check_expression no
+        further check is needed.
+        """
+        return None
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         raise NotImplementedError()
 
     def output_conversion(self, cpp_type, input_cpp_var, output_py_var):
         raise NotImplementedError()
 
+    def output_buffer_conversion(self, cpp_type, input_cpp_var, output_py_var):
+        """
+        conversion for methods with the wrap-return-buffer annotation, which
+        returns an object providing the buffer protocol. Returns None if
+        cpp_type does not support this.
+        """
+        return None
+
+    def output_lazy_conversion(self, cpp_type, input_cpp_var, output_py_var,
+                               share_elements=False):
+        """
+        conversion for methods with the wrap-return-lazy annotation, which
+        returns a sequence creating the Python objects for its items on
+        access. Returns None if cpp_type does not support this.
+        """
+        return None
+
+    def output_shared_conversion(self, cpp_type, input_cpp_var, output_py_var):
+        """
+        conversion for methods with the wrap-share-elements annotation: the
+        Python objects of the items point into the returned container (which
+        they keep alive) instead of holding copies. Returns None if cpp_type
+        does not support this.
+        """
+        return None
+
 
     def _codeForInstantiateObjectFromIter(self, cpp_type, it):
         """
@@ -179,15 +297,15 @@ class TypeConverterBase(object):
         to instantate a new object and dereference twice.
 
         Example output:
-            shared_ptr[ _FooObject ] (new _FooObject (*foo_iter)  )
-            shared_ptr[ _FooObject ] (new _FooObject (**foo_iter_ptr)  )
+            _copy_shared[_FooObject](deref(foo_iter))
+            _copy_shared[_FooObject](deref(deref(foo_iter_ptr)))
         """
 
         if cpp_type.is_ptr:
             cpp_type_base = cpp_type.base_type
-            return string.Template("shared_ptr[$cpp_type_base](new $cpp_type_base(deref(deref($it))))").substitute(locals())
+            return string.Template("_copy_shared[$cpp_type_base](deref(deref($it)))").substitute(locals())
         else:
-            return string.Template("shared_ptr[$cpp_type](new $cpp_type(deref($it)))").substitute(locals())
+            return string.Template("_copy_shared[$cpp_type](deref($it))").substitute(locals())
 
 class VoidConverter(TypeConverterBase):
 
@@ -206,6 +324,9 @@ class VoidConverter(TypeConverterBase):
     def call_method(self, res_type, cy_call_str):
         return cy_call_str
 
+    def call_method_without_gil(self, res_type, cy_call_str):
+        return None, cy_call_str, None
+
     def matching_python_type(self, cpp_type):
         raise NotImplementedError("void has no matching python type")
 
@@ -239,6 +360,9 @@ class IntegerConverter(TypeConverterBase):
     def type_check_expression(self, cpp_type, argument_var):
         return "isinstance(%s, (int, long))" % (argument_var,)
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        return "isinstance(%s, (int, long))" % (argument_var,)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         code = ""
         call_as = "(<%s>%s)" % (cpp_type, argument_var)
@@ -265,6 +389,9 @@ class DoubleConverter(TypeConverterBase):
     def type_check_expression(self, cpp_type, argument_var):
         return "isinstance(%s, float)" % (argument_var,)
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        return "isinstance(%s, float)" % (argument_var,)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         code = ""
         call_as = "(<%s>%s)" % (cpp_type, argument_var)
@@ -289,6 +416,9 @@ class FloatConverter(TypeConverterBase):
     def type_check_expression(self, cpp_type, argument_var):
         return "isinstance(%s, float)" % (argument_var,)
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        return "isinstance(%s, float)" % (argument_var,)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         code = ""
         call_as = "(<%s>%s)" % (cpp_type, argument_var)
@@ -341,6 +471,9 @@ class CharConverter(TypeConverterBase):
     def type_check_expression(self, cpp_type, argument_var):
         return "isinstance(%s, bytes) and len(%s) == 1" % (argument_var, argument_var,)
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        return "isinstance(%s, bytes)" % (argument_var,)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         code = ""
         call_as = "(<char>((%s)[0]))" % argument_var
@@ -368,6 +501,9 @@ class ConstCharPtrConverter(TypeConverterBase):
     def type_check_expression(self, cpp_type, argument_var):
         return "isinstance(%s, bytes)" % (argument_var,)
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        return "isinstance(%s, bytes)" % (argument_var,)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         code = Code().add("cdef const_char * input_%s = <const_char *> %s" % (argument_var, argument_var))
         call_as = "input_%s" % argument_var
@@ -395,6 +531,9 @@ class CharPtrConverter(TypeConverterBase):
     def type_check_expression(self, cpp_type, argument_var):
         return "isinstance(%s, bytes)" % (argument_var,)
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        return "isinstance(%s, bytes)" % (argument_var,)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         code = ""
         call_as = "(<char *>%s)" % argument_var
@@ -425,6 +564,9 @@ class TypeToWrapConverter(TypeConverterBase):
     def type_check_expression(self, cpp_type, argument_var):
         return "isinstance(%s, %s)" % (argument_var, cpp_type.base_type)
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        return "isinstance(%s, %s)" % (argument_var, cpp_type.base_type)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         code = ""
 
@@ -452,22 +594,59 @@ class TypeToWrapConverter(TypeConverterBase):
                 |cdef $const $t * __r = ($cy_call_str)
                 |if __r == NULL:
                 |    return None
-                |cdef $t * _r = new $t(deref(__r))
+                |cdef shared_ptr[$t] _r = _copy_shared[$t](deref(__r))
                 """, locals())
             return code
 
-        return "cdef %s * _r = new %s(%s)" % (t, t, cy_call_str)
+        if t.is_ref:
+            t = t.base_type
+            return "cdef shared_ptr[%s] _r = _copy_shared[%s](%s)" % (t, t, cy_call_str)
+        # results returned by value are moved into the allocation of the
+        # shared_ptr, see memtests/bench_move_result.py:
+        return "cdef shared_ptr[%s] _r = _move_shared[%s](%s)" % (t, t, cy_call_str)
+
+    def call_method_ref(self, res_type, cy_call_str, owner):
+        if not (res_type.is_ref or res_type.is_ptr):
+            return None
+        if res_type.is_const:
+            # the wrapper classes hold non-const objects, so a wrapper of a
+            # const result would allow to modify owner, copy it instead:
+            return self.call_method(res_type, cy_call_str)
+        t = self.converters.cython_type(res_type).base_type
+        if res_type.is_ptr:
+            return Code().add("""
+                |cdef $t * __r = ($cy_call_str)
+                |if __r == NULL:
+                |    return None
+                |cdef shared_ptr[$t] _r = _share_element($owner, __r)
+                """, locals())
+        # the result points into the object owned by owner and keeps it alive:
+        return "cdef shared_ptr[%s] _r = _share_element(%s, address(%s))" % (t, owner, cy_call_str)
+
+    def call_method_without_gil(self, res_type, cy_call_str):
+        t = self.converters.cython_type(res_type)
+        if t.is_ref:
+            return None
+        if t.is_ptr:
+            const = "const" if t.is_const else ""
+            t = t.base_type
+            return ("cdef %s %s * __r" % (const, t), "__r = (%s)" % cy_call_str,
+                    Code().add("""
+                        |if __r == NULL:
+                        |    return None
+                        |cdef shared_ptr[$t] _r = _copy_shared[$t](deref(__r))
+                        """, locals()))
+        # the move constructor of t is not declared nogil in general, but
+        # _move_shared is:
+        return ("cdef shared_ptr[%s] _r" % t, "_r = _move_shared[%s](%s)" % (t, cy_call_str), None)
 
     def output_conversion(self, cpp_type, input_cpp_var, output_py_var):
 
-        cy_clz = self.converters.cython_type(cpp_type)
-        if cpp_type.is_ptr:
-            cy_clz = cy_clz.base_type
-
+        # input_cpp_var is the shared_ptr created in call_method:
         t = cpp_type.base_type
         return Code().add("""
                       |cdef $t $output_py_var = $t.__new__($t)
-                      |$output_py_var.inst = shared_ptr[$cy_clz]($input_cpp_var)
+                      |$output_py_var.inst = $input_cpp_var
         """, locals())
 
 
@@ -499,6 +678,9 @@ class StdPairConverter(TypeConverterBase):
           + and $inner_check2
           """, locals()).render()
 
+    def shallow_type_check_expression(self, cpp_type, arg_var):
+        return "isinstance(%s, list)" % (arg_var,)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         t1, t2, = cpp_type.template_args
         temp_var = "v%d" % arg_num
@@ -533,7 +715,7 @@ class StdPairConverter(TypeConverterBase):
                 temp1 = "temp1"
                 cleanup_code.add("""
                     |cdef $t1 $temp1 = $t1.__new__($t1)
-                    |$temp1.inst = shared_ptr[$i1](new $i1($temp_var.first))
+                    |$temp1.inst = _copy_shared[$i1]($temp_var.first)
                                    """, locals())
             else:
                 temp1 = "%s.first" % temp_var
@@ -541,7 +723,7 @@ class StdPairConverter(TypeConverterBase):
                 temp2 = "temp2"
                 cleanup_code.add("""
                     |cdef $t2 $temp2 = $t2.__new__($t2)
-                    |$temp2.inst = shared_ptr[$i2](new $i2($temp_var.second))
+                    |$temp2.inst = _copy_shared[$i2]($temp_var.second)
                                    """, locals())
             else:
                 temp2 = "%s.second" % temp_var
@@ -572,7 +754,7 @@ class StdPairConverter(TypeConverterBase):
         elif t1.base_type in self.converters.names_of_wrapper_classes:
             out1 = "out1"
             code.add("""cdef $t1 out1 = $t1.__new__($t1)
-                       |out1.inst = shared_ptr[$i1](new $i1($input_cpp_var.first))
+                       |out1.inst = _copy_shared[$i1]($input_cpp_var.first)
                        """, locals())
         else:
             out1 = "%s.first" % input_cpp_var
@@ -584,7 +766,7 @@ class StdPairConverter(TypeConverterBase):
         elif t2.base_type in self.converters.names_of_wrapper_classes:
             out2 = "out2"
             code.add("""cdef $t2 out2 = $t2.__new__($t2)
-                       |out2.inst = shared_ptr[$i2](new $i2($input_cpp_var.second))
+                       |out2.inst = _copy_shared[$i2]($input_cpp_var.second)
                        """, locals())
         else:
             out2 = "%s.second" % input_cpp_var
@@ -621,6 +803,9 @@ class StdMapConverter(TypeConverterBase):
           + and all($inner_check_2 for v in $arg_var.values())
           """, locals()).render()
 
+    def shallow_type_check_expression(self, cpp_type, arg_var):
+        return "isinstance(%s, dict)" % (arg_var,)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         tt_key, tt_value = cpp_type.template_args
         temp_var = "v%d" % arg_num
@@ -745,7 +930,7 @@ class StdMapConverter(TypeConverterBase):
                     |cdef $py_tt_key $item_key
                     |while $it != $temp_var.end():
                     |   $item_key = $py_tt_key.__new__($py_tt_key)
-                    |   $item_key.inst = shared_ptr[$cy_tt_key](new $cy_tt_key((deref($it)).first))
+                    |   $item_key.inst = _copy_shared[$cy_tt_key]((deref($it)).first)
                     |   replace[$item_key] = $value_conv
                     |   inc($it)
                     |$argument_var.clear()
@@ -762,7 +947,7 @@ class StdMapConverter(TypeConverterBase):
                     |cdef $cy_tt $item
                     |while $it != $temp_var.end():
                     |   $item = $cy_tt.__new__($cy_tt)
-                    |   $item.inst = shared_ptr[$cy_tt_value](new $cy_tt_value((deref($it)).second))
+                    |   $item.inst = _copy_shared[$cy_tt_value]((deref($it)).second)
                     |   replace[$key_conv] = $item
                     |   inc($it)
                     |$argument_var.clear()
@@ -818,7 +1003,7 @@ class StdMapConverter(TypeConverterBase):
                 |cdef $cy_tt $item
                 |while $it != $input_cpp_var.end():
                 |   $item = $cy_tt.__new__($cy_tt)
-                |   $item.inst = shared_ptr[$cy_tt_value](new $cy_tt_value((deref($it)).second))
+                |   $item.inst = _copy_shared[$cy_tt_value]((deref($it)).second)
                 |   $output_py_var[$key_conv] = $item
                 |   inc($it)
                 """, locals())
@@ -833,7 +1018,7 @@ class StdMapConverter(TypeConverterBase):
                 |while $it != $input_cpp_var.end():
                 |   #$output_py_var[$key_conv] = $value_conv
                 |   $item_key = $py_tt_key.__new__($py_tt_key)
-                |   $item_key.inst = shared_ptr[$cy_tt_key](new $cy_tt_key((deref($it)).first))
+                |   $item_key.inst = _copy_shared[$cy_tt_key]((deref($it)).first)
                 |   # $output_py_var[$key_conv] = $value_conv
                 |   $output_py_var[$item_key] = $value_conv
                 |   inc($it)
@@ -872,6 +1057,9 @@ class StdSetConverter(TypeConverterBase):
           |isinstance($arg_var, set) and all($inner_check for li in $arg_var)
           """, locals()).render()
 
+    def shallow_type_check_expression(self, cpp_type, arg_var):
+        return "isinstance(%s, set)" % (arg_var,)
+
     def input_conversion(self, cpp_type, argument_var, arg_num):
         tt, = cpp_type.template_args
         temp_var = "v%d" % arg_num
@@ -1006,8 +1194,30 @@ class StdVectorConverter(TypeConverterBase):
         return True
 
     def matching_python_type(self, cpp_type):
+        if self._buffer_item_type(cpp_type) is not None:
+            return "object"
         return "list"
 
+    def _buffer_item_type(self, cpp_type):
+        """
+        Vectors of numbers which are not modified in place can be converted
+        from any C contiguous buffer (e.g. numpy arrays or array.array) with
+        the same item type. Returns this item type or None.
+        """
+        if cpp_type.topmost_is_ref and not cpp_type.topmost_is_const:
+            return None
+        return self._number_item_type(cpp_type)
+
+    def _number_item_type(self, cpp_type):
+        if cpp_type.is_ptr:
+            return None
+        tt, = cpp_type.template_args
+        if tt.template_args is not None or tt.is_ptr or tt.base_type == "bool":
+            return None
+        if not isinstance(self.converters.get(tt), (IntegerConverter, DoubleConverter, FloatConverter)):
+            return None
+        return self.converters.cython_type(tt)
+
     def type_check_expression(self, cpp_type, arg_var):
         tt, = cpp_type.template_args
         inner_conv = self.converters.get(tt)
@@ -1019,9 +1229,19 @@ class StdVectorConverter(TypeConverterBase):
             arg_var_next = "elemt_rec"
         inner_check = inner_conv.type_check_expression(tt, arg_var_next)
 
-        return Code().add("""
+        check = Code().add("""
           |isinstance($arg_var, list) and all($inner_check for $arg_var_next in $arg_var)
           """, locals()).render()
+        item_type = self._buffer_item_type(cpp_type)
+        if item_type is not None:
+            check += " or _is_buffer_of(%s, <%s *>NULL)" % (arg_var, item_type)
+        return check
+
+    def shallow_type_check_expression(self, cpp_type, arg_var):
+        if self._buffer_item_type(cpp_type) is not None:
+            # _is_buffer only depends on the type of arg_var
+            return "isinstance(%s, list) or _is_buffer(%s)" % (arg_var, arg_var)
+        return "isinstance(%s, list)" % (arg_var,)
 
     def _prepare_nonrecursive_cleanup(self, cpp_type, bottommost_code, it_prev, temp_var, recursion_cnt, *a, **kw):
         # B) Prepare the post-call
@@ -1370,10 +1590,22 @@ class StdVectorConverter(TypeConverterBase):
         else:
             # Case 5: We wrap a regular type
             inner = self.converters.cython_type(tt)
-            # cython cares for conversion of stl containers with std types:
-            code = Code().add("""
-                |cdef libcpp_vector[$inner] $temp_var = $argument_var
-                """, locals())
+            if topmost_code is None and self._buffer_item_type(cpp_type) is not None:
+                # Case 5a: numbers from a buffer are copied at once, other
+                # sequences (e.g. a tuple if the type checks are switched off)
+                # are converted by cython:
+                code = Code().add("""
+                    |cdef libcpp_vector[$inner] $temp_var
+                    |if _is_buffer($argument_var):
+                    |    _assign_buffer($temp_var, $argument_var)
+                    |else:
+                    |    $temp_var = $argument_var
+                    """, locals())
+            else:
+                # cython cares for conversion of stl containers with std types:
+                code = Code().add("""
+                    |cdef libcpp_vector[$inner] $temp_var = $argument_var
+                    """, locals())
 
             cleanup_code = Code().add("")
             if cpp_type.topmost_is_ref and not cpp_type.topmost_is_const:
@@ -1455,6 +1687,69 @@ class StdVectorConverter(TypeConverterBase):
                 """, locals())
             return code
 
+    def output_buffer_conversion(self, cpp_type, input_cpp_var, output_py_var):
+        if self._number_item_type(cpp_type) is None:
+            return None
+        # the content of the vector is swapped into the buffer object, so no
+        # item is copied or converted:
+        return Code().add("""
+            |$output_py_var = AutowrapVectorBuffer.__new__(AutowrapVectorBuffer)
+            |(<AutowrapVectorBuffer>$output_py_var).vec.assign($input_cpp_var)
+            """, locals())
+
+    def lazy_item_class(self, cpp_type):
+        """
+        name of the wrapped class of the items if cpp_type supports
+        output_lazy_conversion, else None
+        """
+        if cpp_type.is_ptr:
+            return None
+        tt, = cpp_type.template_args
+        if tt.is_ptr or tt.template_args is not None or \
+                tt.base_type not in self.converters.names_of_wrapper_classes:
+            return None
+        return tt.base_type
+
+    def output_lazy_conversion(self, cpp_type, input_cpp_var, output_py_var,
+                               share_elements=False):
+        item_class = self.lazy_item_class(cpp_type)
+        if item_class is None:
+            return None
+        tt, = cpp_type.template_args
+        inner = self.converters.cython_type(tt)
+        seq = lazy_sequence_name(item_class)
+        # the content of the vector is swapped into the sequence, the items
+        # are copied (or shared) when they are accessed:
+        code = Code().add("""
+            |$output_py_var = $seq.__new__($seq)
+            |(<$seq>$output_py_var).vec = shared_ptr[libcpp_vector[$inner]](new libcpp_vector[$inner]())
+            |(<$seq>$output_py_var).vec.get().swap($input_cpp_var)
+            """, locals())
+        if share_elements:
+            code.add("(<$seq>$output_py_var).share_elements = True", locals())
+        return code
+
+    def output_shared_conversion(self, cpp_type, input_cpp_var, output_py_var):
+        cy_tt = self.lazy_item_class(cpp_type)
+        if cy_tt is None:
+            return None
+        tt, = cpp_type.template_args
+        inner = self.converters.cython_type(tt)
+        owner = mangle("owner_" + input_cpp_var)
+        i = mangle("i_" + input_cpp_var)
+        item = mangle("item_" + output_py_var)
+        return Code().add("""
+            |cdef shared_ptr[libcpp_vector[$inner]] $owner = shared_ptr[libcpp_vector[$inner]](new libcpp_vector[$inner]())
+            |$owner.get().swap($input_cpp_var)
+            |$output_py_var = []
+            |cdef size_t $i
+            |cdef $cy_tt $item
+            |for $i in range($owner.get().size()):
+            |   $item = $cy_tt.__new__($cy_tt)
+            |   $item.inst = _share_element($owner, address($owner.get().at($i)))
+            |   $output_py_var.append($item)
+            """, locals())
+
 
 class StdStringConverter(TypeConverterBase):
 
@@ -1476,6 +1771,9 @@ class StdStringConverter(TypeConverterBase):
     def type_check_expression(self, cpp_type, argument_var):
         return "isinstance(%s, bytes)" % argument_var
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        return "isinstance(%s, bytes)" % argument_var
+
     def output_conversion(self, cpp_type, input_cpp_var, output_py_var):
         return "%s = <libcpp_string>%s" % (output_py_var, input_cpp_var)
 
@@ -1500,6 +1798,9 @@ class StdStringUnicodeConverter(StdStringConverter):
     def type_check_expression(self, cpp_type, argument_var):
         return "isinstance(%s, (bytes, unicode))" % argument_var
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        return "isinstance(%s, (bytes, unicode))" % argument_var
+
 
 class StdStringUnicodeOutputConverter(StdStringUnicodeConverter):
 
@@ -1551,6 +1852,10 @@ class SharedPtrConverter(TypeConverterBase):
         tt, = cpp_type.template_args
         return "isinstance(%s, %s)" % (argument_var, tt)
 
+    def shallow_type_check_expression(self, cpp_type, argument_var):
+        tt, = cpp_type.template_args
+        return "isinstance(%s, %s)" % (argument_var, tt)
+
     def output_conversion(self, cpp_type, input_cpp_var, output_py_var):
         # L.info("Output conversion for %s" % (cpp_type))
         tt, = cpp_type.template_args
@@ -31,9 +31,11 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
 import autowrap.PXDParser as PXDParser
+import autowrap.Profiling as Profiling
 import autowrap.Types as Types
 import autowrap.Utils as Utils
 import os
+import time
 from collections import defaultdict
 from autowrap.tools import OrderKeepingDictionary
 
@@ -90,6 +92,14 @@ __doc__ = """
                      operator== function.
                      Note that the only requirement for a hash function is that
                      equal objects produce equal values
+        - wrap-type-checks: how the arguments of the wrapped methods are
+                            checked before they are converted, see
+                            CythonGenerator.TYPE_CHECK_LEVELS. Can be
+                            overwritten for single methods with
+                            "# wrap-type-checks:full" after the declaration.
+        - wrap-freelist: number of instances of the Python class which Cython
+                         keeps for reuse instead of freeing them
+                         (@cython.freelist), 0 disables this.
 
     Thus a class could look like this:
 
@@ -171,6 +181,13 @@ class ResolvedClass(object):
             self.wrap_manual_memory == []
         assert( isinstance(self.wrap_manual_memory, list) )
         self.wrap_hash = decl.annotations.get("wrap-hash", [])
+        wrap_type_checks = decl.annotations.get("wrap-type-checks", [])
+        self.wrap_type_checks = wrap_type_checks[0] if wrap_type_checks else None
+        wrap_freelist = decl.annotations.get("wrap-freelist", [])
+        self.wrap_freelist = int(wrap_freelist[0]) if wrap_freelist else None
+        for m in methods:
+            if m.wrap_type_checks is None:
+                m.wrap_type_checks = self.wrap_type_checks
         self.local_map = local_map
         self.instance_map = instance_map
 
@@ -196,6 +213,13 @@ class ResolvedMethod(object):
         self.cpp_decl = decl
         self.wrap_ignore = decl.annotations.get("wrap-ignore", False)
         self.with_nogil = decl.annotations.get("wrap-with-no-gil", False)
+        self.wrap_release_gil = decl.annotations.get("wrap-release-gil", False)
+        self.is_nogil = decl.is_nogil
+        self.wrap_type_checks = decl.annotations.get("wrap-type-checks")
+        self.wrap_return_buffer = decl.annotations.get("wrap-return-buffer", False)
+        self.wrap_return_lazy = decl.annotations.get("wrap-return-lazy", False)
+        self.wrap_share_elements = decl.annotations.get("wrap-share-elements", False)
+        self.wrap_return_ref = decl.annotations.get("wrap-return-ref", False)
         self.local_map = local_map
         self.instance_amp = instance_map
 
@@ -209,52 +233,116 @@ class ResolvedFunction(ResolvedMethod):
     pass
 
 
-def resolve_decls_from_files_single_thread(pathes, root):
+def resolve_decls_from_files_single_thread(pathes, root, cache=None):
     decls = []
-    for k, path in enumerate(pathes):
-        full_path = os.path.join(root, path)
-        if k % 50 == 0: 
-            L.log(25, "parsing progress %s out of %s" % (k, len(pathes)))
-        decls.extend(PXDParser.parse_pxd_file(full_path))
+    with Profiling.phase("parse_pxd_files"):
+        for k, path in enumerate(pathes):
+            full_path = os.path.join(root, path)
+            if k % 50 == 0: 
+                L.log(25, "parsing progress %s out of %s" % (k, len(pathes)))
+            start = time.time()
+            decls.extend(PXDParser.parse_pxd_file(full_path, cache))
+            Profiling.record("pxd_files", full_path, time.time() - start)
     return _resolve_decls(decls)
 
-def resolve_decls_from_files(pathes, root, num_processes = 1):
+def resolve_decls_from_files(pathes, root, num_processes = 1, cache=None):
+    """ `cache` is an optional PXDCache.PXDCache instance for reusing the
+        results of parsing unchanged files from previous runs.
+    """
     if num_processes > 1:
-        return resolve_decls_from_files_multi_thread(pathes, root, num_processes)
+        result = resolve_decls_from_files_multi_thread(pathes, root, num_processes, cache)
     else:
-        return resolve_decls_from_files_single_thread(pathes, root)
+        result = resolve_decls_from_files_single_thread(pathes, root, cache)
+    if cache is not None:
+        L.info("pxd cache: %d hits, %d misses" % (cache.hits, cache.misses))
+        cache.evict()
+    return result
+
+# upper limit for the number of files a process parses per task:
+MAX_CHUNKSIZE = 10
 
-def resolve_decls_from_files_multi_thread(pathes, root, num_processes):
-    """Perform parsing with multiple threads
 
-    This function distributes the work on `num_processes` processes and each
-    process works on 10 files at a time until there are no more files left to
-    work on.
+def resolve_decls_from_files_multi_thread(pathes, root, num_processes, cache=None):
+    """Perform parsing with multiple processes
+
+    All files which are not found in `cache` are distributed on a pool of
+    `num_processes` processes using a single work queue. Larger files are
+    submitted first, so that the last tasks in the queue are the cheap ones
+    and no process idles while another one parses a large file. The
+    declarations are returned in the order of `pathes`, independent of the
+    order in which the processes finish.
     """
+    full_pathes = [os.path.join(root, path) for path in pathes]
+    decls = []
+    for r in _parse_files_in_pool(full_pathes, num_processes, cache):
+        decls.extend(r)
+    return _resolve_decls(decls)
+
+
+@Profiling.timed("parse_pxd_files")
+def _parse_files_in_pool(full_pathes, num_processes, cache):
     import multiprocessing as mp
 
-    CONCURRENT_FILES_PER_CORE = 10
+    results = [None] * len(full_pathes)
+
+    todo = []
+    contents = dict()
+    for i, full_path in enumerate(full_pathes):
+        if cache is not None:
+            with open(full_path, "rb") as fp:
+                contents[i] = fp.read()
+            start = time.time()
+            results[i] = cache.load(full_path, contents[i])
+            if results[i] is not None:
+                Profiling.record("pxd_files", full_path, time.time() - start)
+                continue
+        todo.append(i)
+
+    # largest files first:
+    todo.sort(key=lambda i: _file_size(full_pathes[i]), reverse=True)
+    # a few chunks per process keep the scheduling overhead low for many small
+    # files while the queue still balances the work between the processes:
+    chunksize = max(1, min(MAX_CHUNKSIZE, len(todo) // (num_processes * 4)))
+
+    L.log(25, "parsing %s out of %s files with %s processes" % (len(todo), len(full_pathes), num_processes))
     pool = mp.Pool(processes=num_processes)
-    full_pathes = [os.path.join(root, path) for path in pathes]
+    try:
+        tasks = [(i, full_pathes[i]) for i in todo]
+        for k, (i, decls, seconds) in enumerate(pool.imap_unordered(_parse_indexed, tasks, chunksize)):
+            if k % 50 == 0:
+                L.log(25, "parsing progress %s out of %s with %s processes" % (k, len(todo), num_processes))
+            results[i] = decls
+            Profiling.record("pxd_files", full_pathes[i], seconds)
+            if cache is not None:
+                cache.store(full_pathes[i], contents[i], decls)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
 
-    decls = []
-    while len(full_pathes) > 0:
-        n_work = len(full_pathes)
-        remaining = max(0, n_work - num_processes * CONCURRENT_FILES_PER_CORE)
-        args = [full_pathes.pop() for k in range(n_work - remaining)]
-        L.log(25, "parsing progress %s out of %s with %s processes" % (len(pathes)-remaining, len(pathes), num_processes))
 
-        res = pool.map(PXDParser.parse_pxd_file, args)
-        for r in res:
-            decls.extend(r)
+def _parse_indexed(task):
+    i, full_path = task
+    start = time.time()
+    decls = PXDParser.parse_pxd_file(full_path)
+    return i, decls, time.time() - start
 
-    return _resolve_decls(decls)  
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
 
 
 def resolve_decls_from_string(pxd_in_a_string):
     return _resolve_decls(PXDParser.parse_str(pxd_in_a_string))
 
 
+@Profiling.timed("resolve_decls")
 def _resolve_decls(decls):
     """
     input:
@@ -312,6 +400,7 @@ def _resolve_decls(decls):
     return classes + enums + functions + typedefs, instance_mapping
 
 
+@Profiling.timed("resolve_inheritances")
 def _resolve_all_inheritances(class_decls):
     """
     enriches each class_decl from class_decls with methods from inherited
@@ -35,10 +35,17 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import os
 import sys
 import glob
+import time
 import autowrap.version
 import autowrap.Code
 import autowrap
+import autowrap.DeclResolver
 import optparse
+from autowrap.PXDCache import PXDCache, MemoryPXDCache
+import autowrap.Profiling as Profiling
+import autowrap.Sharding as Sharding
+import autowrap.Build as Build
+from autowrap.Utils import OutputReport, replace_if_changed, temp_path_for
 
 """
 The autowrap process consists of two steps:
@@ -73,9 +80,67 @@ def _main(argv):
     parser.add_option("--converters", action="append", metavar="converter", help="special type converters")
     parser.add_option("--out", action="store", nargs=1, metavar="pyx file", help="the output file (ending in .pyx)")
     parser.add_option("--clr", action="store_true", dest="clr", default=False, help="generate c++/cli instead of cython")
+    parser.add_option("--no-cache", action="store_true", dest="no_cache", default=False,
+                      help="always parse all pxd files (and build all modules with --build) instead "
+                           "of reusing results from %s" % PXDCache.DEFAULT_DIR)
+    parser.add_option("--incremental", action="store_true", dest="incremental", default=False,
+                      help="reuse code generated in the previous run for unchanged classes "
+                           "and do not rewrite unchanged output files")
+    parser.add_option("--profile-report", action="store", dest="profile_report", metavar="PATH",
+                      help="write a JSON report with the time and memory needed for each phase, "
+                           "each pxd file and each wrapped class to PATH")
+    parser.add_option("-j", "--jobs", action="store", type="int", dest="jobs", default=1, metavar="N",
+                      help="number of processes for parsing the pxd files and generating "
+                           "the code (default: 1)")
+    parser.add_option("--type-checks", action="store", type="choice", dest="type_checks",
+                      choices=["full", "shallow", "none"], default="full", metavar="LEVEL",
+                      help="how arguments of wrapped methods are checked: 'full' checks all "
+                           "elements of containers, 'shallow' only the type of the argument, "
+                           "'none' disables the checks (default: full)")
+    parser.add_option("--freelist", action="store", type="int", dest="freelist", default=0, metavar="N",
+                      help="keep up to N instances of each wrapped class for reuse "
+                           "(@cython.freelist) unless the class has a wrap-freelist "
+                           "annotation (default: 0, no freelist)")
+    parser.add_option("--release-gil", action="store_true", dest="release_gil", default=False,
+                      help="release the GIL while calling all methods and functions "
+                           "declared nogil, not only the ones annotated with "
+                           "wrap-release-gil")
+    parser.add_option("--no-prune-cimports", action="store_false", dest="prune_cimports", default=True,
+                      help="cimport all classes of all modules of a multi-module build "
+                           "instead of only the ones used by the generated code of a module")
+    parser.add_option("--shards", action="store", type="int", dest="shards", default=1, metavar="N",
+                      help="distribute the wrapped classes to up to N modules which can be "
+                           "compiled in parallel, the module given by --out imports all of "
+                           "them (default: 1, a single module)")
+    parser.add_option("--shard-by", action="store", type="choice", dest="shard_by",
+                      choices=list(Sharding.SHARD_BY), default="pxd", metavar="GROUPING",
+                      help="keep declarations of the same 'pxd' file or of the same "
+                           "'inheritance' tree in one shard or only balance their 'size' "
+                           "(default: pxd)")
+    parser.add_option("--build", action="store_true", dest="build", default=False,
+                      help="compile the extension modules after running cython, up to "
+                           "--jobs modules in parallel, unchanged modules are taken from "
+                           "the cache (see --no-cache)")
+    parser.add_option("--depends", action="append", dest="depends", metavar="FILE",
+                      help="a further file which the extension modules depend on for "
+                           "--build, e.g. a C++ header which the compiler does not report "
+                           "as dependency (can be given several times)")
+
+    parser.add_option("--watch", action="store_true", dest="watch", default=False,
+                      help="keep running and regenerate the code whenever one of the pxd, "
+                           "addon or converter files changes, only the code for changed "
+                           "classes is generated again")
+    parser.add_option("--watch-interval", action="store", type="float", dest="watch_interval",
+                      default=1.0, metavar="SECONDS",
+                      help="how often --watch checks the files for changes (default: 1.0)")
 
     options, input_ = parser.parse_args(argv)
 
+    if options.jobs < 1:
+        parser.error("--jobs requires a positive number")
+    if options.shards < 1:
+        parser.error("--shards requires a positive number")
+
     assert options.out is not None, "need --out argument"
     out = options.out
     p, out_ext = os.path.splitext(out)
@@ -120,7 +185,19 @@ def _main(argv):
     print("   %5d type converter files to consider" % len(converters))
     print("\n")
 
-    run(pxds, addons, converters, out, clr=options.clr)
+    cache_dir = None if options.no_cache else PXDCache.DEFAULT_DIR
+    run_options = dict(clr=options.clr, num_processes=options.jobs, type_checks=options.type_checks,
+                       freelist=options.freelist, release_gil=options.release_gil,
+                       prune_cimports=options.prune_cimports, shards=options.shards,
+                       shard_by=options.shard_by, build=options.build,
+                       build_depends=options.depends or [],
+                       build_cache_dir=None if options.no_cache else Build.BuildCache.DEFAULT_DIR)
+    if options.watch:
+        watch(pxds, addons, converters, out, options.watch_interval, cache_dir=cache_dir,
+              **run_options)
+    else:
+        run(pxds, addons, converters, out, cache_dir=cache_dir, incremental=options.incremental,
+            profile_report=options.profile_report, **run_options)
 
 
 def collect_manual_code(addons):
@@ -192,25 +269,208 @@ def run_cython(inc_dirs, extra_opts, out):
                    cplus=True)
     if extra_opts is not None:
         options.update(extra_opts)
+    # Cython always writes its output, so it writes to a temporary file which
+    # only replaces the .cpp file if the content changed, as compiling the
+    # .cpp file is the expensive part of a rebuild:
+    cpp_file = os.path.splitext(out)[0] + ".cpp"
+    options["output_file"] = temp_path_for(cpp_file)
     options = CompilationOptions(**options)
-    compile(out, options=options)
+    try:
+        result = compile(out, options=options)
+    except:
+        if os.path.exists(options.output_file):
+            os.remove(options.output_file)
+        raise
+    replace_if_changed(options.output_file, cpp_file)
+    return result
+
+
+def create_wrapper_code(decls, instance_map, addons, converters, out, extra_inc_dirs, extra_opts, include_boost=True, allDecl=[], clr=False,
+                        incremental=False, num_processes=1, type_checks="full", freelist=0,
+                        release_gil=False, prune_cimports=True, shards=1, shard_by="pxd",
+                        build=False, build_cache_dir=Build.BuildCache.DEFAULT_DIR,
+                        build_depends=None, generated_caches=None):
+    with OutputReport() as report:
+        inc_dirs = _create_wrapper_code(decls, instance_map, addons, converters, out, extra_inc_dirs,
+                                        extra_opts, include_boost, allDecl, clr, incremental,
+                                        num_processes, type_checks, freelist, release_gil,
+                                        prune_cimports, shards, shard_by, build, build_cache_dir,
+                                        build_depends, generated_caches)
+    # files which did not change keep their timestamps, so build systems do
+    # not rebuild them:
+    print(report.summary())
+    return inc_dirs
 
 
-def create_wrapper_code(decls, instance_map, addons, converters, out, extra_inc_dirs, extra_opts, include_boost=True, allDecl=[], clr=False):
+def _create_wrapper_code(decls, instance_map, addons, converters, out, extra_inc_dirs, extra_opts,
+                         include_boost, allDecl, clr, incremental, num_processes, type_checks,
+                         freelist, release_gil, prune_cimports, shards, shard_by, build,
+                         build_cache_dir, build_depends, generated_caches):
     cimports, manual_code = collect_manual_code(addons)
     register_converters(converters)
     inc_dirs = autowrap.generate_code(decls, instance_map=instance_map, target=out, 
             debug=False, manual_code=manual_code, 
-            extra_cimports=cimports, include_boost=include_boost, allDecl=allDecl,clr=clr)
+            extra_cimports=cimports, include_boost=include_boost, allDecl=allDecl,clr=clr,
+            incremental=incremental, num_processes=num_processes, type_checks=type_checks,
+            freelist=freelist, release_gil=release_gil, prune_cimports=prune_cimports,
+            shards=shards, shard_by=shard_by, generated_caches=generated_caches)
 
     if extra_inc_dirs is not None:
         inc_dirs += extra_inc_dirs
 
-    run_cython(inc_dirs, extra_opts, out)
+    targets = [out]
+    if shards > 1:
+        # the shards cimport from each other, so they depend on all decls:
+        targets = Sharding.shard_targets(out, Sharding.plan_shards(decls, out, shards, shard_by))
+    if build:
+        # logs the timings of each module:
+        with Profiling.phase("build_modules"):
+            Build.build_modules(targets, inc_dirs, cache_dir=build_cache_dir,
+                                num_processes=num_processes,
+                                depends=sorted(set(d.cpp_decl.pxd_path for d in decls)
+                                               | set(build_depends or [])),
+                                extra_opts=extra_opts)
+        return inc_dirs
+    for target in targets:
+        if incremental and _cython_output_is_up_to_date(decls, target):
+            print("%s is up to date, skip running cython" % target)
+        else:
+            with Profiling.phase("run_cython"):
+                run_cython(inc_dirs, extra_opts, target)
     return inc_dirs
 
 
-def run(pxds, addons, converters, out, extra_inc_dirs=None, extra_opts=None, clr=False):
-    decls, instance_map = autowrap.parse(pxds, ".")
-    return create_wrapper_code(decls, instance_map, addons, converters, out, extra_inc_dirs,
-                               extra_opts, clr=clr)
+def _cython_output_is_up_to_date(decls, out):
+    # the .cpp file created by cython depends on the generated .pyx and .pxd
+    # files and on the .pxd files which were wrapped:
+    cpp_file = os.path.splitext(out)[0] + ".cpp"
+    if not os.path.exists(cpp_file):
+        return False
+    sources = set([out, os.path.splitext(out)[0] + ".pxd"])
+    sources.update(d.cpp_decl.pxd_path for d in decls)
+    cpp_mtime = os.path.getmtime(cpp_file)
+    return all(os.path.getmtime(s) <= cpp_mtime for s in sources if os.path.exists(s))
+
+
+def run(pxds, addons, converters, out, extra_inc_dirs=None, extra_opts=None, clr=False,
+        cache_dir=None, incremental=False, num_processes=1, profile_report=None,
+        type_checks="full", freelist=0, release_gil=False, prune_cimports=True, shards=1,
+        shard_by="pxd", build=False, build_cache_dir=Build.BuildCache.DEFAULT_DIR,
+        build_depends=None):
+    with Profiling.report_to(profile_report):
+        decls, instance_map = autowrap.parse(pxds, ".", num_processes=num_processes, cache_dir=cache_dir)
+        return create_wrapper_code(decls, instance_map, addons, converters, out, extra_inc_dirs,
+                                   extra_opts, clr=clr, incremental=incremental,
+                                   num_processes=num_processes, type_checks=type_checks,
+                                   freelist=freelist, release_gil=release_gil,
+                                   prune_cimports=prune_cimports, shards=shards,
+                                   shard_by=shard_by, build=build, build_cache_dir=build_cache_dir,
+                                   build_depends=build_depends)
+
+
+def _file_stamp(path):
+    # a converter is given as the path of a package or of a module without
+    # extension, see register_converters:
+    if os.path.isdir(path):
+        return tuple(sorted((os.path.join(dirpath, name), os.path.getmtime(os.path.join(dirpath, name)))
+                            for dirpath, __, names in os.walk(path)
+                            for name in names if name.endswith(".py")))
+    for candidate in (path, path + ".py"):
+        if os.path.exists(candidate):
+            stat = os.stat(candidate)
+            return stat.st_mtime, stat.st_size
+    return None
+
+
+def _reload_converters(converters):
+    import importlib
+    reload_ = getattr(importlib, "reload", None)
+    if reload_ is None:
+        # Python < 3.4:
+        import imp
+        reload_ = imp.reload
+    for mod_path in converters:
+        name = os.path.basename(os.path.abspath(mod_path))
+        # submodules of a package first:
+        for loaded in sorted((m for m in sys.modules if m == name or m.startswith(name + ".")),
+                             reverse=True):
+            reload_(sys.modules[loaded])
+
+
+class Watcher(object):
+
+    """
+    State of the watch mode (--watch) which is kept between the generation
+    cycles: the declarations parsed from unchanged .pxd files, the code
+    generated for unchanged classes, the imported converter modules and the
+    modification times of the input files.
+    """
+
+    def __init__(self, pxds, addons, converters, out, cache_dir=None, **options):
+        self.pxds = pxds
+        self.addons = addons
+        self.converters = converters
+        self.out = out
+        self.options = options
+        self.cache = MemoryPXDCache(None if cache_dir is None else PXDCache(cache_dir))
+        self.generated_caches = dict()
+        self.stamps = dict()
+        self.cycles = 0
+        # wall time of the last cycle:
+        self.seconds = None
+
+    def changed_files(self):
+        """ returns the input files which changed since the last call """
+        changed = []
+        for path in self.pxds + self.addons + self.converters:
+            stamp = _file_stamp(path)
+            if path not in self.stamps or self.stamps[path] != stamp:
+                changed.append(path)
+            self.stamps[path] = stamp
+        return changed
+
+    def poll(self):
+        """ regenerates the code if one of the input files changed, returns
+            the changed files
+        """
+        changed = self.changed_files()
+        if not changed:
+            return changed
+        start = time.time()
+        self.cycles += 1
+        from autowrap.ConversionProvider import special_converters
+        # register_converters() registers the converters again in every cycle:
+        del special_converters[:]
+        if self.cycles > 1 and set(changed) & set(self.converters):
+            _reload_converters(self.converters)
+        decls, instance_map = autowrap.DeclResolver.resolve_decls_from_files(
+            self.pxds, ".", self.options.get("num_processes", 1), self.cache)
+        create_wrapper_code(decls, instance_map, self.addons, self.converters, self.out, None, None,
+                            incremental=True, generated_caches=self.generated_caches, **self.options)
+        self.seconds = time.time() - start
+        print("cycle %d: %d changed input file(s), regenerated %s in %.2f seconds" % (
+            self.cycles, len(changed), self.out, self.seconds))
+        return changed
+
+
+def watch(pxds, addons, converters, out, interval=1.0, cache_dir=None, **options):
+    """ generates the code like run() and again whenever one of the input
+        files changes, until interrupted. The files are polled every
+        `interval` seconds. Errors are printed and the next change is waited
+        for. `options` are passed to create_wrapper_code.
+    """
+    import traceback
+    watcher = Watcher(pxds, addons, converters, out, cache_dir, **options)
+    print("watching %d files, press Ctrl-C to stop" % len(watcher.pxds + watcher.addons + watcher.converters))
+    try:
+        while True:
+            try:
+                changed = watcher.poll()
+            except Exception:
+                traceback.print_exc()
+                print("regenerating %s failed, waiting for the next change" % out)
+                changed = True
+            if not changed:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
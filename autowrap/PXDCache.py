@@ -0,0 +1,214 @@
+# encoding: utf-8
+
+__license__ = """
+
+Copyright (c) 2012-2014, Uwe Schmitt, all rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the name of the ETH Zurich nor the names of its contributors may be
+used to endorse or promote products derived from this software without specific
+prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+import logging as L
+
+from autowrap.Utils import replace_file
+from autowrap.version import __version__
+
+"""
+On-disk cache for the results of PXDParser.parse_pxd_file.
+
+Running Cythons parser on every .pxd file dominates a regeneration run in
+which nothing changed. The cache stores the list of PXDParser.BaseDecl
+objects per .pxd file, keyed on the file content, the path of the file
+and the versions of autowrap, Cython and Python, so that unchanged files are
+loaded from disk instead of being parsed again.
+"""
+
+# bump this if the pickled representation of the declarations changes:
+CACHE_FORMAT = 3
+
+
+def _cython_version():
+    try:
+        import Cython
+    except ImportError:
+        return "none"
+    return Cython.__version__
+
+
+class PXDCache(object):
+
+    """
+    Stores one pickle file per parsed .pxd file in `cache_dir`.
+
+    Entries are evicted least recently used first if the cache holds more
+    than `max_entries` files, see evict().
+    """
+
+    DEFAULT_DIR = ".autowrap_cache"
+
+    def __init__(self, cache_dir=DEFAULT_DIR, max_entries=5000):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, path, content):
+        h = hashlib.sha1()
+        meta = "%s|%s|%s|%s|%s" % (CACHE_FORMAT,
+                                   ".".join(map(str, __version__)),
+                                   _cython_version(),
+                                   ".".join(map(str, sys.version_info[:2])),
+                                   os.path.abspath(path))
+        h.update(meta.encode("utf-8"))
+        h.update(content)
+        return h.hexdigest()
+
+    def _entry_path(self, path, content):
+        return os.path.join(self.cache_dir, self._key(path, content) + ".pickle")
+
+    def load(self, path, content):
+        """ returns the cached declarations for the .pxd file `path` with
+            the given `content` (bytes) or None if there is no such entry
+        """
+        entry = self._entry_path(path, content)
+        try:
+            with open(entry, "rb") as fp:
+                decls = pickle.load(fp)
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        except Exception:
+            # corrupt or outdated entry, will be replaced by store():
+            L.info("ignore invalid cache entry %s" % entry)
+            self.misses += 1
+            return None
+        try:
+            # mark as recently used for evict():
+            os.utime(entry, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return decls
+
+    def store(self, path, content, decls):
+        if not os.path.exists(self.cache_dir):
+            try:
+                os.makedirs(self.cache_dir)
+            except OSError:
+                # concurrent creation by other process
+                if not os.path.isdir(self.cache_dir):
+                    raise
+        entry = self._entry_path(path, content)
+        # write to temp file first, so that concurrent readers never see
+        # partially written entries:
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                pickle.dump(decls, fp, pickle.HIGHEST_PROTOCOL)
+            replace_file(temp_path, entry)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def evict(self):
+        """ removes least recently used entries until at most
+            self.max_entries entries are left
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pickle"):
+                continue
+            full_path = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(full_path), full_path))
+            except OSError:
+                pass
+        entries.sort()
+        for __, full_path in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(full_path)
+            except OSError:
+                pass
+
+    def clear(self):
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".pickle") or name.endswith(".tmp"):
+                os.remove(os.path.join(self.cache_dir, name))
+
+
+class MemoryPXDCache(object):
+
+    """
+    Keeps the declarations of the last parse of each .pxd file in memory,
+    for processes which parse the same files again and again, e.g. the watch
+    mode of the command line tool. Files which are not in memory are looked
+    up in `backing`, an optional PXDCache.
+    """
+
+    def __init__(self, backing=None):
+        self.backing = backing
+        # maps the absolute path to (content, pickled declarations):
+        self.entries = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, path, content):
+        entry = self.entries.get(os.path.abspath(path))
+        if entry is not None and entry[0] == content:
+            self.hits += 1
+            # resolving the declarations modifies them, so every load returns
+            # new objects like PXDCache.load:
+            return pickle.loads(entry[1])
+        decls = None if self.backing is None else self.backing.load(path, content)
+        if decls is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._keep(path, content, decls)
+        return decls
+
+    def store(self, path, content, decls):
+        self._keep(path, content, decls)
+        if self.backing is not None:
+            self.backing.store(path, content, decls)
+
+    def _keep(self, path, content, decls):
+        self.entries[os.path.abspath(path)] = (content, pickle.dumps(decls, pickle.HIGHEST_PROTOCOL))
+
+    def evict(self):
+        if self.backing is not None:
+            self.backing.evict()
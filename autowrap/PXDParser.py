@@ -335,16 +335,20 @@ class CppAttributeDecl(BaseDecl):
 
 class CppMethodOrFunctionDecl(BaseDecl):
 
-    def __init__(self, result_type, name, arguments, annotations, pxd_path):
+    def __init__(self, result_type, name, arguments, annotations, pxd_path,
+                 is_nogil=False):
         super(CppMethodOrFunctionDecl, self).__init__(name, annotations, pxd_path)
         self.result_type = result_type
         self.arguments = arguments
+        # declared as nogil in the pxd file, so it can be called without the GIL:
+        self.is_nogil = is_nogil
 
     def transformed(self, typemap):
         result_type = self.result_type.transformed(typemap)
         args = [(n, t.transformed(typemap)) for n, t in self.arguments]
         return CppMethodOrFunctionDecl(result_type, self.name, args,
-                                       self.annotations, self.pxd_path)
+                                       self.annotations, self.pxd_path,
+                                       self.is_nogil)
 
     def matches(self, other):
         """ only checks method name signature,
@@ -401,7 +405,8 @@ class MethodOrAttributeDecl(object):
             tt = _extract_type(arg.base_type, argdecl)
             args.append((argname, tt))
 
-        return CppMethodOrFunctionDecl(result_type, name, args, annotations, pxd_path)
+        return CppMethodOrFunctionDecl(result_type, name, args, annotations, pxd_path,
+                                       decl.nogil)
 
     def __str__(self):
         rv = str(self.result_type)
@@ -422,7 +427,24 @@ def parse_str(what):
         return result
 
 
-def parse_pxd_file(path):
+def parse_pxd_file(path, cache=None):
+    """ parses the .pxd file `path`. If `cache` (a PXDCache.PXDCache) is
+        given, unchanged files are loaded from the cache instead of being
+        parsed again.
+    """
+    if cache is None:
+        return _parse_pxd_file(path)
+
+    with open(path, "rb") as fp:
+        content = fp.read()
+    result = cache.load(path, content)
+    if result is None:
+        result = _parse_pxd_file(path)
+        cache.store(path, content, result)
+    return result
+
+
+def _parse_pxd_file(path):
 
     options, sources = parse_command_line(["--cplus", path])
 
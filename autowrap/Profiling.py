@@ -0,0 +1,201 @@
+# encoding: utf-8
+
+__license__ = """
+
+Copyright (c) 2012-2014, Uwe Schmitt, all rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the name of the ETH Zurich nor the names of its contributors may be
+used to endorse or promote products derived from this software without specific
+prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import contextlib
+import json
+import os
+import sys
+import time
+
+import logging as L
+
+from autowrap.version import __version__
+
+"""
+Timing of the phases of the autowrap pipeline.
+
+Profiling is off by default. Within
+
+    with Profiling.report_to("profile.json"):
+        ...
+
+all phases (see phase()) and per item timings (see record()) are collected
+and written as a JSON report at the end of the block.
+"""
+
+try:
+    _cpu_time = time.process_time
+except AttributeError:
+    # python 2
+    _cpu_time = time.clock
+
+
+def _rss_mb():
+    # the current resident set size, only available on linux:
+    try:
+        with open("/proc/self/statm") as fp:
+            resident_pages = int(fp.read().split()[1])
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / 1024.0 / 1024.0
+
+
+def _peak_rss_mb():
+    # the high-water mark of the process, not of a single phase:
+    try:
+        import resource
+    except ImportError:
+        # not available on windows
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on mac os
+    if sys.platform == "darwin":
+        return max_rss / 1024.0 / 1024.0
+    return max_rss / 1024.0
+
+
+def _children_cpu_time():
+    times = os.times()
+    return times[2] + times[3]
+
+
+class Profile(object):
+
+    """
+    Collects the timings of the phases and items of one autowrap run.
+    """
+
+    def __init__(self):
+        self.phases = []
+        self.items = dict()
+        self._stack = []
+        self._start = time.time()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self._stack.append(name)
+        path = "/".join(self._stack)
+        wall, cpu, children_cpu = time.time(), _cpu_time(), _children_cpu_time()
+        rss = _rss_mb()
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            rss_after = _rss_mb()
+            self.phases.append(dict(name=path,
+                                    wall_seconds=time.time() - wall,
+                                    cpu_seconds=_cpu_time() - cpu,
+                                    children_cpu_seconds=_children_cpu_time() - children_cpu,
+                                    rss_mb=rss_after,
+                                    rss_delta_mb=None if rss is None else rss_after - rss,
+                                    process_peak_rss_mb=_peak_rss_mb()))
+
+    def record(self, category, name, seconds):
+        items = self.items.setdefault(category, dict())
+        items[name] = items.get(name, 0.0) + seconds
+
+    def report(self):
+        result = dict(autowrap_version=".".join(map(str, __version__)),
+                      python_version=".".join(map(str, sys.version_info[:3])),
+                      total_wall_seconds=time.time() - self._start,
+                      process_peak_rss_mb=_peak_rss_mb(),
+                      phases=self.phases)
+        result.update(self.items)
+        return result
+
+    def write(self, path):
+        with open(path, "w") as fp:
+            json.dump(self.report(), fp, indent=2, sort_keys=True)
+        L.info("wrote profile report to %s" % path)
+
+
+_active = None
+
+
+def is_active():
+    return _active is not None
+
+
+@contextlib.contextmanager
+def report_to(path):
+    """ activates profiling within the block and writes the report to `path`
+        at the end. Does nothing if `path` is None.
+    """
+    global _active
+    if path is None:
+        yield None
+        return
+    outer, profile = _active, Profile()
+    _active = profile
+    try:
+        yield profile
+    finally:
+        _active = outer
+        profile.write(path)
+
+
+@contextlib.contextmanager
+def _no_profiling():
+    yield
+
+
+def phase(name):
+    """ context manager which records the wall time, cpu time and memory
+        of the block as phase `name` if profiling is active: `rss_mb` is the
+        resident memory at the end of the block and `rss_delta_mb` its change
+        during the block (linux only), `process_peak_rss_mb` is the peak
+        memory of the process up to the end of the block, so it is the same
+        for all phases after the one which needed the most memory
+    """
+    if _active is None:
+        return _no_profiling()
+    return _active.phase(name)
+
+
+def timed(name):
+    """ decorator which runs the function as phase `name` """
+    def decorator(function):
+        def wrapper(*a, **kw):
+            with phase(name):
+                return function(*a, **kw)
+        wrapper.__name__ = function.__name__
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+    return decorator
+
+
+def record(category, name, seconds):
+    """ adds `seconds` to the time of item `name` (e.g. a .pxd file) in
+        `category` if profiling is active
+    """
+    if _active is not None:
+        _active.record(category, name, seconds)
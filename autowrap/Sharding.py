@@ -0,0 +1,200 @@
+# encoding: utf-8
+
+__license__ = """
+
+Copyright (c) 2012-2014, Uwe Schmitt, all rights reserved.
+
+Redistribution and use in source and binary forms, with or without
+modification, are permitted provided that the following conditions are met:
+
+Redistributions of source code must retain the above copyright notice, this
+list of conditions and the following disclaimer.
+
+Redistributions in binary form must reproduce the above copyright notice, this
+list of conditions and the following disclaimer in the documentation and/or
+other materials provided with the distribution.
+
+Neither the name of the ETH Zurich nor the names of its contributors may be
+used to endorse or promote products derived from this software without specific
+prior written permission.
+
+THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+
+import os
+from collections import OrderedDict
+
+import logging as L
+
+from autowrap.DeclResolver import ResolvedClass
+from autowrap.Types import CppType
+
+"""
+Splitting the wrapped declarations into several modules ("shards").
+
+A single huge .pyx file results in a single huge .cpp file which is compiled
+by a single compiler process. plan_shards() distributes the declarations to
+a given number of shard modules, which are generated as a multi-module build
+(see the `allDecl` argument of autowrap.generate_code), so that they can be
+compiled in parallel. An aggregator module with the original name imports
+all names of the shards, so that the wrapped classes can be used as before.
+"""
+
+# how the declarations are grouped before the groups are distributed to the
+# shards. Declarations attached to a class (wrap-attach) always stay with the
+# class.
+#   pxd:         declarations from the same .pxd file stay together
+#   inheritance: classes stay together with their base classes (wrap-inherits)
+#   size:        only balance the number of wrapped methods
+SHARD_BY = ("pxd", "inheritance", "size")
+
+
+def shard_module_name(target, i):
+    base, __ = os.path.splitext(os.path.basename(target))
+    return "%s_shard%d" % (base, i)
+
+
+def shard_targets(target, plan):
+    """ returns the paths of the .pyx files of the shards in `plan` (see
+        plan_shards) followed by `target`, the path of the aggregator module
+    """
+    target_dir = os.path.dirname(os.path.abspath(target))
+    return [os.path.join(target_dir, name + ".pyx") for name in plan] + [target]
+
+
+def _weight(resolved):
+    if resolved.wrap_ignore:
+        return 0
+    if isinstance(resolved, ResolvedClass):
+        return 1 + sum(len(methods) for methods in resolved.methods.values()) + len(resolved.attributes)
+    return 1
+
+
+class _Groups(object):
+
+    """ union find on the indices of the declarations """
+
+    def __init__(self, n):
+        self.parents = list(range(n))
+
+    def find(self, i):
+        while self.parents[i] != i:
+            self.parents[i] = self.parents[self.parents[i]]
+            i = self.parents[i]
+        return i
+
+    def join(self, indices):
+        indices = [self.find(i) for i in indices]
+        for i in indices[1:]:
+            self.parents[i] = indices[0]
+
+
+def _group_decls(decls, shard_by):
+    """ returns the groups of declarations which go into the same shard,
+        ordered by their first declaration
+    """
+    groups = _Groups(len(decls))
+    by_name = dict()
+    by_cpp_name = dict()
+    by_pxd = dict()
+    for i, resolved in enumerate(decls):
+        by_name.setdefault(resolved.name, []).append(i)
+        by_pxd.setdefault(resolved.cpp_decl.pxd_path, []).append(i)
+        if isinstance(resolved, ResolvedClass):
+            by_cpp_name.setdefault(resolved.cpp_decl.name, []).append(i)
+
+    for i, resolved in enumerate(decls):
+        attached_to = resolved.cpp_decl.annotations.get("wrap-attach", [])
+        # a single class name for functions, a list for classes and enums:
+        if not isinstance(attached_to, list):
+            attached_to = [attached_to]
+        for class_name in attached_to:
+            groups.join([i] + by_name.get(class_name, []))
+        if shard_by == "inheritance" and isinstance(resolved, ResolvedClass):
+            for base in resolved.cpp_decl.annotations.get("wrap-inherits", []):
+                base_name = CppType.from_string(base).base_type
+                groups.join([i] + by_cpp_name.get(base_name, []))
+    if shard_by == "pxd":
+        for indices in by_pxd.values():
+            groups.join(indices)
+
+    grouped = OrderedDict()
+    for i in range(len(decls)):
+        grouped.setdefault(groups.find(i), []).append(i)
+    return list(grouped.values())
+
+
+def plan_shards(decls, target, num_shards, shard_by="pxd"):
+    """ distributes the resolved declarations `decls` to at most `num_shards`
+        shard modules for the aggregator module `target`.
+
+        Returns an OrderedDict which maps the module names of the shards to
+        their declarations, in the form expected as `allDecl`. The groups of
+        declarations (see SHARD_BY) are assigned to the shard with the lowest
+        number of wrapped methods, starting with the largest group. Shards
+        without declarations are left out.
+    """
+    if shard_by not in SHARD_BY:
+        raise ValueError("shard_by must be one of %s, got %r" % (", ".join(SHARD_BY), shard_by))
+    if num_shards < 1:
+        raise ValueError("need at least one shard, got %r" % num_shards)
+
+    groups = _group_decls(decls, shard_by)
+    weights = [sum(_weight(decls[i]) for i in group) for group in groups]
+    # sorted() is stable, so the result does not depend on anything but the
+    # order of decls:
+    order = sorted(range(len(groups)), key=lambda g: -weights[g])
+    loads = [0] * num_shards
+    assigned = [[] for __ in range(num_shards)]
+    for g in order:
+        shard = loads.index(min(loads))
+        loads[shard] += weights[g]
+        assigned[shard].extend(groups[g])
+
+    plan = OrderedDict()
+    for indices in assigned:
+        if indices:
+            name = shard_module_name(target, len(plan))
+            plan[name] = dict(decls=[decls[i] for i in sorted(indices)])
+            L.info("shard %s: %d declarations" % (name, len(indices)))
+    return plan
+
+
+def split_manual_code(plan, manual_code):
+    """ returns a dict which maps the module names of the shards in `plan` to
+        the manual code for them: the manual code of a class goes to the shard
+        of the class, other manual code to the first shard.
+    """
+    shard_of = dict()
+    for name, shard in plan.items():
+        for resolved in shard["decls"]:
+            shard_of[resolved.name] = name
+    split = dict((name, dict()) for name in plan)
+    first = next(iter(plan))
+    for name, code in manual_code.items():
+        split[shard_of.get(name, first)][name] = code
+    return split
+
+
+def write_aggregator_code(fp, plan):
+    """ writes the code of the aggregator module which imports all names
+        of the shards in `plan` """
+    fp.write("# generated by autowrap, imports the wrapped classes and functions\n")
+    fp.write("# of the shard modules:\n")
+    for name in plan:
+        fp.write("from %s import *\n" % name)
+
+
+def write_aggregator_pxd(fp):
+    # replaces the .pxd file of a previous run without shards, which Cython
+    # would use for the aggregator module otherwise:
+    fp.write("# generated by autowrap, the declarations are in the shard modules\n")
@@ -30,59 +30,138 @@ OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
-import copy
 import re
+import weakref
 
 import logging as L
 
 class CppType(object):
 
+    """
+    Immutable representation of a C++ type.
+
+    Instances are interned: creating a type with the same base type, flags
+    and template arguments as an existing one returns the existing
+    instance, and methods like transformed() return new (shared) instances
+    instead of modifying the type. Use replaced() to get a type with some
+    attributes changed.
+    """
+
     CTYPES = ["int", "long", "double", "float", "char", "void"]
     LIBCPPTYPES = ["vector", "string", "list", "pair"]
 
-    def __init__(self, base_type, template_args=None, is_ptr=False, is_ref=False,
-                 is_unsigned=False, is_long=False, enum_items=None, is_const=False):
+    __slots__ = ("base_type", "template_args", "is_ptr", "is_ref", "is_unsigned",
+                 "is_long", "is_const", "is_enum", "enum_items", "topmost_is_ref",
+                 "topmost_is_const", "_str", "_hash", "__weakref__")
+
+    # all fields which define a type, in the order of _make's arguments:
+    _FIELDS = ("base_type", "template_args", "is_ptr", "is_ref", "is_unsigned",
+               "is_long", "is_const", "is_enum", "enum_items", "topmost_is_ref",
+               "topmost_is_const")
+
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, base_type, template_args=None, is_ptr=False, is_ref=False,
+                is_unsigned=False, is_long=False, enum_items=None, is_const=False):
         # L.info("Create new type %s with args %s and const %s" % (base_type, template_args, is_const))
-        self.base_type = "void" if base_type is None else base_type
-        self.is_ptr = is_ptr
-        self.is_ref = is_ref
-        self.is_unsigned = is_unsigned
-        self.is_long = is_long
-        self.is_const = is_const
-        self.is_enum = enum_items is not None
-        self.enum_items = enum_items
-        self.template_args = template_args and tuple(template_args)
-        self.topmost_is_ref = False
-        self.topmost_is_const = False
-        if self.is_ref:
-            self.set_is_ref_rec()
-            self.topmost_is_ref = True
-        if self.is_const:
-            self.set_is_const_rec()
-            self.topmost_is_const = True
-
-    def set_is_const_rec(self):
-        self.topmost_is_const = True
-        if self.template_args is None:
-            return
-        for t in self.template_args:
-            t.set_is_const_rec()
-
-    def set_is_ref_rec(self):
-        self.topmost_is_ref = True
-        if self.template_args is None:
-            return
-        for t in self.template_args:
-            t.set_is_ref_rec()
+        if template_args is not None:
+            template_args = tuple(template_args)
+            if is_ref or is_const:
+                template_args = tuple(t._with_topmost_flags(is_ref, is_const)
+                                      for t in template_args)
+        return cls._make("void" if base_type is None else base_type, template_args,
+                         is_ptr, is_ref, is_unsigned, is_long, is_const,
+                         enum_items is not None, enum_items, is_ref, is_const)
+
+    @classmethod
+    def _make(cls, base_type, template_args, is_ptr, is_ref, is_unsigned, is_long,
+              is_const, is_enum, enum_items, topmost_is_ref, topmost_is_const):
+        is_ptr, is_ref, is_unsigned, is_long = bool(is_ptr), bool(is_ref), bool(is_unsigned), bool(is_long)
+        is_const, is_enum = bool(is_const), bool(is_enum)
+        topmost_is_ref, topmost_is_const = bool(topmost_is_ref), bool(topmost_is_const)
+        if template_args is not None:
+            template_args = tuple(template_args)
+            # template arguments are interned, so identity is equality:
+            targs_key = tuple(id(t) for t in template_args)
+        else:
+            targs_key = None
+        if enum_items is not None:
+            enum_items_key = tuple(tuple(item) for item in enum_items)
+        else:
+            enum_items_key = None
+        key = (base_type, targs_key, is_ptr, is_ref, is_unsigned, is_long, is_const,
+               is_enum, enum_items_key, topmost_is_ref, topmost_is_const)
+        existing = cls._interned.get(key)
+        if existing is not None:
+            return existing
+        self = object.__new__(cls)
+        set_ = object.__setattr__
+        set_(self, "base_type", base_type)
+        set_(self, "template_args", template_args)
+        set_(self, "is_ptr", is_ptr)
+        set_(self, "is_ref", is_ref)
+        set_(self, "is_unsigned", is_unsigned)
+        set_(self, "is_long", is_long)
+        set_(self, "is_const", is_const)
+        set_(self, "is_enum", is_enum)
+        set_(self, "enum_items", enum_items)
+        set_(self, "topmost_is_ref", topmost_is_ref)
+        set_(self, "topmost_is_const", topmost_is_const)
+        set_(self, "_str", None)
+        set_(self, "_hash", None)
+        cls._interned[key] = self
+        return self
+
+    def _fields(self):
+        return tuple(getattr(self, name) for name in self._FIELDS)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CppType is immutable, use replaced() to modify %s" % name)
+
+    def __delattr__(self, name):
+        raise AttributeError("CppType is immutable")
+
+    def __reduce__(self):
+        # unpickled types are interned too:
+        return (_make_cpp_type, self._fields())
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def copy(self):
+        return self
+
+    def replaced(self, **changes):
+        """ returns the type with the attributes in `changes` replaced, e.g.
+            t.replaced(is_ptr=True)
+        """
+        fields = dict(zip(self._FIELDS, self._fields()))
+        for name, value in changes.items():
+            if name not in fields:
+                raise TypeError("%s is not an attribute of CppType" % name)
+            fields[name] = value
+        return CppType._make(*(fields[name] for name in self._FIELDS))
+
+    def _with_topmost_flags(self, is_ref, is_const):
+        # flags of a template argument of a ref / const type
+        template_args = self.template_args
+        if template_args is not None:
+            template_args = tuple(t._with_topmost_flags(is_ref, is_const) for t in template_args)
+        return self.replaced(template_args=template_args,
+                             topmost_is_ref=self.topmost_is_ref or is_ref,
+                             topmost_is_const=self.topmost_is_const or is_const)
 
     def transformed(self, typemap):
-        copied = self.copy()
-        copied._transform(typemap, 0)
-        copied.check_for_recursion()
-        return copied
+        transformed = self._transformed(typemap)
+        transformed.check_for_recursion()
+        return transformed
 
-    def _transform(self, typemap, indent):
+    def _transformed(self, typemap):
 
+        result = self
         aliased_t = typemap.get(self.base_type)
         if aliased_t is not None:
             if self.template_args is not None:
@@ -90,17 +169,17 @@ class CppType(object):
                     map_ = printable(typemap, "\n    ")
                     m = "invalid transform of %s with:\n    %s" % (self, map_)
                     raise Exception(m)
-                self._overwrite_base_type(aliased_t)
+                result = self._overwritten_base_type(aliased_t)
             else:
-                self._overwrite_base_type(aliased_t)
-                self.template_args = aliased_t.template_args
-        for t in self.template_args or []:
-            t._transform(typemap, indent + 1)
+                result = self._overwritten_base_type(aliased_t).replaced(
+                    template_args=aliased_t.template_args)
+        if result.template_args:
+            result = result.replaced(template_args=[t._transformed(typemap)
+                                                    for t in result.template_args])
+        return result
 
     def _rm_flags(self):
-        rv = self.copy()
-        rv.is_ptr = rv.is_ref = False
-        return rv
+        return self.replaced(is_ptr=False, is_ref=False)
 
     def inv_transformed(self, typemap):
         inv_typemap = dict((v, CppType(k)) for (k, v) in typemap.items())
@@ -111,49 +190,50 @@ class CppType(object):
         if pure in inv_typemap:
             res = inv_typemap.get(pure)
             if self.is_ptr:
-                res.is_ptr = True
+                res = res.replaced(is_ptr=True)
             elif self.is_ref:
-                res.is_ref = True
+                res = res.replaced(is_ref=True)
             elif self.is_enum:
-                res.is_enum = True
+                res = res.replaced(is_enum=True)
             return res
         if self.template_args is not None:
             trans_targs = [t._inv_transform(inv_typemap) for t in
                            self.template_args]
-            self.template_args = trans_targs
+            return self.replaced(template_args=trans_targs)
         return self
 
-    def _overwrite_base_type(self, other):
+    def _overwritten_base_type(self, other):
         if self.is_ptr and other.is_ptr:
             raise Exception("double ptr alias not supported")
         if self.is_ref and other.is_ref:
             raise Exception("double ref alias not supported")
         if self.is_ptr and other.is_ref:
             raise Exception("mixing ptr and ref not supported")
-        self.base_type = other.base_type
-        self.is_ptr = self.is_ptr or other.is_ptr
-        self.is_ref = self.is_ref or other.is_ref
-        self.is_unsigned = self.is_unsigned or other.is_unsigned
-        self.is_long = self.is_long or other.is_long
-        self.is_enum = self.is_enum or other.is_enum
+        return self.replaced(base_type=other.base_type,
+                             is_ptr=self.is_ptr or other.is_ptr,
+                             is_ref=self.is_ref or other.is_ref,
+                             is_unsigned=self.is_unsigned or other.is_unsigned,
+                             is_long=self.is_long or other.is_long,
+                             is_enum=self.is_enum or other.is_enum)
 
     def __hash__(self):
         """ for using Types as dict keys """
-        return hash(str(self))
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash(str(self)))
+        return self._hash
 
     def __eq__(self, other):
         """ for using Types as dict keys """
-        return str(self) == str(other)
+        return self is other or str(self) == str(other)
 
     def __ne__(self, other):
         """ for using Types as dict keys """
-        return str(self) != str(other)
-
-    def copy(self):
-        return copy.deepcopy(self)
+        return not self == other
 
     def __str__(self):
-        return self.toString(withConst=True)
+        if self._str is None:
+            object.__setattr__(self, "_str", self.toString(withConst=True))
+        return self._str
 
     def toString(self, withConst):
         if self.is_unsigned and self.base_type != "size_t":
@@ -175,7 +255,10 @@ class CppType(object):
         if ptr and ref:
             raise NotImplementedError("can not handel ref and ptr together")
         if self.template_args is not None:
-            inner = "[%s]" % (",".join(t.toString(withConst) for t in self.template_args))
+            if withConst:
+                inner = "[%s]" % (",".join(str(t) for t in self.template_args))
+            else:
+                inner = "[%s]" % (",".join(t.toString(withConst) for t in self.template_args))
         else:
             inner = ""
         result = "%s%s%s %s%s %s" % (const_, unsigned, long_, self.base_type, inner,
@@ -212,61 +295,93 @@ class CppType(object):
 
     @staticmethod
     def from_string(str_):
-        return CppType._from_string(str_)
+        try:
+            return _from_string_cache[str_]
+        except KeyError:
+            pass
+        result = CppType._from_string(str_)
+        if len(_from_string_cache) >= FROM_STRING_CACHE_SIZE:
+            _from_string_cache.clear()
+        _from_string_cache[str_] = result
+        return result
 
     @staticmethod
     def _from_string(str_):
-        # TODO is there a reason why "_" is not in the regex?
-        matched = re.match(r"([a-zA-Z0-9][ a-zA-Z0-9_]*)(\[.*\])? *[&\*]?",
-                           str_.strip())
-        if matched is None:
+        tokens = _TOKEN.findall(str_)
+        if not tokens or "".join(tokens) != re.sub(r"\s", "", str_):
             raise Exception("can not parse '%s'" % str_)
-        base_type, t_str = matched.groups()
-        if t_str is None:
-            orig_for_error_message = base_type
-            base_type = base_type.strip()
-            is_unsigned, is_long = False, False
-
-            # order of unsigned and long is arbitrary:
-            if base_type.startswith("unsigned "):
-                is_unsigned = True
-                base_type = base_type[9:].strip()
-            if base_type.startswith("long "):
-                is_long = True
-                base_type = base_type[5:].strip()
-
-            if not is_unsigned:
-                if base_type.startswith("unsigned "):
-                    is_unsigned = True
-                    base_type = base_type[9:].strip()
-            if not is_long:
-                if base_type.startswith("long "):
-                    is_long = True
-                    base_type = base_type[5:].strip()
-
-            if base_type.startswith("long"):
-                raise Exception("can not parse %s" % orig_for_error_message)
-
-            if base_type.startswith("unsigned"):
-                raise Exception("can not parse %s" % orig_for_error_message)
-
-            if " " in base_type:
-                raise Exception("can not parse %s" % orig_for_error_message)
-
-            is_ref = str_.endswith("&")
-            is_ptr = str_.endswith("*")
-            return CppType(base_type, is_unsigned=is_unsigned, is_ptr=is_ptr, is_ref=is_ref,
-                           is_long=is_long)
-
-        t_args = t_str[1:-1].split(",")
-        if t_args == [""]:
-            t_types = []
-        else:
-            t_types = [CppType.from_string(t.strip()) for t in t_args]
-        is_ref = str_.endswith("&")
-        is_ptr = str_.endswith("*")
+        type_, pos = _parse_type(tokens, 0, str_)
+        if pos != len(tokens):
+            raise Exception("can not parse '%s'" % str_)
+        return type_
+
 
-        return CppType(base_type, t_types, is_ref=is_ref, is_ptr=is_ptr)
+# parsed types are immutable and can be shared, see CppType.from_string:
+FROM_STRING_CACHE_SIZE = 1024
+_from_string_cache = dict()
+
+_TOKEN = re.compile(r"[a-zA-Z0-9_]+|[\[\],&*]")
+
+
+def _is_name(token):
+    return token[0] not in "[],&*"
+
+
+def _parse_type(tokens, pos, str_):
+    """ parses a type starting at tokens[pos], returns the type and the
+        position of the first token after the type. The grammar is
+
+            type := ["unsigned"] ["long"] name ["[" [type ("," type)*] "]"] ["*" | "&"]
+
+        where "unsigned" and "long" may appear in any order.
+    """
+    words = []
+    while pos < len(tokens) and _is_name(tokens[pos]):
+        words.append(tokens[pos])
+        pos += 1
+    is_unsigned, is_long = False, False
+    while len(words) > 1 and words[0] in ("unsigned", "long"):
+        modifier = words.pop(0)
+        if modifier == "unsigned":
+            if is_unsigned:
+                raise Exception("can not parse %s" % str_)
+            is_unsigned = True
+        else:
+            if is_long:
+                raise Exception("can not parse %s" % str_)
+            is_long = True
+    if len(words) != 1 or words[0] in ("unsigned", "long"):
+        raise Exception("can not parse %s" % str_)
+    base_type = words[0]
+
+    template_args = None
+    if pos < len(tokens) and tokens[pos] == "[":
+        template_args = []
+        pos += 1
+        if pos < len(tokens) and tokens[pos] == "]":
+            pos += 1
+        else:
+            while True:
+                arg, pos = _parse_type(tokens, pos, str_)
+                template_args.append(arg)
+                if pos < len(tokens) and tokens[pos] == ",":
+                    pos += 1
+                elif pos < len(tokens) and tokens[pos] == "]":
+                    pos += 1
+                    break
+                else:
+                    raise Exception("can not parse %s" % str_)
+
+    is_ptr = is_ref = False
+    if pos < len(tokens) and tokens[pos] in "*&":
+        is_ptr, is_ref = tokens[pos] == "*", tokens[pos] == "&"
+        pos += 1
+    return CppType(base_type, template_args, is_ptr=is_ptr, is_ref=is_ref,
+                   is_unsigned=is_unsigned, is_long=is_long), pos
+
+
+def _make_cpp_type(*fields):
+    return CppType._make(*fields)
 
 
 def printable(type_map, join_str=", "):
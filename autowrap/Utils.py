@@ -32,6 +32,8 @@ OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
+import filecmp
+import os
 import sys
 
 template = """
@@ -121,6 +123,104 @@ def compile_and_import(name, source_files, include_dirs=None, **kws):
     return result
 
 
+def replace_file(src, dst):
+    """ renames src to dst, replacing dst if it exists """
+    try:
+        os.replace(src, dst)
+    except AttributeError:
+        # python 2
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+# OutputReport instances which are active, see OutputReport:
+_output_reports = []
+
+
+class OutputReport(object):
+
+    """ records the files written by write_if_changed() and
+        replace_if_changed() within
+
+            with OutputReport() as report:
+                ...
+
+        `changed` lists the files whose content changed, `unchanged` the
+        files which were not touched as their content did not change.
+    """
+
+    def __init__(self):
+        self.changed = []
+        self.unchanged = []
+
+    def __enter__(self):
+        _output_reports.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        _output_reports.remove(self)
+
+    def add(self, path, changed):
+        (self.changed if changed else self.unchanged).append(os.path.abspath(path))
+
+    def summary(self):
+        lines = ["%d of %d output files changed" % (len(self.changed),
+                                                    len(self.changed) + len(self.unchanged))]
+        lines.extend("    %s" % path for path in self.changed)
+        return "\n".join(lines)
+
+
+def replace_if_changed(temp_path, path, keep_unchanged=True):
+    """ renames the file `temp_path` to `path`. If `keep_unchanged` is True
+        and `path` already has the same content, `temp_path` is removed and
+        `path` is not touched, so that build systems do not consider it as
+        modified. Returns True if `path` was replaced.
+    """
+    try:
+        changed = not (keep_unchanged and os.path.exists(path)
+                       and filecmp.cmp(temp_path, path, shallow=False))
+        if changed:
+            replace_file(temp_path, path)
+        else:
+            os.remove(temp_path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    report_output(path, changed)
+    return changed
+
+
+def report_output(path, changed):
+    """ adds the output file `path` to the active OutputReport instances """
+    for report in _output_reports:
+        report.add(path, changed)
+
+
+def temp_path_for(path):
+    """ path of a temporary file in the directory of `path`, which can be
+        renamed to `path` atomically """
+    return "%s.%d.tmp" % (path, os.getpid())
+
+
+def write_if_changed(path, write_content, keep_unchanged=True, mode="w"):
+    """ calls write_content(fp) with a file object for a temporary file which
+        replaces `path` afterwards, so that `path` is never left partially
+        written. See replace_if_changed() for `keep_unchanged`. Returns True
+        if `path` was written.
+    """
+    temp_path = temp_path_for(path)
+    try:
+        with open(temp_path, mode) as fp:
+            write_content(fp)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return replace_if_changed(temp_path, path, keep_unchanged)
+
+
 def remove_labels(graph):
     _remove_labels = lambda succ_list: [s for s, label in succ_list]
     pure_graph = dict((n0, _remove_labels(ni)) for n0, ni in graph.items())
@@ -35,6 +35,7 @@ OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 from .version import *
 import logging as L
+import os
 L.basicConfig(level=L.INFO)
 
 """
@@ -45,14 +46,101 @@ The autowrap process consists of two steps:
 """
 
 
-def parse(files, root, num_processes=1):
+def parse(files, root, num_processes=1, cache_dir=None, profile_report=None):
+    """ if `cache_dir` is given, the results of parsing the .pxd files are
+        cached in this directory and reused for unchanged files.
+
+        if `profile_report` is given, a JSON report with the time needed for
+        the phases of parsing and for each file is written to this path.
+    """
     import autowrap.DeclResolver
-    return DeclResolver.resolve_decls_from_files(files, root, num_processes)
+    import autowrap.Profiling
+    cache = None
+    if cache_dir is not None:
+        from autowrap.PXDCache import PXDCache
+        cache = PXDCache(cache_dir)
+    with Profiling.report_to(profile_report), Profiling.phase("parse"):
+        return DeclResolver.resolve_decls_from_files(files, root, num_processes, cache)
 
 
 def generate_code(decls, instance_map, target, debug=False, manual_code=None,
                   extra_cimports=None, include_boost=True, include_numpy=False, 
-                  allDecl=[], clr=False):
+                  allDecl=[], clr=False, incremental=False, num_processes=1,
+                  profile_report=None, type_checks="full", freelist=0,
+                  release_gil=False, prune_cimports=True, shards=1, shard_by="pxd",
+                  generated_caches=None):
+    """ if `incremental` is True, the code generated for each class, enum and
+        free function is stored in a state file next to `target` and reused
+        in the next run if the declaration did not change. Unchanged output
+        files are not rewritten in this case.
+
+        `num_processes` > 1 generates the Cython code for the classes, enums
+        and free functions in parallel.
+
+        if `profile_report` is given, a JSON report with the time needed for
+        the phases of code generation and for each class is written to this
+        path.
+
+        `type_checks` selects how the arguments of the wrapped methods are
+        checked (see CythonGenerator.TYPE_CHECK_LEVELS) for classes and
+        methods without a wrap-type-checks annotation.
+
+        `freelist` is the size of the @cython.freelist of the generated
+        classes without a wrap-freelist annotation (0: no freelist).
+
+        if `release_gil` is True, the GIL is released while calling all
+        methods and free functions which are declared nogil, not only the
+        ones with a wrap-release-gil annotation.
+
+        if `prune_cimports` is True, a module of a multi-module build
+        (`allDecl`) only cimports the classes, enums, functions and typedefs
+        of the project which its generated code and manual code refer to,
+        instead of all of them.
+
+        `shards` > 1 distributes the wrapped declarations to up to `shards`
+        modules which can be compiled in parallel, grouped as selected by
+        `shard_by` (see Sharding.SHARD_BY). `target` becomes a module which
+        imports all names of the shard modules, see Sharding.plan_shards
+        for the names of the shard modules.
+
+        `generated_caches` is an optional dict which keeps the code generated
+        in `incremental` mode in memory between calls, so that the state file
+        does not have to be read again, e.g. for the watch mode of the
+        command line tool.
+    """
+    import autowrap.Profiling
+    with Profiling.report_to(profile_report), Profiling.phase("generate_code"):
+        args = (include_boost, include_numpy, clr, incremental, num_processes,
+                type_checks, freelist, release_gil, prune_cimports, generated_caches)
+        if shards > 1:
+            if clr or allDecl:
+                raise ValueError("shards are not supported for clr or multi-module (allDecl) builds")
+            return _generate_sharded_code(decls, instance_map, target, debug, manual_code,
+                                          extra_cimports, shards, shard_by, *args)
+        return _generate_code(decls, instance_map, target, debug, manual_code,
+                              extra_cimports, allDecl, *args)
+
+
+def _generate_sharded_code(decls, instance_map, target, debug, manual_code, extra_cimports,
+                           shards, shard_by, *args):
+    from autowrap import Sharding
+    from autowrap.Utils import write_if_changed
+    plan = Sharding.plan_shards(decls, target, shards, shard_by)
+    manual_codes = Sharding.split_manual_code(plan, manual_code or dict())
+    shard_targets = Sharding.shard_targets(target, plan)
+    includes = None
+    for name, shard_target in zip(plan, shard_targets):
+        with Profiling.phase("generate_%s" % name):
+            includes = _generate_code(plan[name]["decls"], instance_map, shard_target, debug,
+                                      manual_codes[name], extra_cimports, plan, *args)
+    write_if_changed(target, lambda fp: Sharding.write_aggregator_code(fp, plan))
+    write_if_changed(os.path.splitext(target)[0] + ".pxd", Sharding.write_aggregator_pxd)
+    return includes
+
+
+def _generate_code(decls, instance_map, target, debug, manual_code, extra_cimports, allDecl,
+                   include_boost, include_numpy, clr, incremental, num_processes,
+                   type_checks, freelist, release_gil, prune_cimports, generated_caches):
 
     if clr:
         from autowrap.code_generators import CLRGenerator
@@ -72,7 +160,19 @@ def generate_code(decls, instance_map, target, debug=False, manual_code=None,
                       allDecl=allDecl)
     
     gen.include_numpy=include_numpy
+    if incremental and not clr:
+        gen.incremental_state_path = os.path.splitext(gen.target_path)[0] + ".autowrap_state"
+        if generated_caches is not None:
+            gen.generated_cache = generated_caches.get(gen.target_path)
+    if not clr:
+        gen.num_processes = num_processes
+        gen.type_checks = type_checks
+        gen.freelist = freelist
+        gen.release_gil = release_gil
+        gen.prune_cimports = prune_cimports
     gen.create_code_file(debug)
+    if incremental and not clr and generated_caches is not None:
+        generated_caches[gen.target_path] = gen.generated_cache
     includes = gen.get_include_dirs(include_boost)
     print("Autowrap has wrapped %s classes, %s methods and %s enums" % (
         gen.wrapped_classes_cnt,
@@ -31,10 +31,25 @@ OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
+import hashlib
+import inspect
 import os.path
+import pickle
+import re
+import time
+from collections import defaultdict, OrderedDict
+try:
+	from StringIO import StringIO
+except ImportError:
+	from io import StringIO
+from autowrap.ConversionProvider import lazy_sequence_name, TypeToWrapConverter
 from autowrap.DeclResolver import (ResolvedClass, ResolvedEnum, ResolvedTypeDef, ResolvedFunction)
+from autowrap.Types import printable
+from autowrap.Utils import write_if_changed
+from autowrap.version import __version__
 from autowrap.code_generators.CodeGeneratorBase import CodeGeneratorBase
 import autowrap.Code as Code
+import autowrap.Profiling as Profiling
 import logging as logger
 from autowrap.code_generators.Utils import augment_arg_names
 
@@ -55,6 +70,71 @@ else:
 	bytes = str
 	basestring = basestring
 
+# How the arguments of wrapped methods are checked before they are converted:
+#   full:    the complete type_check_expression of the converter, e.g. the
+#            type of every element of a list
+#   shallow: only the top-level type (shallow_type_check_expression), wrong
+#            elements raise an exception during the conversion
+#   none:    no checks
+TYPE_CHECK_LEVELS = ("full", "shallow", "none")
+
+class GeneratedCode(object):
+	"""
+	Collects the code which the create_wrapper_for_* methods of the
+	CythonGenerator create for a single class, enum or free function, so that
+	it can be cached and added to the generator later on.
+	"""
+
+	def __init__(self):
+		self.class_codes = defaultdict(Code.Code)
+		self.class_pxd_codes = defaultdict(Code.Code)
+		self.class_codes_extra = defaultdict(list)
+		self.top_level_code = []
+		self.top_level_pyx_code = []
+		self.wrapped_enums_cnt = 0
+		self.wrapped_classes_cnt = 0
+		self.wrapped_methods_cnt = 0
+		# time needed to generate the code:
+		self.seconds = 0.0
+
+
+# attributes of the CythonGenerator which are collected in a GeneratedCode
+# instance:
+_GENERATED_ATTRIBUTES = ("class_codes", "class_pxd_codes", "class_codes_extra",
+						 "top_level_code", "top_level_pyx_code")
+_GENERATED_COUNTERS = ("wrapped_enums_cnt", "wrapped_classes_cnt", "wrapped_methods_cnt")
+
+
+def _write_joined(fp, codes):
+	# same as fp.write("\n".join(c.render() for c in codes))
+	for i, c in enumerate(codes):
+		if i:
+			fp.write("\n")
+		c.write_to(fp)
+
+
+# (generator, work) of the parent process, inherited by forked workers:
+_worker_state = None
+
+
+def _generate_in_worker(i):
+	generator, work = _worker_state
+	resolved, method_name = work[i]
+	return i, generator.generate_code_for(getattr(generator, method_name), resolved)
+
+
+def _fork_pool(num_processes):
+	import multiprocessing as mp
+	if hasattr(mp, "get_context"):
+		try:
+			return mp.get_context("fork").Pool(processes=num_processes)
+		except ValueError:
+			return None
+	if hasattr(os, "fork"):
+		return mp.Pool(processes=num_processes)
+	return None
+
+
 class CythonGenerator(CodeGeneratorBase):
 	def __init__(self, resolved, instance_mapping, pyx_target_path=None, manual_code=None, extra_cimports=None,
 				 allDecl={}):
@@ -65,6 +145,39 @@ class CythonGenerator(CodeGeneratorBase):
 			super(CodeGeneratorBase, self).__init__(resolved, instance_mapping, pyx_target_path, manual_code,
 													extra_cimports, allDecl)
 
+		# Incremental generation: if incremental_state_path is set, the code
+		# generated for each class, enum and free function is stored together
+		# with a fingerprint of its declaration in this file and reused in the
+		# next run if the fingerprint did not change.
+		self.incremental_state_path = None
+		self.generated_cache = None
+		self.reused_cnt = 0
+
+		# number of processes used for generating the code of the classes,
+		# enums and free functions (see _generate_in_parallel):
+		self.num_processes = 1
+
+		# see _lazy_sequence_item_classes:
+		self._lazy_item_classes = None
+
+		# default for methods and classes without wrap-type-checks annotation,
+		# one of TYPE_CHECK_LEVELS:
+		self.type_checks = "full"
+
+		# size of the @cython.freelist of classes without wrap-freelist
+		# annotation, 0 means no freelist:
+		self.freelist = 0
+
+		# release the GIL for the call of all methods and functions which are
+		# declared nogil (see _releases_gil):
+		self.release_gil = False
+
+		# in multi-module builds (allDecl), only cimport the classes, enums,
+		# functions and typedefs which are referenced by the generated code
+		# of this module (see _add_referenced_cimports):
+		self.prune_cimports = True
+		self._candidate_cimports = []
+
 	def create_code_file(self, debug=False):
 		"""This creates the actual Cython code
 		It calls create_wrapper_for_class, create_wrapper_for_enum and
@@ -75,19 +188,36 @@ class CythonGenerator(CodeGeneratorBase):
 		self.create_cimports()
 		self.create_foreign_cimports()
 		self.create_includes()
-	
-		def create_for(clz, method):
-			for resolved in self.resolved:
-				if resolved.wrap_ignore:
-					continue
-				if isinstance(resolved, clz):
-					method(resolved)
-	
+		if not self._prunes_cimports():
+			self._add_referenced_cimports(None)
+
 		# first wrap classes, so that self.class_codes[..] is initialized
 		# for attaching enums or static functions
-		create_for(ResolvedClass, self.create_wrapper_for_class)
-		create_for(ResolvedEnum, self.create_wrapper_for_enum)
-		create_for(ResolvedFunction, self.create_wrapper_for_free_function)
+		work = []
+		for clz, method in ((ResolvedClass, self.create_wrapper_for_class),
+							(ResolvedEnum, self.create_wrapper_for_enum),
+							(ResolvedFunction, self.create_wrapper_for_free_function)):
+			for resolved in self.resolved:
+				if not resolved.wrap_ignore and isinstance(resolved, clz):
+					work.append((resolved, method.__name__))
+
+		if self.incremental_state_path is not None:
+			self._load_generated_cache()
+		with Profiling.phase("generate_wrappers"):
+			if self.generated_cache is None and self.num_processes <= 1:
+				for resolved, method_name in work:
+					start = time.time()
+					getattr(self, method_name)(resolved)
+					Profiling.record("generated_code", resolved.name, time.time() - start)
+			else:
+				self._create_generated_code(work)
+		self.cr.log_memo_statistics()
+
+		# the sequence classes for wrap-return-lazy are defined in the module
+		# of the method, as the item class may be wrapped in another module:
+		for r_class in self.all_classes:
+			if r_class.name in self._lazy_sequence_item_classes():
+				self.top_level_pyx_code.append(self.create_lazy_sequence_class(r_class))
 	
 		# resolve extra
 		for clz, codes in self.class_codes_extra.items():
@@ -95,44 +225,242 @@ class CythonGenerator(CodeGeneratorBase):
 				raise Exception("Cannot attach to class", clz, "make sure all wrap-attach are in the same file as parent class")
 			for c in codes:
 				self.class_codes[clz].add(c)
+
+		if self._prunes_cimports():
+			with Profiling.phase("prune_cimports"):
+				self._add_referenced_cimports(self._referenced_names())
 	
-		# Create code for the pyx file
+		with Profiling.phase("write_output"):
+			if debug:
+				for write_code in (self.write_pxd_code, self.write_pyx_code):
+					fp = StringIO()
+					write_code(fp)
+					print(fp.getvalue())
+			self._write_output(self.target_path, self.write_pyx_code)
+	
+			if self.write_pxd:
+				self._write_output(self.target_pxd_path, self.write_pxd_code)
+
+	def write_pyx_code(self, fp):
+		"""Writes the code for the pyx file to the file object `fp`, class by
+		class without rendering the full file into memory.
+		"""
 		if self.write_pxd:
-			pyx_code = self.create_default_cimports().render()
-			pyx_code += "\n".join(ci.render() for ci in self.top_level_pyx_code)
+			self.create_default_cimports().write_to(fp)
+			_write_joined(fp, self.top_level_pyx_code)
 		else:
-			pyx_code = "\n".join(ci.render() for ci in self.top_level_code)
-			pyx_code += "\n".join(ci.render() for ci in self.top_level_pyx_code)
+			_write_joined(fp, self.top_level_code)
+			_write_joined(fp, self.top_level_pyx_code)
 	
-		pyx_code += " \n"
-		names = set()
+		fp.write(" \n")
 		for n, c in self.class_codes.items():
-			pyx_code += c.render()
-			pyx_code += " \n"
-			names.add(n)
+			c.write_to(fp)
+			fp.write(" \n")
 	
 		# manual code which does not extend wrapped classes:
 		for name, c in self.manual_code.items():
-			if name not in names:
-				pyx_code += c.render()
-			pyx_code += " \n"
-	
-		# Create code for the pxd file
-		pxd_code = "\n".join(ci.render() for ci in self.top_level_code)
-		pxd_code += " \n"
+			if name not in self.class_codes:
+				c.write_to(fp)
+			fp.write(" \n")
+
+	def write_pxd_code(self, fp):
+		"""Writes the code for the pxd file to the file object `fp`."""
+		_write_joined(fp, self.top_level_code)
+		fp.write(" \n")
 		for n, c in self.class_pxd_codes.items():
-			pxd_code += c.render()
-			pxd_code += " \n"
-	
-		if debug:
-			print(pxd_code)
-			print(pyx_code)
-		with open(self.target_path, "w") as fp:
-			fp.write(pyx_code)
-	
-		if self.write_pxd:
-			with open(self.target_pxd_path, "w") as fp:
-				fp.write(pxd_code)
+			c.write_to(fp)
+			fp.write(" \n")
+
+	def _create_generated_code(self, work):
+		"""Creates the code for the (resolved, method_name) items in `work`
+		using generate_code_for, reusing code from self.generated_cache and
+		running up to self.num_processes processes. The results are added in
+		the order of `work`, so the output is the same as for the serial case.
+		"""
+		results = [None] * len(work)
+		fingerprints = [None] * len(work)
+		if self.generated_cache is not None:
+			self._global_fingerprint_cached = self._global_fingerprint()
+			for i, (resolved, __) in enumerate(work):
+				fingerprints[i] = self._fingerprint(resolved)
+				pickled = self.generated_cache.get(fingerprints[i])
+				if pickled is not None:
+					results[i] = pickle.loads(pickled)
+					self.reused_cnt += 1
+			logger.info("reused generated code for %d classes, enums and functions" % self.reused_cnt)
+
+		todo = [i for i in range(len(work)) if results[i] is None]
+		for i, generated in self._generate_in_parallel(work, todo):
+			results[i] = generated
+			Profiling.record("generated_code", work[i][0].name, generated.seconds)
+
+		if self.generated_cache is not None:
+			# only keep entries of the current run, stale entries are dropped:
+			used_cache = dict()
+			for i, fingerprint in enumerate(fingerprints):
+				pickled = self.generated_cache.get(fingerprint)
+				if pickled is None:
+					pickled = pickle.dumps(results[i], pickle.HIGHEST_PROTOCOL)
+				used_cache[fingerprint] = pickled
+			self.generated_cache = used_cache
+			if self.incremental_state_path is not None:
+				self._store_generated_cache()
+
+		for generated in results:
+			self.add_generated_code(generated)
+
+	def _generate_in_parallel(self, work, todo):
+		"""Yields (i, GeneratedCode) for every index i in `todo`.
+
+		The processes are forked from the current process, so they inherit
+		the generator including the converter registry which is read-only
+		while the code is generated. Without fork() support the code is
+		generated serially.
+		"""
+		global _worker_state
+		pool = None
+		if self.num_processes > 1 and len(todo) > 1:
+			_worker_state = (self, work)
+			pool = _fork_pool(self.num_processes)
+			if pool is None:
+				_worker_state = None
+				logger.info("fork() is not supported, generate code serially")
+		if pool is None:
+			for i in todo:
+				resolved, method_name = work[i]
+				yield i, self.generate_code_for(getattr(self, method_name), resolved)
+			return
+
+		# classes with many methods first, so that no process is left with
+		# a large class at the end:
+		todo = sorted(todo, key=lambda i: -len(getattr(work[i][0], "methods", ())))
+		chunksize = max(1, min(10, len(todo) // (self.num_processes * 4)))
+		logger.info("generate code for %d classes, enums and functions with %d processes"
+					% (len(todo), self.num_processes))
+		try:
+			for i, generated in pool.imap_unordered(_generate_in_worker, todo, chunksize):
+				yield i, generated
+			pool.close()
+		except:
+			pool.terminate()
+			raise
+		finally:
+			pool.join()
+			_worker_state = None
+
+	def _write_output(self, path, write_content):
+		# unchanged files are not touched, so that the build system does not
+		# recompile them:
+		if not write_if_changed(path, write_content):
+			logger.info("%s is unchanged" % path)
+
+	def generate_code_for(self, method, resolved):
+		"""Calls `method` (one of the create_wrapper_for_* methods) for
+		`resolved` and returns the created code as a GeneratedCode instance
+		instead of adding it to the generator.
+		"""
+		generated = GeneratedCode()
+		saved = dict((name, getattr(self, name)) for name in _GENERATED_ATTRIBUTES + _GENERATED_COUNTERS)
+		for name in _GENERATED_ATTRIBUTES:
+			setattr(self, name, getattr(generated, name))
+		for name in _GENERATED_COUNTERS:
+			setattr(self, name, 0)
+		start = time.time()
+		try:
+			method(resolved)
+			generated.seconds = time.time() - start
+			for name in _GENERATED_COUNTERS:
+				setattr(generated, name, getattr(self, name))
+		finally:
+			for name, value in saved.items():
+				setattr(self, name, value)
+		return generated
+
+	def add_generated_code(self, generated):
+		"""Adds the code collected by generate_code_for to the generator.
+
+		Code for classes which already exist is appended to the existing class
+		code (e.g. for enums and functions which are attached to a class).
+		"""
+		for codes, generated_codes in ((self.class_codes, generated.class_codes),
+									   (self.class_pxd_codes, generated.class_pxd_codes)):
+			for name, code in generated_codes.items():
+				if name in codes:
+					codes[name].extend(code)
+				else:
+					codes[name] = code
+		for name, codes in generated.class_codes_extra.items():
+			self.class_codes_extra[name].extend(codes)
+		self.top_level_code.extend(generated.top_level_code)
+		self.top_level_pyx_code.extend(generated.top_level_pyx_code)
+		for name in _GENERATED_COUNTERS:
+			setattr(self, name, getattr(self, name) + getattr(generated, name))
+
+	def _generation_options(self):
+		"""Options of the generator which influence the code generated for a
+		single class, enum or function."""
+		return ["write_pxd=%s" % self.write_pxd, "type_checks=%s" % self.type_checks,
+				"include_numpy=%s" % self.include_numpy, "freelist=%s" % self.freelist,
+				"release_gil=%s" % self.release_gil,
+				"lazy_sequences=%s" % sorted(self._lazy_sequence_item_classes())]
+
+	def _global_fingerprint(self):
+		"""Fingerprint of everything the generated code for a single class,
+		enum or function depends on besides its own declaration, e.g. the
+		registered converters.
+		"""
+		parts = [".".join(map(str, __version__)), self.__class__.__name__]
+		parts.extend(self._generation_options())
+		parts.append(printable(self.instance_mapping))
+		for base_type in sorted(self.cr.lookup):
+			for converter in self.cr.lookup[base_type]:
+				clz = converter.__class__
+				try:
+					source = inspect.getsource(clz)
+				except (IOError, OSError, TypeError):
+					source = ""
+				parts.append("%s:%s.%s:%s" % (base_type, clz.__module__, clz.__name__,
+											  hashlib.sha1(source.encode("utf-8")).hexdigest()))
+		return "\n".join(parts)
+
+	def _fingerprint(self, resolved):
+		parts = [self._global_fingerprint_cached, resolved.__class__.__name__, resolved.name,
+				 repr(sorted(resolved.cpp_decl.annotations.items())),
+				 getattr(resolved, "pxd_import_path", "")]
+		if isinstance(resolved, ResolvedClass):
+			parts.append(printable(resolved.local_map))
+			for method in resolved.get_flattened_methods():
+				parts.append("%s %s %r" % (method, method.cpp_decl.name,
+										   sorted(method.cpp_decl.annotations.items())))
+			for attribute in resolved.attributes:
+				parts.append("%s %s %r" % (attribute.type_, attribute.name,
+										   sorted(attribute.cpp_decl.annotations.items())))
+			manual_code = self.manual_code.get(resolved.name)
+			if manual_code is not None:
+				parts.append(manual_code.render())
+		elif isinstance(resolved, ResolvedEnum):
+			parts.append(repr(resolved.items))
+		elif isinstance(resolved, ResolvedFunction):
+			parts.append("%s %s" % (resolved, resolved.cpp_decl.name))
+		h = hashlib.sha1()
+		h.update("\n".join(parts).encode("utf-8"))
+		return h.hexdigest()
+
+	def _load_generated_cache(self):
+		if self.generated_cache is not None:
+			return
+		self.generated_cache = dict()
+		if os.path.exists(self.incremental_state_path):
+			try:
+				with open(self.incremental_state_path, "rb") as fp:
+					self.generated_cache = pickle.load(fp)
+			except Exception:
+				logger.info("ignore invalid state file %s" % self.incremental_state_path)
+
+	def _store_generated_cache(self):
+		write_if_changed(self.incremental_state_path,
+						 lambda fp: pickle.dump(self.generated_cache, fp, pickle.HIGHEST_PROTOCOL),
+						 mode="wb")
 
 	def create_wrapper_for_enum(self, decl):
 		self.wrapped_enums_cnt += 1
@@ -217,9 +545,11 @@ class CythonGenerator(CodeGeneratorBase):
                                 """, locals())
 				shared_ptr_inst = "# see .pxd file for cdef of inst ptr" # do not implement in pyx file, only in pxd file
 
+			freelist = self._freelist_size(r_class)
+			decorator = "\n@cython.freelist(%d)" % freelist if freelist else ""
 			if len(r_class.wrap_manual_memory) != 0:
 				class_code.add("""
-                                |
+                                |$decorator
                                 |cdef class $pyname:
                                 |    \"\"\"
                                 |    $docstring
@@ -228,7 +558,7 @@ class CythonGenerator(CodeGeneratorBase):
                                 """, locals())
 			else:
 				class_code.add("""
-                                |
+                                |$decorator
                                 |cdef class $pyname:
                                 |    \"\"\"
                                 |    $docstring
@@ -337,6 +667,12 @@ class CythonGenerator(CodeGeneratorBase):
 			cy_type = self.cr.cython_type(res_type)
 			base_type = res_type.base_type
 
+			if begin_decl.wrap_share_elements:
+				# the items point into the container and keep self alive:
+				instantiation = "_share_element(self.inst, address(deref(it)))"
+			else:
+				instantiation = "_copy_shared[%s](deref(it))" % cy_type
+
 			meth_code.add("""
                             |
                             |def $name(self):
@@ -344,8 +680,7 @@ class CythonGenerator(CodeGeneratorBase):
                             |    cdef $base_type out
                             |    while it != self.inst.get().$end_name():
                             |        out = $base_type.__new__($base_type)
-                            |        out.inst =
-                            + shared_ptr[$cy_type](new $cy_type(deref(it)))
+                            |        out.inst = $instantiation
                             |        yield out
                             |        inc(it)
                             """, locals())
@@ -371,41 +706,98 @@ class CythonGenerator(CodeGeneratorBase):
 				docstrings += "\n" + " " * 12 + extra_doc
 			docstrings += "\n"
 
+		# The overload is selected in two steps: arity and checks which only
+		# depend on the Python types of the arguments are evaluated once per
+		# signature and the resulting candidates are cached in a class
+		# attribute. Expensive checks (e.g. of all elements of a list) are
+		# only evaluated if more than one candidate is left. The dispatched
+		# methods (_unchecked_*) do not check their arguments, so for the last
+		# candidate the checks of its type check level are asserted here
+		# instead, and every deep check runs at most once per call.
+		dispatch_table = "_dispatch_%s" % py_name
+		by_arity = OrderedDict()
+		dispatch_cases = []
+		for i, (dispatched_m_name, method) in enumerate(zip(dispatched_m_names, methods)):
+			args = augment_arg_names(method)
+			shallow_checks = []
+			deep_checks = []
+			# checks asserted if this is the last candidate:
+			last_checks = []
+			for j, (t, n) in enumerate(args):
+				converter = self.cr.get(t)
+				arg_var = "args[%d]" % j
+				shallow_check = converter.shallow_type_check_expression(t, arg_var)
+				full_check = converter.type_check_expression(t, arg_var)
+				if shallow_check is not None:
+					shallow_checks.append(shallow_check)
+				if shallow_check != full_check:
+					deep_checks.append(full_check)
+				level_check = self._type_check_expression(converter, t, arg_var, method)
+				if level_check is not None and level_check != shallow_check:
+					last_checks.append((n, level_check))
+			always_check = False
+			# Special case for empty constructors with a pass
+			if not args and method.cpp_decl.annotations.get("wrap-pass-constructor", False):
+				assert use_kwargs, "Cannot use wrap-pass-constructor without setting kwargs (e.g. outside a constructor)"
+				deep_checks = ['kwargs.get("__createUnsafeObject__") is True']
+				always_check = True
+			by_arity.setdefault(len(args), []).append((i, shallow_checks))
+			dispatch_cases.append((i, dispatched_m_name, deep_checks, last_checks, always_check))
+
 		method_code.add("""
+                          |
+                          |$dispatch_table = {}
                           |
                           |def $py_name(self, *args $kwargs):
                           |    \"\"\"$docstrings\"\"\"
+                          |    _signature = tuple(map(type, args))
+                          |    _candidates = self.$dispatch_table.get(_signature)
+                          |    if _candidates is None:
+                          |        _candidates = []
                         """, locals())
 
-		first_iteration = True
-
-
-		for (dispatched_m_name, method) in zip(dispatched_m_names, methods):
-			args = augment_arg_names(method)
-			if not args:
-				check_expr = "not args"
+		if_elif = "if"
+		for arity, candidates in by_arity.items():
+			method_code.add("        %s len(args) == %d:" % (if_elif, arity))
+			for i, shallow_checks in candidates:
+				if shallow_checks:
+					check_expr = " and ".join("(%s)" % c for c in shallow_checks)
+					method_code.add("""
+                                    |            if $check_expr:
+                                    |                _candidates.append($i)
+                                    """, locals())
+				else:
+					method_code.add("            _candidates.append(%d)" % i)
+			if_elif = "elif"
 
-				# Special case for empty constructors with a pass
-				if method.cpp_decl.annotations.get("wrap-pass-constructor", False):
-					assert use_kwargs, "Cannot use wrap-pass-constructor without setting kwargs (e.g. outside a constructor)"
-					check_expr = 'kwargs.get("__createUnsafeObject__") is True'
+		method_code.add("""
+                        |        _candidates = self.$dispatch_table[_signature] = tuple(_candidates)
+                        |    for _candidate in _candidates:
+                        """, locals())
 
+		if_elif = "if"
+		for i, dispatched_m_name, deep_checks, last_checks, always_check in dispatch_cases:
+			if use_return:
+				call = ["return self.%s(*args)" % dispatched_m_name]
 			else:
-				tns = [(t, "args[%d]" % i) for i, (t, n) in enumerate(args)]
-				checks = ["len(args)==%d" % len(tns)]
-				checks += [self.cr.get(t).type_check_expression(t, n) for (t, n) in tns]
-				check_expr = " and ".join("(%s)" % c for c in checks)
-			return_ = "return" if use_return else ""
-			if_elif = "if" if first_iteration else "elif"
-			method_code.add("""
-                            |    $if_elif $check_expr:
-                            |        $return_ self.$dispatched_m_name(*args)
-                            """, locals())
-			first_iteration = False
-
-		method_code.add("""    else:
-                        |           raise
-                        + Exception('can not handle type of %s' % (args,))""")
+				call = ["self.%s(*args)" % dispatched_m_name, "return"]
+			method_code.add("        %s _candidate == %d:" % (if_elif, i))
+			if deep_checks and not always_check:
+				method_code.add("            if _candidate == _candidates[-1]:")
+				for n, check in last_checks:
+					method_code.add("                assert %s, 'arg %s wrong type'" % (check, n))
+				for line in call:
+					method_code.add(" " * 16 + line)
+			indent = " " * 12
+			if deep_checks:
+				check_expr = " and ".join("(%s)" % c for c in deep_checks)
+				method_code.add("            if %s:" % check_expr)
+				indent = " " * 16
+			for line in call:
+				method_code.add(indent + line)
+			if_elif = "elif"
+
+		method_code.add("    raise Exception('can not handle type of %s' % (args,))")
 		return method_code
 
 	def create_wrapper_for_method(self, cdcl, py_name, methods):
@@ -447,22 +839,40 @@ class CythonGenerator(CodeGeneratorBase):
 			codes = []
 			dispatched_m_names = []
 			for (i, method) in enumerate(methods):
-				dispatched_m_name = "_%s_%d" % (py_name, i)
+				# the dispatcher checks the arguments, so the methods it calls
+				# do not check them again and are not meant to be called
+				# directly:
+				dispatched_m_name = "_unchecked_%s_%d" % (py_name, i)
 				dispatched_m_names.append(dispatched_m_name)
 				code = self.create_wrapper_for_nonoverloaded_method(cdcl,
 																	dispatched_m_name,
-																	method)
+																	method,
+																	checked=False)
 				codes.append(code)
 
 			code = self._create_overloaded_method_decl(py_name, dispatched_m_names, methods, True)
 			codes.append(code)
 			return codes
 
-	def _create_fun_decl_and_input_conversion(self, code, py_name, method, is_free_fun=False):
+	def _type_check_expression(self, converter, cpp_type, arg_var, method):
+		level = method.wrap_type_checks or self.type_checks
+		assert level in TYPE_CHECK_LEVELS, "unknown type check level '%s' for %s" % (level, method)
+		if level == "none":
+			return None
+		if level == "shallow":
+			check = converter.shallow_type_check_expression(cpp_type, arg_var)
+			if check is not None:
+				return check
+		return converter.type_check_expression(cpp_type, arg_var)
+
+	def _create_fun_decl_and_input_conversion(self, code, py_name, method, is_free_fun=False,
+											  checked=True):
 		""" Creates the function declarations and the input conversion to C++
 		and the output conversion back to Python.
 		The input conversion is directly added to the "code" object while the
 		conversion back to Python is returned as "cleanups".
+		Without `checked` the types of the arguments are not asserted, this is
+		used for the methods called by the dispatcher of overloaded methods.
 		"""
 		args = augment_arg_names(method)
 
@@ -486,7 +896,9 @@ class CythonGenerator(CodeGeneratorBase):
 			cleanups.append(cleanup)
 			call_args.append(call_as)
 			in_types.append(t)
-			checks.append((n, converter.type_check_expression(t, n)))
+			check = self._type_check_expression(converter, t, n, method) if checked else None
+			if check is not None:
+				checks.append((n, check))
 
 		# Step 1: create method decl statement
 		if not is_free_fun:
@@ -505,6 +917,8 @@ class CythonGenerator(CodeGeneratorBase):
                    |    \"\"\"$docstring\"\"\"
                    """, locals())
 
+		if not checked:
+			code.add("    # the arguments are checked by the dispatcher of the overloaded method")
 		# Step 2a: create code which convert python input args to c++ args of
 		# wrapped method
 		for n, check in checks:
@@ -593,7 +1007,7 @@ class CythonGenerator(CodeGeneratorBase):
 		code.add("        return py_result")
 		return code
 
-	def create_wrapper_for_nonoverloaded_method(self, cdcl, py_name, method):
+	def create_wrapper_for_nonoverloaded_method(self, cdcl, py_name, method, checked=True):
 
 		logger.info("   create wrapper for %s ('%s')" % (py_name, method))
 		meth_code = Code.Code()
@@ -601,54 +1015,134 @@ class CythonGenerator(CodeGeneratorBase):
 		call_args, cleanups, in_types = self._create_fun_decl_and_input_conversion(
 			meth_code,
 			py_name,
-			method
+			method,
+			checked=checked
 		)
 
+		res_t = method.result_type
+		out_converter = self.cr.get(res_t)
+		release_gil = self._releases_gil(method, out_converter, res_t)
+		if release_gil:
+			call_args = self._hoist_call_args(meth_code, call_args, in_types)
+
 		# call wrapped method and convert result value back to python
 		cpp_name = method.cpp_decl.name
 		call_args_str = ", ".join(call_args)
 		cy_call_str = "self.inst.get().%s(%s)" % (cpp_name, call_args_str)
 
-		res_t = method.result_type
-		out_converter = self.cr.get(res_t)
-		full_call_stmt = out_converter.call_method(res_t, cy_call_str)
-
-		if method.with_nogil:
-			meth_code.add("""
-              |    with nogil:
-              """)
-			indented = Code.Code()
+		if method.wrap_return_ref:
+			full_call_stmt = out_converter.call_method_ref(res_t, cy_call_str, "self.inst")
+			if full_call_stmt is None:
+				raise Exception("wrap-return-ref is only supported for references and pointers to wrapped classes, "
+								"not for %s (%s)" % (res_t, method))
+		elif release_gil:
+			full_call_stmt = self._create_call_without_gil(out_converter, res_t, cy_call_str)
 		else:
-			indented = meth_code
+			full_call_stmt = out_converter.call_method(res_t, cy_call_str)
 
 		if isinstance(full_call_stmt, basestring):
-			indented.add("""
+			meth_code.add("""
                 |    $full_call_stmt
                 """, locals())
 		else:
-			indented.add(full_call_stmt)
+			meth_code.add(full_call_stmt)
 
 		for cleanup in reversed(cleanups):
 			if not cleanup:
 				continue
 			if isinstance(cleanup, basestring):
 				cleanup = "    %s" % cleanup
-			indented.add(cleanup)
+			meth_code.add(cleanup)
 
-		to_py_code = out_converter.output_conversion(res_t, "_r", "py_result")
+		to_py_code = self._create_output_conversion(out_converter, method, res_t)
 
 		if to_py_code is not None:  # for non void return value
 
 			if isinstance(to_py_code, basestring):
 				to_py_code = "    %s" % to_py_code
-			indented.add(to_py_code)
-			indented.add("    return py_result")
-
-		if method.with_nogil:
-			meth_code.add(indented)
+			meth_code.add(to_py_code)
+			meth_code.add("    return py_result")
 
 		return meth_code
 
+	def _releases_gil(self, method, out_converter, res_t):
+		"""Decides if the GIL is released for the call of method: if it has
+		the wrap-release-gil (or wrap-with-no-gil) annotation or if
+		release_gil is set and method is declared nogil."""
+		requested = method.with_nogil or method.wrap_release_gil
+		if not requested:
+			return self.release_gil and method.is_nogil and not method.wrap_return_ref \
+				and out_converter.call_method_without_gil(res_t, "") is not None
+		if not method.is_nogil:
+			raise Exception("%s must be declared nogil to release the GIL" % (method,))
+		if method.wrap_return_ref or out_converter.call_method_without_gil(res_t, "") is None:
+			raise Exception("can not release the GIL for the result type %s of %s" % (res_t, method))
+		return True
+
+	def _hoist_call_args(self, code, call_args, in_types):
+		"""Converts the arguments which are converted within the call (e.g.
+		<int>n) to C++ values before the GIL is released. Arguments which are
+		already C++ variables, dereferenced C++ pointers (e.g. deref(v0) for
+		containers) and wrapped objects (accessed via their typed inst
+		attribute) are passed as they are. Other dereferenced expressions are
+		hoisted as pointers, so the call modifies the original object."""
+		hoisted = []
+		for arg_num, (call_as, t) in enumerate(zip(call_args, in_types)):
+			if re.match(r"^\(?(deref\(\w+\)|\w+)\)?$", call_as) \
+					or isinstance(self.cr.get(t), TypeToWrapConverter):
+				hoisted.append(call_as)
+				continue
+			name = "_arg%d" % arg_num
+			cy_t = self.cr.cython_type(t).replaced(is_ref=False)
+			if re.match(r"^\(?deref\(", call_as):
+				code.add("    cdef %s * %s = address(%s)" % (cy_t, name, call_as))
+				hoisted.append("deref(%s)" % name)
+				continue
+			if not cy_t.is_ptr:
+				cy_t = cy_t.replaced(is_const=False)
+			code.add("    cdef %s %s = %s" % (cy_t, name, call_as))
+			hoisted.append(name)
+		return hoisted
+
+	def _create_call_without_gil(self, out_converter, res_t, cy_call_str):
+		declaration, call, conversion = out_converter.call_method_without_gil(res_t, cy_call_str)
+		code = Code.Code()
+		if declaration is not None:
+			code.add(declaration)
+		code.add("""
+                |with nogil:
+                |    $call
+                """, locals())
+		if isinstance(conversion, Code.Code):
+			# keeps the indentation of the surrounding method body:
+			code.extend(conversion)
+		elif conversion is not None:
+			code.add(conversion)
+		return code
+
+	def _create_output_conversion(self, out_converter, method, res_t):
+		if method.wrap_return_lazy:
+			code = out_converter.output_lazy_conversion(res_t, "_r", "py_result", method.wrap_share_elements)
+			if code is None:
+				raise Exception("wrap-return-lazy is only supported for vectors of wrapped classes, not for %s (%s)"
+								% (res_t, method))
+			return code
+		if method.wrap_share_elements:
+			code = out_converter.output_shared_conversion(res_t, "_r", "py_result")
+			if code is None:
+				raise Exception("wrap-share-elements is only supported for vectors of wrapped classes, not for %s (%s)"
+								% (res_t, method))
+			return code
+		if not method.wrap_return_buffer:
+			return out_converter.output_conversion(res_t, "_r", "py_result")
+		code = out_converter.output_buffer_conversion(res_t, "_r", "py_result")
+		if code is None:
+			raise Exception("wrap-return-buffer is only supported for vectors of numbers, not for %s (%s)"
+							% (res_t, method))
+		if self.include_numpy:
+			code.add("py_result = numpy.asarray(py_result)")
+		return code
+
 	def create_wrapper_for_free_function(self, decl):
 		logger.info("create wrapper for free function %s" % decl.name)
 		self.wrapped_methods_cnt += 1
@@ -679,13 +1173,22 @@ class CythonGenerator(CodeGeneratorBase):
 		call_args, cleanups, in_types = \
 			self._create_fun_decl_and_input_conversion(fun_code, name, decl, is_free_fun=True)
 
+		res_t = decl.result_type
+		out_converter = self.cr.get(res_t)
+		if decl.wrap_return_ref:
+			raise Exception("wrap-return-ref needs a method of a wrapped class, not %s" % (decl,))
+		release_gil = self._releases_gil(decl, out_converter, res_t)
+		if release_gil:
+			call_args = self._hoist_call_args(fun_code, call_args, in_types)
+
 		call_args_str = ", ".join(call_args)
 		mangled_name = "_" + orig_cpp_name + "_" + decl.pxd_import_path
 		cy_call_str = "%s(%s)" % (mangled_name, call_args_str)
 
-		res_t = decl.result_type
-		out_converter = self.cr.get(res_t)
-		full_call_stmt = out_converter.call_method(res_t, cy_call_str)
+		if release_gil:
+			full_call_stmt = self._create_call_without_gil(out_converter, res_t, cy_call_str)
+		else:
+			full_call_stmt = out_converter.call_method(res_t, cy_call_str)
 
 		if isinstance(full_call_stmt, basestring):
 			fun_code.add("""
@@ -701,7 +1204,7 @@ class CythonGenerator(CodeGeneratorBase):
 				cleanup = "    %s" % cleanup
 			fun_code.add(cleanup)
 
-		to_py_code = out_converter.output_conversion(res_t, "_r", "py_result")
+		to_py_code = self._create_output_conversion(out_converter, decl, res_t)
 
 		out_vars = ["py_result"]
 		if to_py_code is not None:  # for non void return value
@@ -747,11 +1250,13 @@ class CythonGenerator(CodeGeneratorBase):
 		else:
 			dispatched_cons_names = []
 			for (i, constructor) in enumerate(real_constructors):
-				dispatched_cons_name = "_init_%d" % i
+				# not checked, see create_wrapper_for_method:
+				dispatched_cons_name = "_unchecked_init_%d" % i
 				dispatched_cons_names.append(dispatched_cons_name)
 				code = self.create_wrapper_for_nonoverloaded_constructor(class_decl,
 																		 dispatched_cons_name,
-																		 constructor)
+																		 constructor,
+																		 checked=False)
 				codes.append(code)
 			code = self._create_overloaded_method_decl("__init__", dispatched_cons_names,
 													   constructors, False, True)
@@ -759,7 +1264,7 @@ class CythonGenerator(CodeGeneratorBase):
 		return codes
 
 	def create_wrapper_for_nonoverloaded_constructor(self, class_decl, py_name,
-													 cons_decl):
+													 cons_decl, checked=True):
 		""" py_name is the name for constructor, as we dispatch overloaded
 			constructors in __init__() the name of the method calling the
 			C++ constructor is variable and given by `py_name`.
@@ -768,7 +1273,8 @@ class CythonGenerator(CodeGeneratorBase):
 		cons_code = Code.Code()
 
 		call_args, cleanups, in_types = \
-			self._create_fun_decl_and_input_conversion(cons_code, py_name, cons_decl)
+			self._create_fun_decl_and_input_conversion(cons_code, py_name, cons_decl,
+													   checked=checked)
 
 		wrap_pass = cons_decl.cpp_decl.annotations.get("wrap-pass-constructor", False)
 		if wrap_pass:
@@ -780,7 +1286,7 @@ class CythonGenerator(CodeGeneratorBase):
 		name = class_decl.name
 		cy_type = self.cr.cython_type(name)
 		cons_code.add(
-			"""    self.inst = shared_ptr[$cy_type](new $cy_type($call_args_str))""", locals())
+			"""    self.inst = make_shared[$cy_type]($call_args_str)""", locals())
 
 		for cleanup in reversed(cleanups):
 			if not cleanup:
@@ -807,7 +1313,7 @@ class CythonGenerator(CodeGeneratorBase):
         |    cdef $cy_t * that = other.inst.get()
         |    cdef $cy_t multiplied = deref(this) * deref(that)
         |    cdef $name result = $name.__new__($name)
-        |    result.inst = shared_ptr[$cy_t](new $cy_t(multiplied))
+        |    result.inst = _copy_shared[$cy_t](multiplied)
         |    return result
         """, locals())
 		return code
@@ -828,7 +1334,7 @@ class CythonGenerator(CodeGeneratorBase):
         |    cdef $cy_t * that = other.inst.get()
         |    cdef $cy_t added = deref(this) + deref(that)
         |    cdef $name result = $name.__new__($name)
-        |    result.inst = shared_ptr[$cy_t](new $cy_t(added))
+        |    result.inst = _copy_shared[$cy_t](added)
         |    return result
         """, locals())
 		return code
@@ -998,14 +1504,14 @@ class CythonGenerator(CodeGeneratorBase):
                         |
                         |def __copy__(self):
                         |   cdef $name rv = $name.__new__($name)
-                        |   rv.inst = shared_ptr[$cy_type](new $cy_type(deref(self.inst.get())))
+                        |   rv.inst = _copy_shared[$cy_type](deref(self.inst.get()))
                         |   return rv
                         """, locals())
 		meth_code.add("""
                         |
                         |def __deepcopy__(self, memo):
                         |   cdef $name rv = $name.__new__($name)
-                        |   rv.inst = shared_ptr[$cy_type](new $cy_type(deref(self.inst.get())))
+                        |   rv.inst = _copy_shared[$cy_type](deref(self.inst.get()))
                         |   return rv
                         """, locals())
 		return meth_code
@@ -1043,16 +1549,15 @@ class CythonGenerator(CodeGeneratorBase):
 							# globally exported.
 							pass
 						else:
-							code.add("from $module cimport $name", locals())
+							self._add_cimport(code, name, "from %s cimport %s" % (module, name))
 					if resolved.__class__ in (ResolvedClass, ):
 
 						# Skip classes that explicitely should not have a pxd
 						# import statement (abstract base classes and the like)
 						if not resolved.no_pxd_import:
 							if resolved.cpp_decl.annotations.get("wrap-attach"):
-								code.add("from $module cimport __$name", locals())
-							else:
-								code.add("from $module cimport $name", locals())
+								name = "__" + name
+							self._add_cimport(code, name, "from %s cimport %s" % (module, name))
 
 			else:
 				logger.info("Skip imports from self (own module %s)" % module)
@@ -1066,20 +1571,93 @@ class CythonGenerator(CodeGeneratorBase):
 			import_from = resolved.pxd_import_path
 			name = resolved.name
 			if resolved.__class__ in (ResolvedEnum,):
-				code.add("from $import_from cimport $name as _$name", locals())
+				self._add_cimport(code, "_" + name, "from %s cimport %s as _%s" % (import_from, name, name))
 			elif resolved.__class__ in (ResolvedClass, ):
 				name = resolved.cpp_decl.name
-				code.add("from $import_from cimport $name as _$name", locals())
+				self._add_cimport(code, "_" + name, "from %s cimport %s as _%s" % (import_from, name, name))
 			elif resolved.__class__ in (ResolvedFunction, ):
 				# Ensure the name the original C++ name (and not the Python display name)
 				name = resolved.cpp_decl.name
 				mangled_name = "_" + name + "_" + import_from
-				code.add("from $import_from cimport $name as $mangled_name", locals())
+				self._add_cimport(code, mangled_name, "from %s cimport %s as %s" % (import_from, name, mangled_name))
 			elif resolved.__class__ in (ResolvedTypeDef, ):
-				code.add("from $import_from cimport $name", locals())
+				self._add_cimport(code, name, "from %s cimport %s" % (import_from, name))
 
 		self.top_level_code.append(code)
 
+	def _prunes_cimports(self):
+		return self.prune_cimports and self.write_pxd
+
+	def _add_cimport(self, code, name, stmt):
+		# the statements are added to code by _add_referenced_cimports once it
+		# is known whether `name` is used:
+		self._candidate_cimports.append((code, name, stmt))
+
+	def _add_referenced_cimports(self, referenced):
+		"""Adds the cimport statements collected by _add_cimport whose name is
+		in `referenced`, or all of them if `referenced` is None.
+		"""
+		skipped = 0
+		for code, name, stmt in self._candidate_cimports:
+			if referenced is None or name in referenced:
+				code.add(stmt)
+			else:
+				skipped += 1
+		if referenced is not None:
+			logger.info("skipped %d of %d cimports which are not used in module %s"
+						% (skipped, len(self._candidate_cimports), self.target_path))
+		self._candidate_cimports = []
+
+	def _referenced_names(self):
+		"""Returns the names which the code of this module may refer to: the
+		names of the declarations of this module and the names the converters
+		report for the types of their methods, attributes and typedefs (see
+		TypeConverterBase.referenced_names). The manual code and the extra
+		cimports are written by hand, so the identifiers in their text are
+		added as well.
+		"""
+		types = []
+		names = set()
+		for resolved in self.resolved:
+			if isinstance(resolved, ResolvedClass):
+				names.update([resolved.name, "_" + resolved.cpp_decl.name, "__" + resolved.name])
+				for method in resolved.get_flattened_methods():
+					types.extend(self._method_types(method))
+				types.extend(attribute.type_ for attribute in resolved.attributes)
+			elif isinstance(resolved, ResolvedEnum):
+				names.add(resolved.name)
+			elif isinstance(resolved, ResolvedFunction):
+				names.add("_" + resolved.cpp_decl.name + "_" + resolved.pxd_import_path)
+				types.extend(self._method_types(resolved))
+			elif isinstance(resolved, ResolvedTypeDef):
+				names.add(resolved.name)
+				types.append(resolved.type_)
+
+		for type_ in types:
+			if type_ in self.cr:
+				found = self.cr.get(type_).referenced_names(type_)
+			else:
+				# no code is generated for methods with unsupported types:
+				found = type_.all_occuring_base_types()
+			for name in found:
+				names.update([name, "_" + name, "__" + name])
+
+		find_names = re.compile(r"[A-Za-z_]\w*").findall
+		for code in self.manual_code.values():
+			for line in code.iter_lines():
+				names.update(find_names(line))
+		for stmt in self.extra_cimports or []:
+			names.update(find_names(stmt))
+		return names
+
+	@staticmethod
+	def _method_types(method):
+		# the resolved types and the types as declared, e.g. typedefs:
+		types = [method.result_type, method.cpp_decl.result_type]
+		types.extend(t for __, t in method.arguments)
+		types.extend(t for __, t in method.cpp_decl.arguments)
+		return types
+
 	def create_default_cimports(self):
 		code = Code.Code()
 		# Using embedsignature here does not help much as it is only the Python
@@ -1100,6 +1678,10 @@ class CythonGenerator(CodeGeneratorBase):
                    |from cython.operator cimport dereference as deref,
                    + preincrement as inc, address as address
                    """)
+		if self._uses_freelist():
+			code.add("""
+                   |cimport cython
+                   """)
 		if self.include_refholder:
 			code.add("""
                    |from  AutowrapRefHolder cimport AutowrapRefHolder
@@ -1108,7 +1690,12 @@ class CythonGenerator(CodeGeneratorBase):
                    """)
 		if self.include_shared_ptr:
 			code.add("""
-                   |from  smart_ptr cimport shared_ptr
+                   |from  smart_ptr cimport shared_ptr, make_shared, _copy_shared, _move_shared
+                   """)
+			if self._lazy_sequence_item_classes() or \
+					any(m.wrap_share_elements or m.wrap_return_ref for m in self._wrapped_methods()):
+				code.add("""
+                   |from  smart_ptr cimport _share_element
                    """)
 		if self.include_numpy:
 			code.add("""
@@ -1129,11 +1716,156 @@ class CythonGenerator(CodeGeneratorBase):
 		self.top_level_code.append(code)
 		return code
 
+	def _freelist_size(self, r_class):
+		if r_class.wrap_freelist is not None:
+			return r_class.wrap_freelist
+		return self.freelist
+
+	def _uses_freelist(self):
+		return any(self._freelist_size(r) for r in self.resolved
+				   if isinstance(r, ResolvedClass) and not r.wrap_ignore and r.methods)
+
+	def _wrapped_methods(self):
+		for resolved in self.resolved:
+			if resolved.wrap_ignore:
+				continue
+			if isinstance(resolved, ResolvedClass):
+				for method in resolved.get_flattened_methods():
+					yield method
+			elif isinstance(resolved, ResolvedFunction):
+				yield resolved
+
+	def _uses_return_buffer(self):
+		return any(m.wrap_return_buffer for m in self._wrapped_methods())
+
+	def _lazy_sequence_item_classes(self):
+		"""Names of the wrapped classes which need a sequence class for
+		methods with the wrap-return-lazy annotation."""
+		if self._lazy_item_classes is None:
+			self._lazy_item_classes = set()
+			for method in self._wrapped_methods():
+				if method.wrap_return_lazy:
+					converter = self.cr.get(method.result_type)
+					item_class = getattr(converter, "lazy_item_class", lambda t: None)(method.result_type)
+					if item_class is not None:
+						self._lazy_item_classes.add(item_class)
+		return self._lazy_item_classes
+
+	def create_lazy_sequence_class(self, r_class):
+		"""Create the sequence class returned by methods with the
+		wrap-return-lazy annotation which return a vector of r_class. It owns
+		the vector and creates the Python objects of the items on access only.
+		"""
+		cname = r_class.name
+		seq = lazy_sequence_name(cname)
+		inner = self.cr.cython_type(cname)
+		code = Code.Code()
+		code.add("""
+                |
+                |cdef class $seq:
+                |    \"\"\"Sequence of $cname objects which are created on access\"\"\"
+                |
+                |    cdef shared_ptr[libcpp_vector[$inner]] vec
+                |    cdef bint share_elements
+                |
+                |    def __len__(self):
+                |        return self.vec.get().size()
+                |
+                |    def __getitem__(self, index):
+                |        cdef Py_ssize_t size = self.vec.get().size()
+                |        cdef Py_ssize_t i
+                |        if isinstance(index, slice):
+                |            return [self[i] for i in range(*index.indices(size))]
+                |        i = index
+                |        if i < 0:
+                |            i += size
+                |        if i < 0 or i >= size:
+                |            raise IndexError("index %d out of range" % index)
+                |        cdef $cname item = $cname.__new__($cname)
+                |        if self.share_elements:
+                |            item.inst = _share_element(self.vec, address(self.vec.get().at(i)))
+                |        else:
+                |            item.inst = _copy_shared[$inner](self.vec.get().at(i))
+                |        return item
+                |
+                |    def __iter__(self):
+                |        cdef Py_ssize_t i
+                |        for i in range(self.vec.get().size()):
+                |            yield self[i]
+                |
+                |    def tolist(self):
+                |        \"\"\"Creates the Python objects for all items\"\"\"
+                |        return [self[i] for i in range(len(self))]
+                """, locals())
+		return code
+
 	def create_includes(self):
 		code = Code.Code()
 		code.add("""
                 |cdef extern from "autowrap_tools.hpp":
                 |    char * _cast_const_away(char *)
+                |cdef extern from "autowrap_tools.hpp" namespace "autowrap":
+                |    bint _is_buffer(object)
+                |    bint _is_buffer_of[T](object, T *)
+                |    int _assign_buffer[T](libcpp_vector[T] &, object) except -1
                 """)
+		if self._uses_return_buffer():
+			code.add("""
+                |cdef extern from "autowrap_tools.hpp" namespace "autowrap":
+                |    cdef cppclass VectorBuffer:
+                |        void assign[T](libcpp_vector[T] &)
+                |        void * data()
+                |        Py_ssize_t size()
+                |        Py_ssize_t itemsize()
+                |        char * format()
+                """)
+			declaration = """
+                |
+                |cdef class AutowrapVectorBuffer:
+                """
+			attributes = """
+                |    cdef VectorBuffer vec
+                |    cdef Py_ssize_t shape[1]
+                |    cdef Py_ssize_t strides[1]
+                """
+			definition = """
+                |
+                |from cpython.buffer cimport PyBUF_FORMAT
+                |
+                |cdef class AutowrapVectorBuffer:
+                |    \"\"\"Owns the content of a std::vector of numbers returned by a
+                |    method with the wrap-return-buffer annotation and exposes it with
+                |    the buffer protocol, e.g. for numpy.asarray() or memoryview().\"\"\"
+                """
+			methods = """
+                |
+                |    def __len__(self):
+                |        return self.vec.size()
+                |
+                |    def __getbuffer__(self, Py_buffer * buffer, int flags):
+                |        self.shape[0] = self.vec.size()
+                |        self.strides[0] = self.vec.itemsize()
+                |        buffer.buf = self.vec.data()
+                |        buffer.obj = self
+                |        buffer.len = self.vec.size() * self.vec.itemsize()
+                |        buffer.itemsize = self.vec.itemsize()
+                |        buffer.readonly = 0
+                |        buffer.ndim = 1
+                |        buffer.format = self.vec.format() if flags & PyBUF_FORMAT else NULL
+                |        buffer.shape = self.shape
+                |        buffer.strides = self.strides
+                |        buffer.suboffsets = NULL
+                |        buffer.internal = NULL
+                |
+                |    def __releasebuffer__(self, Py_buffer * buffer):
+                |        pass
+                """
+			if self.write_pxd:
+				# the pxd only declares the class and its attributes, the
+				# methods are defined in the pyx file:
+				code.add(declaration).add(attributes)
+				self.top_level_pyx_code.append(Code.Code().add(definition).add(methods))
+			else:
+				code.add(definition).add(attributes).add(methods)
 
 		self.top_level_code.append(code)
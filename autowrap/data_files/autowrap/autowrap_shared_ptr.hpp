@@ -0,0 +1,47 @@
+#include <boost/smart_ptr/shared_ptr.hpp>
+#include <boost/smart_ptr/make_shared.hpp>
+#include <utility>
+
+namespace autowrap {
+
+    /*
+     * Returns a shared_ptr which points to element but shares the ownership
+     * of owner (aliasing constructor), so element is not copied and owner is
+     * kept alive as long as the result exists. element must be part of the
+     * object owned by owner.
+     */
+    template <class T, class O>
+    boost::shared_ptr<T> _share_element(const boost::shared_ptr<O> & owner, T * element)
+    {
+        return boost::shared_ptr<T>(owner, element);
+    }
+
+    /*
+     * Creates a shared_ptr holding a copy of value, the copy and the
+     * reference count are stored in a single allocation.
+     */
+    template <class T>
+    boost::shared_ptr<T> _copy_shared(const T & value)
+    {
+        return boost::make_shared<T>(value);
+    }
+
+    /*
+     * Creates a shared_ptr holding value, which is moved into the single
+     * allocation for the object and the reference count. Only for results
+     * of calls, Cython may store them in a temporary variable first, which
+     * is moved from as well.
+     */
+    template <class T>
+    boost::shared_ptr<T> _move_shared(T && value)
+    {
+        return boost::make_shared<T>(std::move(value));
+    }
+
+    template <class T>
+    boost::shared_ptr<T> _move_shared(T & value)
+    {
+        return boost::make_shared<T>(std::move(value));
+    }
+
+};
@@ -1,4 +1,9 @@
 
+#include <Python.h>
+#include <cstring>
+#include <limits>
+#include <vector>
+
 inline char * _cast_const_away(const char *p)
 {
     return const_cast<char *>(p);
@@ -87,4 +92,153 @@ namespace autowrap {
             }
     };
 
+    /* true if the items of the buffer have the C++ type T (same kind and size) */
+    template <class T>
+    bool _buffer_has_item_type(const Py_buffer & view)
+    {
+        const char * format = view.format == NULL ? "B" : view.format;
+        const unsigned int one = 1;
+        const bool little_endian = *reinterpret_cast<const char *>(&one) == 1;
+        switch (*format)
+        {
+            case '@': case '=':
+                format++;
+                break;
+            case '<':
+                if (!little_endian) return false;
+                format++;
+                break;
+            case '>': case '!':
+                if (little_endian) return false;
+                format++;
+                break;
+        }
+        if (format[0] == '\0' || format[1] != '\0' || view.itemsize != (Py_ssize_t) sizeof(T))
+            return false;
+        if (!std::numeric_limits<T>::is_integer)
+            return std::strchr("fd", format[0]) != NULL;
+        if (std::numeric_limits<T>::is_signed)
+            return std::strchr("bhilqn", format[0]) != NULL;
+        return std::strchr("BHILQN", format[0]) != NULL;
+    }
+
+    /* true if the type of obj supports the buffer protocol (strings are
+       excluded as they are no numeric data) */
+    inline bool _is_buffer(PyObject * obj)
+    {
+        return !PyBytes_Check(obj) && !PyByteArray_Check(obj) && !PyUnicode_Check(obj)
+               && PyObject_CheckBuffer(obj);
+    }
+
+    /* true if obj provides a C contiguous buffer with items of type T */
+    template <class T>
+    bool _is_buffer_of(PyObject * obj, const T *)
+    {
+        Py_buffer view;
+        if (!_is_buffer(obj))
+            return false;
+        if (PyObject_GetBuffer(obj, &view, PyBUF_FORMAT | PyBUF_C_CONTIGUOUS) == -1)
+        {
+            PyErr_Clear();
+            return false;
+        }
+        bool result = _buffer_has_item_type<T>(view);
+        PyBuffer_Release(&view);
+        return result;
+    }
+
+    /* copies the content of a C contiguous buffer with items of type T to vec,
+       returns -1 and sets a Python exception on failure */
+    template <class T>
+    int _assign_buffer(std::vector<T> & vec, PyObject * obj)
+    {
+        Py_buffer view;
+        if (PyObject_GetBuffer(obj, &view, PyBUF_FORMAT | PyBUF_C_CONTIGUOUS) == -1)
+            return -1;
+        if (!_buffer_has_item_type<T>(view))
+        {
+            PyErr_Format(PyExc_TypeError, "buffer has wrong item type '%s'",
+                         view.format == NULL ? "B" : view.format);
+            PyBuffer_Release(&view);
+            return -1;
+        }
+        const T * begin = static_cast<const T *>(view.buf);
+        vec.assign(begin, begin + view.len / view.itemsize);
+        PyBuffer_Release(&view);
+        return 0;
+    }
+
+    /* struct format character of the numeric type T */
+    template <class T>
+    char _buffer_format()
+    {
+        if (!std::numeric_limits<T>::is_integer)
+            return sizeof(T) == sizeof(float) ? 'f' : 'd';
+        const char * formats = std::numeric_limits<T>::is_signed ? "bhiq" : "BHIQ";
+        switch (sizeof(T))
+        {
+            case 1: return formats[0];
+            case 2: return formats[1];
+            case 4: return formats[2];
+            default: return formats[3];
+        }
+    }
+
+    /* owns the content of a std::vector of numbers (which is swapped in, so
+       nothing is copied) and provides what is needed for exposing it with
+       the buffer protocol */
+    class VectorBuffer {
+
+        private:
+
+            struct Holder {
+                virtual ~Holder() {}
+            };
+
+            template <class T>
+            struct VectorHolder : Holder {
+                std::vector<T> vec;
+            };
+
+            Holder * _holder;
+            void * _data;
+            Py_ssize_t _size;
+            Py_ssize_t _itemsize;
+            char _format[2];
+
+            VectorBuffer(const VectorBuffer &);
+            VectorBuffer & operator=(const VectorBuffer &);
+
+        public:
+
+            VectorBuffer(): _holder(NULL), _data(NULL), _size(0), _itemsize(1)
+            {
+                _format[0] = 'B';
+                _format[1] = '\0';
+            }
+
+            ~VectorBuffer()
+            {
+                delete _holder;
+            }
+
+            template <class T>
+            void assign(std::vector<T> & vec)
+            {
+                VectorHolder<T> * holder = new VectorHolder<T>();
+                holder->vec.swap(vec);
+                delete _holder;
+                _holder = holder;
+                _data = holder->vec.empty() ? NULL : &holder->vec[0];
+                _size = holder->vec.size();
+                _itemsize = sizeof(T);
+                _format[0] = _buffer_format<T>();
+            }
+
+            void * data() { return _data; }
+            Py_ssize_t size() { return _size; }
+            Py_ssize_t itemsize() { return _itemsize; }
+            char * format() { return _format; }
+    };
+
 };
@@ -8,3 +8,14 @@ cdef extern from "boost/smart_ptr/shared_ptr.hpp" namespace "boost":
         T* get() nogil
         int unique()
         int use_count()
+
+cdef extern from "boost/smart_ptr/make_shared.hpp" namespace "boost":
+
+    # creates the object and the reference count with a single allocation:
+    shared_ptr[T] make_shared[T](...)
+
+cdef extern from "autowrap_shared_ptr.hpp" namespace "autowrap":
+
+    shared_ptr[T] _share_element[T, O](shared_ptr[O] & owner, T * element)
+    shared_ptr[T] _copy_shared[T](const T & value) nogil
+    shared_ptr[T] _move_shared[T](T value) nogil
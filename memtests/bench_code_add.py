@@ -0,0 +1,82 @@
+from __future__ import print_function
+
+"""
+Measures the time spent in autowrap.Code.Code.add with and without its
+template cache. The calls to Code.add which are made while generating the
+Cython code for the test modules are recorded and replayed `repetitions`
+times, which corresponds to generating a module of `repetitions` times the
+size of all test modules:
+
+    $ python memtests/bench_code_add.py [repetitions]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import autowrap
+import autowrap.Code
+from autowrap.code_generators import CythonGenerator
+
+test_files = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tests", "test_files")
+
+modules = [["minimal.pxd", "minimal_td.pxd"],
+           ["libcpp_stl_test.pxd"],
+           ["templated.pxd"],
+           ["number_conv.pxd"],
+           ["libcpp_utf8_string_test.pxd"],
+           ["gil_testing.pxd"],
+           ["int_container_class.pxd"]]
+
+
+def record_calls():
+    calls = []
+    add = autowrap.Code.Code.add
+
+    def recording_add(self, what, *a, **kw):
+        calls.append((what, a, dict(kw)))
+        return add(self, what, *a, **kw)
+
+    autowrap.Code.Code.add = recording_add
+    try:
+        target = os.path.join(tempfile.mkdtemp(), "bench.pyx")
+        for files in modules:
+            decls, instance_map = autowrap.parse(files, root=test_files)
+            CythonGenerator(decls, instance_map, pyx_target_path=target).create_code_file()
+    finally:
+        autowrap.Code.Code.add = add
+    return calls
+
+
+def replay(calls, repetitions):
+    Code = autowrap.Code.Code
+    start = time.time()
+    for i in range(repetitions):
+        for what, a, kw in calls:
+            Code().add(what, *a, **dict(kw))
+    return time.time() - start
+
+
+def main(repetitions=50):
+    import logging
+    logging.disable(logging.INFO)
+    calls = record_calls()
+    cache_size = autowrap.Code.TEMPLATE_CACHE_SIZE
+
+    autowrap.Code.TEMPLATE_CACHE_SIZE = 0
+    uncached = replay(calls, repetitions)
+
+    autowrap.Code.TEMPLATE_CACHE_SIZE = cache_size
+    autowrap.Code.Code._template_cache.clear()
+    cached = replay(calls, repetitions)
+
+    print()
+    print("%d calls of Code.add" % (len(calls) * repetitions))
+    print("without template cache: %8.3f s" % uncached)
+    print("with template cache   : %8.3f s" % cached)
+    print("speedup               : %8.2f" % (uncached / cached))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
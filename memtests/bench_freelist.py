@@ -0,0 +1,82 @@
+from __future__ import print_function
+
+"""
+Measures the creation of many small wrapped objects with and without
+@cython.freelist on the generated classes (see the wrap-freelist annotation
+and the --freelist option). The Point class from source_files/point.pxd is
+wrapped twice and the time per object and the growth of the peak memory of
+the process are reported for creating and dropping objects (which reuses the
+objects kept in the freelist) and for keeping all objects alive, together with
+the memory held by these objects (Linux only):
+
+    $ python memtests/bench_freelist.py [count] [freelist]
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import autowrap
+import autowrap.Utils
+
+source_files = os.path.join(os.path.dirname(os.path.abspath(__file__)), "source_files")
+
+
+def build(name, freelist):
+    tmp_dir = tempfile.mkdtemp()
+    for file_name in ("point.hpp", "point.pxd"):
+        shutil.copy(os.path.join(source_files, file_name), tmp_dir)
+    target = os.path.join(tmp_dir, name + ".pyx")
+    decls, instance_map = autowrap.parse(["point.pxd"], root=tmp_dir)
+    include_dirs = autowrap.generate_code(decls, instance_map, target=target,
+                                          debug=False, freelist=freelist)
+    cwd = os.getcwd()
+    try:
+        return autowrap.Utils.compile_and_import(name, [target], include_dirs + [tmp_dir])
+    finally:
+        os.chdir(cwd)
+
+
+def resident_memory_mb():
+    with open("/proc/self/statm") as fp:
+        pages = int(fp.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1024.0 / 1024.0
+
+
+def churn(module, count):
+    p = module.Point(1.0, 2.0)
+    start = time.time()
+    for i in range(count):
+        p = p.moved(1.0, 0.0)
+    return time.time() - start
+
+
+def keep(module, count):
+    memory_before = resident_memory_mb()
+    start = time.time()
+    points = [module.Point(float(i), 0.0) for i in range(count)]
+    needed = time.time() - start
+    held = resident_memory_mb() - memory_before
+    del points
+    return needed, held
+
+
+def main(count=1000000, freelist=64):
+    import logging
+    logging.disable(logging.INFO)
+    modules = [("no freelist", build("point_plain", 0)),
+               ("freelist(%d)" % freelist, build("point_freelist", freelist))]
+
+    print()
+    print("%d objects" % count)
+    print("%-16s %18s %18s %12s" % ("", "churn us/object", "keep us/object", "held MB"))
+    for label, module in modules:
+        churned = min(churn(module, count) for i in range(3))
+        kept, held = min(keep(module, count) for i in range(3))
+        print("%-16s %18.3f %18.3f %12.1f" % (label, churned * 1e6 / count, kept * 1e6 / count, held))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
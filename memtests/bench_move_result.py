@@ -0,0 +1,92 @@
+from __future__ import print_function
+
+"""
+Measures the code generated for methods which return a wrapped class. Results
+returned by value are moved and results returned by pointer are copied into a
+shared_ptr created by make_shared, which needs one allocation less than the
+code generated before (`new T(...)` plus a separate allocation for the
+reference count of the shared_ptr):
+
+    $ python memtests/bench_move_result.py [repetitions] [size]
+
+Prints the time per call and the number of copies and moves of the C++
+objects.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import autowrap
+import autowrap.Code
+import autowrap.Utils
+
+source_files = os.path.join(os.path.dirname(os.path.abspath(__file__)), "source_files")
+
+# the code which was generated for create() and self() before:
+previous_code = """
+    def create_previous(self, int n):
+        cdef shared_ptr[_BigObject] _r = shared_ptr[_BigObject](new _BigObject(self.inst.get().create(n)))
+        cdef BigObject py_result = BigObject.__new__(BigObject)
+        py_result.inst = _r
+        return py_result
+
+    def self_previous(self):
+        cdef const _BigObject * __r = self.inst.get().self()
+        cdef _BigObject * _r = new _BigObject(deref(__r))
+        cdef BigObject py_result = BigObject.__new__(BigObject)
+        py_result.inst = shared_ptr[_BigObject](_r)
+        return py_result
+"""
+
+
+def build():
+    tmp_dir = tempfile.mkdtemp()
+    for name in ("big_object.hpp", "big_object.pxd"):
+        shutil.copy(os.path.join(source_files, name), tmp_dir)
+    target = os.path.join(tmp_dir, "big_object_wrapper.pyx")
+    manual_code = {"BigObject": autowrap.Code.Code().add(previous_code)}
+    include_dirs = autowrap.parse_and_generate_code(["big_object.pxd"], root=tmp_dir,
+                                                    target=target, debug=False,
+                                                    manual_code=manual_code)
+    cwd = os.getcwd()
+    try:
+        return autowrap.Utils.compile_and_import("big_object_wrapper", [target],
+                                                 include_dirs + [tmp_dir])
+    finally:
+        os.chdir(cwd)
+
+
+def measure(obj, method, repetitions, *args):
+    # best of 5 runs, the counters are reported for one run:
+    timings = []
+    for run in range(5):
+        obj.resetCounters()
+        start = time.time()
+        for i in range(repetitions):
+            method(*args)
+        timings.append(time.time() - start)
+    return min(timings), obj.getCopies(), obj.getMoves()
+
+
+def main(repetitions=20000, size=10000):
+    import logging
+    logging.disable(logging.INFO)
+    wrapped = build()
+    obj = wrapped.BigObject(size)
+
+    print()
+    print("%d calls, objects with %d doubles" % (repetitions, size))
+    print("%-20s %14s %8s %8s" % ("", "us per call", "copies", "moves"))
+    for label, method, args in [("by value (before)", obj.create_previous, (size,)),
+                                ("by value", obj.create, (size,)),
+                                ("by pointer (before)", obj.self_previous, ()),
+                                ("by pointer", obj.self, ())]:
+        needed, copies, moves = measure(obj, method, repetitions, *args)
+        print("%-20s %14.3f %8d %8d" % (label, needed * 1e6 / repetitions, copies, moves))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,46 @@
+#include <vector>
+
+class BigObject {
+
+    private:
+        std::vector<double> data;
+
+    public:
+
+        static int copies;
+        static int moves;
+
+        BigObject(int n): data(n, 1.0) {}
+
+        BigObject(const BigObject & other): data(other.data)
+        {
+            copies++;
+        }
+
+        BigObject(BigObject && other): data(std::move(other.data))
+        {
+            moves++;
+        }
+
+        BigObject create(int n) const
+        {
+            return BigObject(n);
+        }
+
+        const BigObject * self() const
+        {
+            return this;
+        }
+
+        int size() const
+        {
+            return data.size();
+        }
+
+        int getCopies() const { return copies; }
+        int getMoves() const { return moves; }
+        void resetCounters() { copies = moves = 0; }
+};
+
+int BigObject::copies = 0;
+int BigObject::moves = 0;
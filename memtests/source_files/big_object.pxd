@@ -0,0 +1,13 @@
+cdef extern from "big_object.hpp":
+
+    cdef cppclass BigObject:
+        BigObject(int n)
+        BigObject(BigObject &)
+
+        BigObject create(int n)
+        const BigObject * self()
+        int size()
+
+        int getCopies()
+        int getMoves()
+        void resetCounters()
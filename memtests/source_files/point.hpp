@@ -0,0 +1,19 @@
+class Point {
+
+    private:
+        double x_, y_;
+
+    public:
+
+        Point(): x_(0), y_(0) {}
+        Point(double x, double y): x_(x), y_(y) {}
+        Point(const Point & other): x_(other.x_), y_(other.y_) {}
+
+        double getX() const { return x_; }
+        double getY() const { return y_; }
+
+        Point moved(double dx, double dy) const
+        {
+            return Point(x_ + dx, y_ + dy);
+        }
+};
@@ -0,0 +1,10 @@
+cdef extern from "point.hpp":
+
+    cdef cppclass Point:
+        Point()
+        Point(double x, double y)
+        Point(Point &)
+
+        double getX()
+        double getY()
+        Point moved(double dx, double dy)
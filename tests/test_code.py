@@ -60,3 +60,67 @@ def test():
     assert lines[3] == "    else:",        repr(lines[3])
     assert lines[4] == "        return 2*x", repr(lines[4])
     assert len(lines) == 5
+
+
+def test_write_to():
+    import io
+    Code = autowrap.Code.Code
+    c = Code()
+    c.add("class A:")
+    inner = Code()
+    inner.add("def f(self):")
+    inner.add(Code().add("return 42"))
+    c.add(inner)
+
+    assert list(c.iter_lines()) == c.render().split("\n")
+
+    fp = io.StringIO()
+    c.write_to(fp)
+    assert fp.getvalue() == c.render()
+
+    fp = io.StringIO()
+    Code().write_to(fp)
+    assert fp.getvalue() == ""
+
+
+def test_template_cache():
+    Code = autowrap.Code.Code
+
+    templates = [("""
+                  |def $name(x):
+                  |    return x % $value
+                  |    # costs $$1
+                  """, dict(name="f", value=3)),
+                 ("""
+                  |if x
+                  + == $value:
+                  |    $body
+                  """, dict(value=3, body="pass\n    |return")),
+                 ("""
+                  |$name = [$value
+                  +  ]
+                  """, dict(name="li", value="1,\n")),
+                 ("""
+                  |x = $value
+                  + + 1
+                  |${name}()
+                  """, dict(name="f", value="2")),
+                 ("a = $value", dict(value="1\n  + 2\n |b = 3"))]
+
+    def render_all():
+        result = []
+        for template, kw in templates:
+            # twice, the second call uses the cached template:
+            for i in range(2):
+                result.append(Code().add(template, kw).render())
+        return result
+
+    cache_size = autowrap.Code.TEMPLATE_CACHE_SIZE
+    try:
+        autowrap.Code.TEMPLATE_CACHE_SIZE = 0
+        expected = render_all()
+    finally:
+        autowrap.Code.TEMPLATE_CACHE_SIZE = cache_size
+    assert render_all() == expected
+    assert expected[0].split("\n") == ["def f(x):", "    return x % 3", "    # costs $1"]
+    assert expected[2].split("\n") == ["if x == 3:", "    pass", "return"]
@@ -74,6 +74,17 @@ def test_number_conv():
     repr_ = "%.13e" % outl[0]
     assert repr_.startswith("5.0000000000000"), "loss of precision during conversion: %s" % repr_
 
+    # wrap-return-buffer returns an object which provides the buffer protocol:
+    buf = mod.range_vec(5)
+    assert len(buf) == 5
+    view = memoryview(buf)
+    assert view.format == "d"
+    assert view.tolist() == [0.0, 0.5, 1.0, 1.5, 2.0]
+    view = memoryview(mod.range_int_vec(3))
+    assert view.itemsize == 4
+    assert view.tolist() == [0, 1, 2]
+    assert memoryview(mod.range_vec(0)).tolist() == []
+
 
 def test_shared_ptr():
 
@@ -626,6 +637,8 @@ def test_minimal():
     cpp_source = os.path.join(test_files, "minimal.cpp")
     wrapped = autowrap.Utils.compile_and_import("wrapped", [target, cpp_source],
                                                 include_dirs)
+    with open(target) as fp:
+        generated = fp.read()
     os.remove(target)
     assert wrapped.__name__ == "wrapped"
 
@@ -712,6 +725,19 @@ def test_minimal():
     m3 = wrapped.Minimal([1, 2, 3])
     assert m3.compute(0) == 4
 
+    # overloads are dispatched by the types of the arguments, the candidates
+    # are cached per signature:
+    assert wrapped.Minimal._dispatch___init__[(list,)] == (2,)
+    with pytest.raises(Exception):
+        wrapped.Minimal([1, "2"])
+    with pytest.raises(Exception):
+        wrapped.Minimal(1, 2)
+    assert (int, int) in wrapped.Minimal._dispatch___init__
+    # the deep check of the list items is only run by the dispatcher:
+    init_2 = generated[generated.index("def _unchecked_init_2("):generated.index("def _unchecked_init_3(")]
+    assert "assert" not in init_2
+    assert not hasattr(wrapped.Minimal, "_init_2")
+
     ### Different ways of wrapping a function: 
     # all three call() methods (call, call2, call3) do exactly the same thing
     # and all modify the input argument. However, they are wrapped differently
@@ -751,6 +777,37 @@ def test_minimal():
     assert m1.compute(42) == 42
     assert m2.compute(42) == 43
 
+    lazy = m3.create_two_lazy()
+    assert not isinstance(lazy, list)
+    assert len(lazy) == 2
+    assert lazy[0].compute(42) == 42
+    assert lazy[-1].compute(42) == 43
+    assert [m.compute(42) for m in lazy] == [42, 43]
+    assert [m.compute(42) for m in lazy[::-1]] == [43, 42]
+    assert lazy.tolist() == [m1, m2]
+    expect_exception(lambda: lazy[2])()
+    expect_exception(lambda: lazy[-3])()
+    lazy[0].m_accessible = 7
+    assert lazy[0].m_accessible == 0
+
+    # with wrap-share-elements the items point into the returned vector:
+    lazy = m3.create_two_lazy_shared()
+    first = lazy[0]
+    first.m_accessible = 7
+    assert lazy[0].m_accessible == 7
+    del lazy
+    assert first.compute(42) == 42
+
+    # results returned by pointer are copied:
+    copied = m2.self_ptr()
+    assert copied == m2
+    copied.m_accessible = 5
+    assert m2.m_accessible != 5
+
+    s1, s2 = m3.create_two_shared()
+    assert s1.compute(42) == 42
+    assert s2.compute(42) == 43
+
     assert m2.enumTest(wrapped.Minimal.ABCorD.A) == wrapped.Minimal.ABCorD.A
 
     expect_exception(lambda: m2.enumTest(1))()
@@ -766,6 +823,40 @@ def test_minimal():
     assert b == m1
     assert c == m3
 
+    # the shared items point into m2 and keep it alive:
+    m4 = wrapped.Minimal()
+    m4.setVector([m1, m3])
+    a, b = m4.shared_items()
+    assert (a, b) == (m1, m3)
+    a.m_accessible = 42
+    assert next(m4.shared_items()).m_accessible == 42
+    assert next(iter(m4)).m_accessible == 42
+    del m4
+    assert a == m1
+
+    # with wrap-return-ref the result refers to the storage of m4:
+    m4 = wrapped.Minimal()
+    assert m4.first_ptr() is None
+    m4.setVector([m3, m1])
+    first = m4.first_ptr()
+    assert first == m3
+    first.m_accessible = 17
+    assert m4.first_ptr().m_accessible == 17
+    assert next(iter(m4)).m_accessible == 17
+    assert m3.m_accessible != 17
+    del m4
+    assert first.m_accessible == 17
+
+    # the const reference returned by first() is copied, so changing the
+    # result does not change m4:
+    m4 = wrapped.Minimal()
+    m4.setVector([m3, m1])
+    first = m4.first()
+    assert first == m3
+    first.m_accessible = 23
+    assert next(iter(m4)).m_accessible != 23
+    assert m4.first().m_accessible != 23
+
     assert m2.test2Lists([m1], [1, 2]) == 3
     assert m1 == m1
 
@@ -775,6 +866,17 @@ def test_minimal():
 
     assert wrapped.top_function(42) == 84
     assert wrapped.sumup([1, 2, 3]) == 6
+    # numeric vectors also accept buffers with the matching item type:
+    import array
+    assert wrapped.sumup(array.array("i", [1, 2, 3])) == 6
+    assert wrapped.sumup(array.array("i")) == 0
+    assert m2.test2Lists([m1], array.array("i", [1, 2])) == 3
+    with pytest.raises(AssertionError):
+        wrapped.sumup(array.array("d", [1.0]))
+    with pytest.raises(AssertionError):
+        wrapped.sumup(memoryview(array.array("i", [1, 2, 3]))[::2])
+    m4 = wrapped.Minimal(array.array("i", [1, 2, 3]))
+    assert m4.compute(0) == 4
     assert wrapped.Minimal.run_static(1) == 4
     assert wrapped.Minimal.run_static_extra_arg(1, True) == 4
 
@@ -897,6 +999,280 @@ def test_templated():
     assert templated_o.computeSeven() == 7
 
 
+def test_incremental_generation(tmpdir):
+    from autowrap.code_generators import CythonGenerator
+
+    def generate(target, state_path=None):
+        decls, instance_map = autowrap.parse(["minimal.pxd", "minimal_td.pxd"],
+                                             root=test_files)
+        gen = CythonGenerator(decls, instance_map, pyx_target_path=target)
+        gen.incremental_state_path = state_path
+        gen.create_code_file()
+        with open(target) as fp:
+            return gen, fp.read()
+
+    reference_target = tmpdir.join("reference.pyx").strpath
+    __, reference = generate(reference_target)
+
+    target = tmpdir.join("minimal_wrapper.pyx").strpath
+    state_path = tmpdir.join("minimal_wrapper.autowrap_state").strpath
+    gen, first = generate(target, state_path)
+    assert gen.reused_cnt == 0
+    assert first == reference
+
+    os.utime(target, (0, 0))
+    gen, second = generate(target, state_path)
+    assert gen.reused_cnt == len(gen.generated_cache) > 0
+    assert second == reference
+    # unchanged output is not rewritten:
+    assert os.path.getmtime(target) == 0
+
+    # also without incremental state:
+    os.utime(reference_target, (0, 0))
+    generate(reference_target)
+    assert os.path.getmtime(reference_target) == 0
+
+
+def test_parallel_generation(tmpdir):
+    from autowrap.code_generators import CythonGenerator
+
+    def generate(target, num_processes):
+        decls, instance_map = autowrap.parse(["minimal.pxd", "minimal_td.pxd",
+                                              "libcpp_stl_test.pxd"],
+                                             root=test_files)
+        gen = CythonGenerator(decls, instance_map, pyx_target_path=target)
+        gen.num_processes = num_processes
+        gen.create_code_file()
+        with open(target) as fp:
+            return gen, fp.read()
+
+    serial_gen, serial = generate(tmpdir.join("serial.pyx").strpath, 1)
+    parallel_gen, parallel = generate(tmpdir.join("parallel.pyx").strpath, 3)
+    assert parallel == serial
+    assert parallel_gen.wrapped_classes_cnt == serial_gen.wrapped_classes_cnt
+    assert parallel_gen.wrapped_methods_cnt == serial_gen.wrapped_methods_cnt
+
+
+def test_type_check_levels(tmpdir):
+    from autowrap.code_generators import CythonGenerator
+
+    tmpdir.join("checks.pxd").write("""
+from libcpp.vector cimport vector as libcpp_vector
+
+cdef extern from "checks.hpp":
+
+    cdef cppclass Checked:
+        # wrap-type-checks:
+        #   shallow
+        int sum(libcpp_vector[int] values)
+        int first(libcpp_vector[int] values) # wrap-type-checks:full
+        int last(libcpp_vector[int] values) # wrap-type-checks:none
+
+    int total(libcpp_vector[int] values)
+""")
+
+    def generate(type_checks):
+        decls, instance_map = autowrap.parse(["checks.pxd"], root=tmpdir.strpath)
+        target = tmpdir.join("checks_%s.pyx" % type_checks).strpath
+        gen = CythonGenerator(decls, instance_map, pyx_target_path=target)
+        gen.type_checks = type_checks
+        gen.create_code_file()
+        with open(target) as fp:
+            code = fp.read()
+        checks = dict()
+        for line in code.split("\n"):
+            line = line.strip()
+            if line.startswith("def "):
+                name = line[4:].partition("(")[0]
+                checks[name] = []
+            elif line.startswith("assert"):
+                checks[name].append(line)
+        return checks
+
+    shallow = ("assert isinstance(values, list) or _is_buffer(values),"
+               " 'arg values wrong type'")
+    full = ("assert isinstance(values, list) and all(isinstance(elemt_rec, (int, long))"
+            " for elemt_rec in values) or _is_buffer_of(values, <int *>NULL),"
+            " 'arg values wrong type'")
+    checks = generate("full")
+    assert checks["sum"] == [shallow]
+    assert checks["first"] == [full]
+    assert checks["last"] == []
+    assert checks["total"] == [full]
+
+    checks = generate("none")
+    assert checks["sum"] == [shallow]
+    assert checks["total"] == []
+
+    # without checks, sequences which are no buffers are converted by cython:
+    tmpdir.join("checks.hpp").write("""
+#include <vector>
+inline int total(std::vector<int> values)
+{
+    int result = 0;
+    for (size_t i = 0; i < values.size(); i++) result += values[i];
+    return result;
+}
+class Checked {
+    public:
+        int sum(std::vector<int> values) { return total(values); }
+        int first(std::vector<int> values) { return values[0]; }
+        int last(std::vector<int> values) { return values.back(); }
+};
+""")
+    decls, instance_map = autowrap.parse(["checks.pxd"], root=tmpdir.strpath)
+    target = tmpdir.join("checks_compiled.pyx").strpath
+    include_dirs = autowrap.generate_code(decls, instance_map, target, type_checks="none")
+    import array
+    wrapped = autowrap.Utils.compile_and_import("checks_compiled", [target],
+                                                include_dirs + [tmpdir.strpath])
+    assert wrapped.total((1, 2, 3)) == 6
+    assert wrapped.total(array.array("i", [1, 2])) == 3
+    assert wrapped.Checked().last((1, 2, 3)) == 3
+
+
+def test_freelist(tmpdir):
+    from autowrap.code_generators import CythonGenerator
+
+    tmpdir.join("pooled.pxd").write("""
+cdef extern from "pooled.hpp":
+
+    cdef cppclass Point:
+        Point()
+
+    cdef cppclass Peak:
+        # wrap-freelist:
+        #   0
+        Peak()
+
+    cdef cppclass Range:
+        # wrap-freelist:
+        #   64
+        Range()
+""")
+
+    def generate(freelist):
+        decls, instance_map = autowrap.parse(["pooled.pxd"], root=tmpdir.strpath)
+        target = tmpdir.join("pooled_%d.pyx" % freelist).strpath
+        gen = CythonGenerator(decls, instance_map, pyx_target_path=target)
+        gen.freelist = freelist
+        gen.create_code_file()
+        with open(target) as fp:
+            lines = [line.strip() for line in fp]
+        decorators = dict()
+        for i, line in enumerate(lines):
+            if line.startswith("cdef class "):
+                name = line[len("cdef class "):].rstrip(":")
+                decorators[name] = lines[i - 1] if lines[i - 1].startswith("@") else None
+        return decorators, "cimport cython" in lines
+
+    decorators, cimported = generate(0)
+    assert decorators == dict(Point=None, Peak=None, Range="@cython.freelist(64)")
+    assert cimported
+
+    decorators, __ = generate(16)
+    assert decorators == dict(Point="@cython.freelist(16)", Peak=None,
+                              Range="@cython.freelist(64)")
+
+
+def test_converter_registry_memo():
+    from autowrap.ConversionProvider import (setup_converter_registry,
+                                             TypeConverterBase)
+    from autowrap.DeclResolver import ResolvedClass, ResolvedEnum
+    from autowrap.Types import CppType
+
+    decls, instance_map = autowrap.parse(["minimal.pxd", "minimal_td.pxd"],
+                                         root=test_files)
+    classes = [d for d in decls if isinstance(d, ResolvedClass)]
+    enums = [d for d in decls if isinstance(d, ResolvedEnum)]
+    registry = setup_converter_registry(classes, enums, instance_map)
+
+    double = CppType.from_string("double")
+    converter = registry.get(double)
+    assert registry.get(CppType.from_string("double")) is converter
+    assert registry.memo_hits["get"] == 1
+
+    cy_type = registry.cython_type("Minimal")
+    assert registry.cython_type("Minimal") is cy_type
+    assert str(cy_type) == "_Minimal"
+
+    class OtherDoubleConverter(TypeConverterBase):
+
+        def get_base_types(self):
+            return "double",
+
+        def matches(self, cpp_type):
+            return True
+
+    # registering a converter invalidates the memo:
+    other = OtherDoubleConverter()
+    registry.register(other)
+    assert registry.get(double) is other
+
+    with pytest.raises(Exception):
+        registry.get(CppType.from_string("unknown_type"))
+
+
+def test_release_gil(tmpdir):
+    from autowrap.code_generators import CythonGenerator
+
+    tmpdir.join("released.pxd").write("""
+cdef extern from "released.hpp":
+
+    cdef cppclass Worker:
+        Worker()
+        int compute(int n) nogil
+        int inspect(int n)
+        void forced(int n) nogil # wrap-release-gil
+""")
+
+    def generate(release_gil, name):
+        decls, instance_map = autowrap.parse(["released.pxd"], root=tmpdir.strpath)
+        target = tmpdir.join(name).strpath
+        gen = CythonGenerator(decls, instance_map, pyx_target_path=target)
+        gen.release_gil = release_gil
+        gen.create_code_file()
+        with open(target) as fp:
+            return fp.read()
+
+    def released(code, method):
+        body = code.split("def %s(" % method)[1].split("\n    def ")[0]
+        return "with nogil:" in body
+
+    code = generate(False, "released_off.pyx")
+    assert not released(code, "compute")
+    assert not released(code, "inspect")
+    assert released(code, "forced")
+
+    code = generate(True, "released_on.pyx")
+    assert released(code, "compute")
+    assert not released(code, "inspect")
+    assert released(code, "forced")
+
+    # dereferenced pointers are passed as they are, other dereferenced
+    # expressions as pointers, so in/out arguments are not copied:
+    from autowrap.Types import CppType
+    decls, instance_map = autowrap.parse(["released.pxd"], root=tmpdir.strpath)
+    gen = CythonGenerator(decls, instance_map, pyx_target_path=tmpdir.join("hoisted.pyx").strpath)
+    vector_t = CppType.from_string("libcpp_vector[int] &")
+    code = autowrap.Code.Code()
+    hoisted = gen._hoist_call_args(code, ["deref(v0)", "deref(get_v1())", "(<int>n)"],
+                                   [vector_t, vector_t, CppType("int")])
+    assert hoisted == ["deref(v0)", "deref(_arg1)", "_arg2"]
+    assert code.render().split("\n") == ["    cdef libcpp_vector[int] * _arg1 = address(deref(get_v1()))",
+                                         "    cdef int _arg2 = (<int>n)"]
+
+    # the annotation requires a nogil declaration:
+    tmpdir.join("released.pxd").write("""
+cdef extern from "released.hpp":
+
+    cdef cppclass Worker:
+        int inspect(int n) # wrap-release-gil
+""")
+    with pytest.raises(Exception):
+        generate(False, "released_bad.pyx")
+
+
 def test_gil_unlock():
 
     target = os.path.join(test_files, "gil_testing_wrapper.pyx")
@@ -909,6 +1285,20 @@ def test_gil_unlock():
     g.do_something(b"How are you?")
     assert g.get_greetings() == b"Hello Jack, How are you?"
 
+    # wrap-release-gil hoists the arguments and converts the result after
+    # the nogil block:
+    assert g.count_without_gil(3) == 3
+    renamed = g.renamed_without_gil(b" Jr.")
+    renamed.do_something(b"Hi")
+    assert renamed.get_greetings() == b"Hello Jack Jr., Hi"
+    assert g.self_without_gil() is not None
+    # the vector is modified in place and copied back into the list:
+    others = [renamed]
+    g.append_without_gil(others)
+    assert len(others) == 2
+    assert others[1].get_greetings() == g.get_greetings()
+    assert wrapped.sum_without_gil([1, 2, 3]) == 6
+
 
 def test_automatic_string_conversion():
     target = os.path.join(test_files, "libcpp_utf8_string_test.pyx")
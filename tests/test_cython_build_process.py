@@ -53,3 +53,80 @@ def testSimplePyx():
     assert container.size() == 0
     container.push_back(ics.Xint(0))
     assert container.size() == 1
+
+
+def testBuildModules(tmpdir):
+    import shutil
+    import sys
+    import autowrap.Build
+
+    # new module name, the module above is imported already:
+    ics_pyx = tmpdir.join("ics_built.pyx").strpath
+    shutil.copy(os.path.join(test_files, "int_container_class.pyx"), ics_pyx)
+    square_pyx = tmpdir.join("square_built.pyx").strpath
+    with open(square_pyx, "w") as fp:
+        fp.write("def square(int x):\n    return x * x\n")
+    pyx_files = [square_pyx, ics_pyx]
+    cache_dir = tmpdir.join("cache").strpath
+
+    def build():
+        return autowrap.Build.build_modules(pyx_files, [test_files], cache_dir=cache_dir,
+                                            num_processes=2)
+
+    results = build()
+    assert [r.name for r in results] == ["square_built", "ics_built"]
+    assert all(r.cython_seconds is not None and r.compile_seconds is not None
+               for r in results)
+
+    sys.path.insert(0, tmpdir.strpath)
+    try:
+        import square_built
+        import ics_built
+    finally:
+        sys.path.pop(0)
+    assert square_built.square(3) == 9
+    assert (ics_built.Xint(3) + ics_built.Xint(4)).getValue() == 7
+
+    # nothing changed:
+    assert all(r.up_to_date for r in build())
+
+    # only the changed module is built again:
+    with open(pyx_files[0], "a") as fp:
+        fp.write("\n# changed\n")
+    changed, unchanged = build()
+    assert changed.cython_seconds is not None and changed.compile_seconds is not None
+    assert unchanged.up_to_date
+
+    # the previous content is still in the cache:
+    with open(square_pyx, "w") as fp:
+        fp.write("def square(int x):\n    return x * x\n")
+    assert all(r.up_to_date for r in build())
+
+
+def testBuildModulesHeaderChanged(tmpdir):
+    import autowrap.Build
+
+    header = tmpdir.join("answer_built.hpp")
+    header.write("inline int answer() { return 42; }\n")
+    pyx_file = tmpdir.join("answer_built.pyx")
+    pyx_file.write('cdef extern from "answer_built.hpp":\n'
+                   '    int answer()\n\n'
+                   'def get_answer():\n'
+                   '    return answer()\n')
+    cache_dir = tmpdir.join("cache").strpath
+
+    def build():
+        result, = autowrap.Build.build_modules([pyx_file.strpath], [tmpdir.strpath],
+                                               cache_dir=cache_dir)
+        return result
+
+    assert build().compile_seconds is not None
+    assert build().up_to_date
+
+    # the header included by the C++ code is part of the cache key, even if
+    # it is not passed as depends:
+    header.write("inline int answer() { return 43; }\n")
+    result = build()
+    assert result.cython_seconds is None
+    assert result.compile_seconds is not None
+    assert build().up_to_date
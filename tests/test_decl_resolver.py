@@ -163,6 +163,29 @@ def test_simple_mp():
     assert enumdcl.name == "ABCorD"
     assert sorted(map_.keys()) == ["ABCorD", "Minimal"]
 
+def test_mp_keeps_order(tmpdir):
+    from autowrap.PXDCache import PXDCache
+
+    root = os.path.join(os.path.dirname(__file__), "test_files")
+    files = ["A.pxd", "B.pxd", "C.pxd", "D.pxd", "minimal.pxd", "templates.pxd"]
+
+    def names(resolved):
+        return [r.name for r in resolved]
+
+    expected, __ = DeclResolver.resolve_decls_from_files(files, root)
+    cache = PXDCache(tmpdir.strpath)
+    resolved, __ = DeclResolver.resolve_decls_from_files(files, root, num_processes=3,
+                                                         cache=cache)
+    assert names(resolved) == names(expected)
+    assert (cache.hits, cache.misses) == (0, len(files))
+
+    # the second run finds all files in the cache:
+    resolved, __ = DeclResolver.resolve_decls_from_files(files, root, num_processes=3,
+                                                         cache=cache)
+    assert names(resolved) == names(expected)
+    assert cache.hits == len(files)
+
+
 def test_singular():
 
     resolved, map_ = _resolve("templates.pxd")
@@ -30,6 +30,12 @@ class B_second {
         B_second(int i): i_(i) { };
         B_second(const B_second & i): i_(i.i_) { };
         void processA(const Aklass & a) {i_ = a.i_ + 10;}
+        std::vector<int> getMultiples(int n)
+        {
+            std::vector<int> result;
+            for (int k = 1; k <= n; k++) result.push_back(k * i_);
+            return result;
+        }
 };
 
 #endif
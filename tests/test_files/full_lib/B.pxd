@@ -17,6 +17,7 @@ cdef extern from "B.hpp":
         B_second(int i)
         B_second(B_second & i)
         void processA(Aklass & a)
+        libcpp_vector[int] getMultiples(int n) # wrap-return-buffer
 
     cdef cppclass Bklass (A_second):
         # wrap-inherits:
@@ -22,6 +22,12 @@ class D_second {
         D_second(int i): i_(i) { };
         D_second(const D_second & i): i_(i.i_) { };
         void runB(const B_second & arg) { i_ = arg.i_;}
+        std::vector<B_second> getBs(int n)
+        {
+            std::vector<B_second> result;
+            for (int k = 0; k < n; k++) result.push_back(B_second(i_ + k));
+            return result;
+        }
 };
 
 
@@ -15,6 +15,8 @@ cdef extern from "D.hpp":
         D_second(int i)
         D_second(D_second & i)
         void runB(B_second & i)
+        # B_second is wrapped in another module:
+        libcpp_vector[B_second] getBs(int n) # wrap-return-lazy
 
     cdef cppclass Dklass:
         int i_
@@ -1,32 +1,38 @@
 // test GIL unlocking
 
 #include <string>
+#include <vector>
 #include <Python.h>
 #include <stdio.h>
 
-class GilTesting{
-  public:
-
-    GilTesting (const char* name): name_(name), greetings_() {}
-
-    void do_something (const char* msg) {
+inline bool has_gil() {
 
-      bool has_gil;
+    bool has_gil;
 #if PY_MAJOR_VERSION >= 3
 #if PY_MINOR_VERSION >= 4
-        // Python >= 3.4 is easy
-        has_gil = PyGILState_Check();
+    // Python >= 3.4 is easy
+    has_gil = PyGILState_Check();
 #else
-        PyThreadState * tstate = (PyThreadState*)_Py_atomic_load_relaxed(&_PyThreadState_Current);
-        has_gil = (tstate && (tstate == PyGILState_GetThisThreadState()));
+    PyThreadState * tstate = (PyThreadState*)_Py_atomic_load_relaxed(&_PyThreadState_Current);
+    has_gil = (tstate && (tstate == PyGILState_GetThisThreadState()));
 #endif
 
 #else
-        // For Python 2.0
-        PyThreadState * tstate = _PyThreadState_Current;
-        has_gil = (tstate && (tstate == PyGILState_GetThisThreadState()));
+    // For Python 2.0
+    PyThreadState * tstate = _PyThreadState_Current;
+    has_gil = (tstate && (tstate == PyGILState_GetThisThreadState()));
 #endif
-        if (has_gil) {
+    return has_gil;
+}
+
+class GilTesting{
+  public:
+
+    GilTesting (const char* name): name_(name), greetings_() {}
+
+    void do_something (const char* msg) {
+
+        if (has_gil()) {
             greetings_ = "Hello ";
             greetings_.append(name_);
             greetings_.append(", Sorry the GIL is locked, test failed.");
@@ -42,7 +48,31 @@ class GilTesting{
         return greetings_.c_str();
     }
 
+    int count_without_gil(int n) const {
+        return has_gil() ? -1 : n;
+    }
+
+    GilTesting renamed_without_gil(std::string suffix) const {
+        return GilTesting((name_ + (has_gil() ? " locked" : suffix)).c_str());
+    }
+
+    const GilTesting * self_without_gil() const {
+        return has_gil() ? 0 : this;
+    }
+
+    void append_without_gil(std::vector<GilTesting> & others) const {
+        if (!has_gil())
+            others.push_back(*this);
+    }
+
   private:
     std::string name_;
     std::string greetings_;
 };
+
+inline int sum_without_gil(const std::vector<int> & values) {
+    int sum = 0;
+    for (size_t i = 0; i < values.size(); i++)
+        sum += values[i];
+    return has_gil() ? -1 : sum;
+}
@@ -1,7 +1,16 @@
 from libc.string cimport const_char
+from libcpp.string cimport string as libcpp_string
+from libcpp.vector cimport vector as libcpp_vector
 
 cdef extern from "gil_testing.hpp":
     cdef cppclass GilTesting:
         GilTesting(const_char*)
+        GilTesting(GilTesting &)
         void do_something(const_char*) nogil # wrap-with-no-gil
         const_char* get_greetings()
+        int count_without_gil(int n) nogil # wrap-release-gil
+        GilTesting renamed_without_gil(libcpp_string suffix) nogil # wrap-release-gil
+        const GilTesting * self_without_gil() nogil # wrap-release-gil
+        void append_without_gil(libcpp_vector[GilTesting] & others) nogil # wrap-release-gil
+
+    int sum_without_gil(libcpp_vector[int] values) nogil # wrap-release-gil
@@ -42,6 +42,9 @@ class Minimal {
         int run2(Minimal *) const;
         int run3(Minimal &) const;
         int run4(Minimal &) const;
+        const Minimal * self_ptr() const { return this; }
+        const Minimal & first() const { return _mi.front(); }
+        Minimal * first_ptr() { return _mi.empty() ? 0 : &_mi.front(); }
 
         unsigned int test_special_converter(unsigned int l) const;
 
@@ -64,6 +67,9 @@ class Minimal {
 
         std::vector<std::string> message() const;
         std::vector<Minimal> create_two() const;
+        std::vector<Minimal> create_two_lazy() const { return create_two(); }
+        std::vector<Minimal> create_two_lazy_shared() const { return create_two(); }
+        std::vector<Minimal> create_two_shared() const { return create_two(); }
 
         void setVector(std::vector<Minimal> in);
         std::vector<Minimal> getVector() const;
@@ -72,6 +78,8 @@ class Minimal {
 
         std::vector<Minimal>::iterator begin();
         std::vector<Minimal>::iterator end();
+        std::vector<Minimal>::iterator begin_shared() { return _mi.begin(); }
+        std::vector<Minimal>::iterator end_shared() { return _mi.end(); }
 
         Minimal create() const;
 
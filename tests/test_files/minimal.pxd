@@ -15,6 +15,8 @@ cdef extern from "minimal.hpp":
 
 
     cdef cppclass Minimal:
+        # wrap-freelist:
+        #   8
         Minimal()
         Minimal(int)
         Minimal(libcpp_vector[int])
@@ -41,6 +43,9 @@ cdef extern from "minimal.hpp":
         int run3(Minimal & ref)
         int run4(const Minimal & ref) # attention here!
         Minimal create()
+        const Minimal * self_ptr()
+        const Minimal & first() # wrap-return-ref
+        Minimal * first_ptr() # wrap-return-ref
         Minimal & getRef()   # wrap-ignore
 
 
@@ -53,6 +58,8 @@ cdef extern from "minimal.hpp":
 
         libcpp_vector[Minimal].iterator begin() # wrap-iter-begin:__iter__(Minimal)
         libcpp_vector[Minimal].iterator end()   # wrap-iter-end:__iter__(Minimal)
+        libcpp_vector[Minimal].iterator begin_shared() # wrap-iter-begin:shared_items(Minimal) wrap-share-elements
+        libcpp_vector[Minimal].iterator end_shared()   # wrap-iter-end:shared_items(Minimal)
 
         int operator()(Minimal) # wrap-cast:toInt
 
@@ -69,6 +76,9 @@ cdef extern from "minimal.hpp":
         int call_str(libcpp_vector[libcpp_string] & what)
         libcpp_vector[libcpp_string] message()
         libcpp_vector[Minimal] create_two()
+        libcpp_vector[Minimal] create_two_lazy() # wrap-return-lazy
+        libcpp_vector[Minimal] create_two_lazy_shared() # wrap-return-lazy wrap-share-elements
+        libcpp_vector[Minimal] create_two_shared() # wrap-share-elements
         int operator==(Minimal &)
         ABCorD enumTest(ABCorD)
 
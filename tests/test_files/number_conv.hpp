@@ -19,3 +19,19 @@ std::vector<double> pass_full_precision_vec(std::vector<double> & in)
 }
 
 
+
+std::vector<double> range_vec(int n)
+{
+    std::vector<double> result;
+    for (int i = 0; i < n; ++i)
+        result.push_back(i * 0.5);
+    return result;
+}
+
+std::vector<int> range_int_vec(int n)
+{
+    std::vector<int> result;
+    for (int i = 0; i < n; ++i)
+        result.push_back(i);
+    return result;
+}
@@ -6,3 +6,5 @@ cdef extern from "number_conv.hpp":
     double add_max_float(double)
     double pass_full_precision(double)
     libcpp_vector[double] pass_full_precision_vec(libcpp_vector[double] &)
+    libcpp_vector[double] range_vec(int n) # wrap-return-buffer
+    libcpp_vector[int] range_int_vec(int n) # wrap-return-buffer
@@ -59,21 +59,12 @@ import pprint
 from Cython.Distutils import build_ext
 
 ext = []
-ext.append( Extension("moduleCD", sources = ['moduleCD.pyx'], language="c++",
-        include_dirs = %(include_dirs)r,
-        extra_compile_args = ['-Wno-unused-but-set-variable'],
-        extra_link_args = [],
-        ))
-ext.append(Extension("moduleA", sources = ['moduleA.pyx'], language="c++",
-        include_dirs = %(include_dirs)r,
-        extra_compile_args = ['-Wno-unused-but-set-variable'],
-        extra_link_args = [],
-        ))
-ext.append(Extension("moduleB", sources = ['moduleB.pyx'], language="c++",
-        include_dirs = %(include_dirs)r,
-        extra_compile_args = ['-Wno-unused-but-set-variable'],
-        extra_link_args = [],
-        ))
+for name in %(names)r:
+    ext.append(Extension(name, sources = [name + '.pyx'], language="c++",
+            include_dirs = %(include_dirs)r,
+            extra_compile_args = ['-Wno-unused-but-set-variable'],
+            extra_link_args = [],
+            ))
 
 setup(cmdclass = {'build_ext' : build_ext},
       name="moduleCD",
@@ -235,6 +226,16 @@ def test_full_lib(tmpdir):
         )
         masterDict[modname]["inc_dirs"] = autowrap_include_dirs
 
+    # only the classes which are used are cimported from the other modules:
+    with open("moduleCD.pxd") as fp:
+        cimports = [l.strip() for l in fp if l.startswith("from module")]
+    assert cimports == ["from moduleB cimport B_second"]
+    # the docstring of Bklass names its base class A_second, which is not
+    # used by the code of moduleB:
+    with open("moduleB.pxd") as fp:
+        cimports = [l.strip() for l in fp if l.startswith("from module")]
+    assert cimports == ["from moduleA cimport Aalias"]
+
     # Step 4: Generate CPP code
     for modname in mnames:
         m_filename = "%s.pyx" % modname
@@ -269,6 +270,8 @@ def test_full_lib(tmpdir):
     assert Bsecond.i_ == 8
     Bsecond.processA(Aobj)
     assert Bsecond.i_ == 15
+    # the buffer class is declared in moduleB.pxd and defined in moduleB.pyx:
+    assert memoryview(Bsecond.getMultiples(3)).tolist() == [15, 30, 45]
 
     assert Bobj.KlassE is not None
     assert Bobj.KlassE.B1 is not None
@@ -296,6 +299,95 @@ def test_full_lib(tmpdir):
     Dsecond.runB(Bsecond)
     assert Dsecond.i_ == 8
 
+    # the lazy sequence class for B_second is defined in moduleCD:
+    Bs = Dsecond.getBs(3)
+    assert len(Bs) == 3
+    assert [b.i_ for b in Bs] == [8, 9, 10]
+    assert isinstance(Bs[1], moduleB.B_second)
+
+
+def test_sharded_lib(tmpdir):
+    """
+    The same library as in test_full_lib, generated as a single module
+    "sharded" whose classes are distributed to three shard modules.
+    """
+    from autowrap import Sharding
+
+    os.chdir(tmpdir.strpath)
+
+    pxd_files = ["A.pxd", "B.pxd", "C.pxd", "D.pxd"]
+    full_pxd_files = [os.path.join(test_files, f) for f in pxd_files]
+    decls, instance_map = autowrap.parse(full_pxd_files, ".")
+
+    plan = Sharding.plan_shards(decls, "sharded.pyx", 3, "pxd")
+    assert list(plan) == ["sharded_shard0", "sharded_shard1", "sharded_shard2"]
+    for shard in plan.values():
+        # all declarations of a pxd file are in the same shard:
+        pxd_paths = set(d.cpp_decl.pxd_path for d in shard["decls"])
+        assert all(d.cpp_decl.pxd_path not in pxd_paths
+                   for other in plan.values() if other is not shard for d in other["decls"])
+    assert sorted(d.name for shard in plan.values() for d in shard["decls"]) == \
+        sorted(d.name for d in decls)
+
+    include_dirs = autowrap.generate_code(decls, instance_map, target="sharded.pyx",
+                                          shards=3, shard_by="pxd")
+    with open("sharded.pyx") as fp:
+        imports = [l.strip() for l in fp if l.startswith("from ")]
+    assert imports == ["from %s import *" % name for name in plan]
+
+    targets = Sharding.shard_targets("sharded.pyx", plan)
+    for target in targets:
+        autowrap.Main.run_cython(inc_dirs=include_dirs, extra_opts=None, out=target)
+
+    names = list(plan) + ["sharded"]
+    modules = compile_and_import(names, targets, include_dirs,
+                                 extra_files=[os.path.splitext(t)[0] + ".pxd" for t in targets])
+    sharded = modules[-1]
+
+    Aobj = sharded.Aalias(5)
+    assert Aobj.i_ == 5
+    Bsecond = sharded.B_second(8)
+    Bsecond.processA(Aobj)
+    assert Bsecond.i_ == 15
+    assert memoryview(Bsecond.getMultiples(2)).tolist() == [15, 30]
+    Dsecond = sharded.D_second(11)
+    Dsecond.runB(Bsecond)
+    assert Dsecond.i_ == 15
+    assert sharded.Bklass.KlassKlass is not None
+
+    # grouping by size may split the declarations of a pxd file:
+    plan = Sharding.plan_shards(decls, "sharded.pyx", 3, "size")
+    assert len(plan) == 3
+    with pytest.raises(ValueError):
+        Sharding.plan_shards(decls, "sharded.pyx", 3, "random")
+
+
+def test_sharded_attached_functions(tmpdir):
+    """
+    Free functions attached to a class (wrap-attach) are generated with the
+    class, so they have to be in the shard of the class.
+    """
+    from autowrap import Sharding
+
+    os.chdir(tmpdir.strpath)
+
+    pxd_files = [os.path.join(os.path.dirname(test_files), f)
+                 for f in ["minimal.pxd", "minimal_td.pxd"]]
+    decls, instance_map = autowrap.parse(pxd_files, ".")
+    attached = [d for d in decls if isinstance(d, autowrap.DeclResolver.ResolvedFunction)
+                and d.cpp_decl.annotations.get("wrap-attach")]
+    assert sorted(d.name for d in attached) == ["run_static", "run_static_extra_arg"]
+
+    for shard_by in ("inheritance", "size"):
+        plan = Sharding.plan_shards(decls, "sharded.pyx", 4, shard_by)
+        for shard in plan.values():
+            names = set(d.name for d in shard["decls"])
+            for d in attached:
+                if d.name in names:
+                    assert "Minimal" in names
+        autowrap.generate_code(decls, instance_map, target="sharded.pyx", shards=4,
+                               shard_by=shard_by)
+
 
 if __name__ == "__main__":
     test_libcpp()
@@ -66,6 +66,36 @@ def test_from_command_line():
         os.chdir(old_dir)
 
 
+def test_profile_report(tmpdir):
+    import json
+    import os
+    import sys
+    old_dir = os.path.abspath(os.getcwd())
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    os.chdir(os.path.join(script_dir, "test_files"))
+    report_path = tmpdir.join("profile.json").strpath
+    args = ["pxds/*.pxd", "--out", "out.pyx", "--addons=/addons",
+            "--converters=converters", "--no-cache", "--profile-report", report_path]
+    from autowrap.Main import _main
+    try:
+        _main(args)
+    finally:
+        os.chdir(old_dir)
+
+    with open(report_path) as fp:
+        report = json.load(fp)
+    phases = [p["name"] for p in report["phases"]]
+    for name in ["parse/parse_pxd_files", "parse/resolve_decls/resolve_inheritances",
+                 "parse/resolve_decls", "parse", "generate_code/generate_wrappers",
+                 "generate_code/write_output", "generate_code", "run_cython"]:
+        assert name in phases, name
+    assert all(p["wall_seconds"] >= 0 and p["cpu_seconds"] >= 0 for p in report["phases"])
+    if sys.platform.startswith("linux"):
+        assert all(p["rss_mb"] > 0 and p["rss_delta_mb"] is not None for p in report["phases"])
+    assert list(report["pxd_files"]) == ["./pxds/test.pxd"]
+    assert "IntHolder" in report["generated_code"]
+
+
 def test_clr_from_command_line():
     import os
     old_dir = os.path.abspath(os.getcwd())
@@ -139,3 +169,40 @@ def test_run():
 
     mod.SharedPtrTestFloat().set_inner_value(fh, 12.0)
     assert fh.get() == 12.0
+
+
+def test_watcher(tmpdir):
+    import os
+    import shutil
+    from autowrap.Main import Watcher
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in ["pxds", "addons", "converters"]:
+        shutil.copytree(os.path.join(script_dir, "test_files", name), tmpdir.join(name).strpath)
+    old_dir = os.path.abspath(os.getcwd())
+    os.chdir(tmpdir.strpath)
+    try:
+        watcher = Watcher(["pxds/test.pxd"], ["addons/B.pyx", "addons/C.pyx"], ["converters"],
+                          "out.pyx", cache_dir=None)
+        assert watcher.poll() == ["pxds/test.pxd", "addons/B.pyx", "addons/C.pyx", "converters"]
+        assert watcher.cycles == 1
+        assert watcher.cache.misses == 1
+        assert watcher.generated_caches[os.path.abspath("out.pyx")]
+        mtime = os.path.getmtime("out.pyx")
+
+        # nothing changed:
+        assert watcher.poll() == []
+        assert watcher.cycles == 1
+
+        # only the addon changed, the pxd is not parsed again:
+        with open("addons/C.pyx", "a") as fp:
+            fp.write("\n    def watched(self):\n        return 42\n")
+        os.utime("addons/C.pyx", (mtime + 10, mtime + 10))
+        assert watcher.poll() == ["addons/C.pyx"]
+        assert watcher.cycles == 2
+        assert watcher.cache.hits == 1
+        assert watcher.seconds >= 0
+        with open("out.pyx") as fp:
+            assert "def watched(self):" in fp.read()
+    finally:
+        os.chdir(old_dir)
@@ -506,3 +506,37 @@ cdef extern from "*":
     assert str(td1.type_) == "A[B[C]]"
     assert str(td2.type_) == "A[C,D[E[F]]]"
     assert str(td3.type_) == "A[Y,B[C[Y],C[Y,D[E]]]]", str(td.type_)
+
+
+def test_parse_with_cache(tmpdir):
+    from autowrap.PXDCache import PXDCache
+
+    pxd = tmpdir.join("cached.pxd")
+    pxd.write("""
+cdef extern from "*":
+
+    cdef cppclass T:
+        int fun(int x) # wrap-as:gun
+    """)
+    cache = PXDCache(tmpdir.join("cache").strpath)
+
+    cld, = autowrap.PXDParser.parse_pxd_file(pxd.strpath, cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    cld, = autowrap.PXDParser.parse_pxd_file(pxd.strpath, cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cld.name == "T"
+    mdcl, = cld.methods["fun"]
+    assert mdcl.annotations == {"wrap-as": "gun"}
+    assert str(mdcl.result_type) == "int"
+
+    # changed content must not hit the cache:
+    pxd.write(pxd.read().replace("int x", "float x"))
+    cld, = autowrap.PXDParser.parse_pxd_file(pxd.strpath, cache)
+    assert (cache.hits, cache.misses) == (1, 2)
+    (__, arg_type), = cld.methods["fun"][0].arguments
+    assert str(arg_type) == "float"
+
+    cache.max_entries = 1
+    cache.evict()
+    assert len(tmpdir.join("cache").listdir()) == 1
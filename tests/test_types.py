@@ -75,7 +75,22 @@ def testTypeParse():
     _testType("X[int &,Y[str]]")
     _testType("X[unsigned int &,Y[str]]")
 
+    _testType("X[Y[int,float],Z[str,X[int]]]")
+    _testType("X[long int,unsigned long int *]")
+    _testType("X[]")
+
     _testErr("unsigned unsigned int")
+    _testErr("long long")
+    _testErr("int float")
+    _testErr("X[int")
+    _testErr("X[int]]")
+    _testErr("X[int,]")
+    _testErr("int * *")
+    _testErr("std::string")
+    _testErr("")
+
+    # parsed types are cached:
+    assert CppType.from_string("X[int,Y[str]]") is CppType.from_string("X[int,Y[str]]")
 
 
 def _testType(t):
@@ -198,11 +213,37 @@ def test_inv_transform():
     check(ABX, map2, "A[Z]")
     check(ABXX, map2, "A[Z,X]")
 
-    ABXp = ABX.copy()
-    ABXp.is_ptr = True
+    ABXp = ABX.replaced(is_ptr=True)
     check(ABXp, map2, "A[Z] *")
 
-    ABXXp = ABXX.copy()
-    ABXXp.template_args[0].is_ptr = True
+    BX, X = ABXX.template_args
+    ABXXp = ABXX.replaced(template_args=[BX.replaced(is_ptr=True), X])
 
     check(ABXXp, map2, "A[Z *,X]")
+
+
+def test_immutable_and_interned():
+    import copy
+    import pickle
+
+    T = CppType.from_string("X[int,Y[str]] &")
+    assert CppType.from_string("X[int,Y[str]] &") is T
+    assert copy.deepcopy(T) is T
+    assert pickle.loads(pickle.dumps(T)) is T
+    # is_ref marks the template arguments:
+    assert T.template_args[0].topmost_is_ref
+    assert not CppType("int").topmost_is_ref
+
+    @expect_exception
+    def modify():
+        T.is_ptr = True
+    modify()
+
+    Tp = T.replaced(is_ref=False, is_ptr=True)
+    assert str(Tp) == "X[int,Y[str]] *"
+    assert str(T) == "X[int,Y[str]] &"
+
+    A = CppType("A")
+    B_A = CppType("B", [A])
+    assert B_A.transformed(dict(A=CppType("X"))) is CppType("B", [CppType("X")])
+    assert str(B_A) == "B[A]"
@@ -84,3 +84,43 @@ def test_nested_mapping_flattening():
     assert str(mapping["B"]) == "Z[X,Y]"
     assert str(mapping["C"]) == "Z"
     assert str(mapping["D"]) == "Y"
+
+
+def test_write_if_changed(tmpdir):
+    import os
+    from autowrap.Utils import OutputReport, write_if_changed
+
+    a = tmpdir.join("a.pyx").strpath
+    b = tmpdir.join("b.pxd").strpath
+    with OutputReport() as report:
+        assert write_if_changed(a, lambda fp: fp.write("a = 1\n"))
+        assert write_if_changed(b, lambda fp: fp.write("b = 1\n"))
+    assert report.changed == [a, b]
+    assert report.unchanged == []
+
+    os.utime(a, (0, 0))
+    os.utime(b, (0, 0))
+    with OutputReport() as report:
+        assert not write_if_changed(a, lambda fp: fp.write("a = 1\n"))
+        assert write_if_changed(b, lambda fp: fp.write("b = 2\n"))
+    assert report.changed == [b]
+    assert report.unchanged == [a]
+    assert report.summary().splitlines() == ["1 of 2 output files changed", "    " + b]
+
+    # the unchanged file keeps its timestamp, no temporary files are left:
+    assert os.path.getmtime(a) == 0
+    assert open(b).read() == "b = 2\n"
+    assert sorted(os.listdir(tmpdir.strpath)) == ["a.pyx", "b.pxd"]
+
+    # a failing writer leaves the file untouched:
+    def fail(fp):
+        fp.write("broken")
+        raise IOError("disk full")
+    try:
+        write_if_changed(a, fail)
+    except IOError:
+        pass
+    else:
+        assert False, "expected IOError"
+    assert open(a).read() == "a = 1\n"
+    assert sorted(os.listdir(tmpdir.strpath)) == ["a.pyx", "b.pxd"]